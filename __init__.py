@@ -57,6 +57,8 @@ welcomeString= """Welcome to Experiment Eagle version %s written by %s. Report b
 %s. See text at beginning of __init__.py for more information.""" % (version, author,author)
 
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()# fits can be performed in a process pool (see fits/fitPool.py)
     logger.info(welcomeString)
     consoleHandler.flush()
     
@@ -14,6 +14,16 @@ import scipy.ndimage.interpolation
 import matplotlib.pyplot as plt
 import scipy
 import random
+import hashlib
+import time
+import tempfile
+import logging
+try:
+    import logColumns# column sidecar of the eagle logs, if experimentEagle is on the path
+except ImportError:
+    logColumns = None
+
+logger = logging.getLogger("ExperimentEagle.PCAFringeRemoval")
 
 class HumphryPictureAnalyser:
     """
@@ -87,6 +97,18 @@ Class which can take care of importing pictures and basic picture analysis.
         """
         return {x:os.path.join(self.default_file_path, y, y+".csv") for x, y in dp_dict.iteritems()}
 
+    def read_log(self, set_name, columns=None):
+        """
+        Returns the eagle log of set_name indexed by "img file name", with only the given columns (all if None).
+        Uses the column sidecar of the log (see logColumns.py) when it is available and up to date.
+        """
+        csv_path = self.data_path_dict[set_name]
+        if columns is not None:
+            columns = ["img file name"]+[column for column in columns if column != "img file name"]
+        if logColumns is not None:
+            return logColumns.readDataFrame(csv_path, columns, indexColumn="img file name", parseDates=False)
+        return pd.read_csv(csv_path, usecols=columns).set_index("img file name")
+
     def get_coordinate_grid(self, ROI=None):
         if ROI is None:
             ROI = (self.XMIN, self.XMAX, self.YMIN, self.YMAX)
@@ -124,7 +146,7 @@ or a random picture from the images folder will be selected.
         csv_path = self.data_path_dict[set_name]
         image_path = os.path.join(self.data_path_dict[set_name].split(self.data_path_dict[set_name].split("\\")[-1])[0], "images")
         
-        full_csv = pd.read_csv(csv_path).set_index("img file name")
+        full_csv = self.read_log(set_name, None if variable_name is None else [variable_name])
         
         if (variable_name is not None) and (variable_value is not None):
             filenames = full_csv.groupby(variable_name).get_group(variable_value).index.values
@@ -187,7 +209,7 @@ Notes:
         csv_path = self.data_path_dict[set_name]
         image_path = os.path.join(self.data_path_dict[set_name].split(self.data_path_dict[set_name].split("\\")[-1])[0], "images")
         
-        full_csv = pd.read_csv(csv_path).set_index("img file name")
+        full_csv = self.read_log(set_name, None if average_variable is None else [average_variable])
         
         if average_variable is not None:
             all_variables = list( set(full_csv[average_variable].tolist()) )
@@ -291,6 +313,127 @@ Notes:
                     pictures_dict = {x:self.get_subSpaceArrays(xs, ys, y, self.XMIN, self.YMIN, self.XMAX, self.YMAX)[2] for x, y in pictures_dict.iteritems()}
                 return pictures_dict
 
+    def train_PCA_basis(self, set_name, n_components=50, frame="light", ROI=None, mask=None, batch_size=64, cache_folder=None, retrain=False):
+        """
+Trains a PCA basis (as PCA / PCA_mask in principalComponentAnalysis.py) on all pictures in the images folder of an eagle log
+without loading them into memory at the same time.
+
+    Arguments:
+    set_name        ---     set_name referring to key in data_path_dict
+    n_components    ---     number of principal components that are kept
+    frame           ---     "light" or "atoms", which half of the (fast kinetics) picture is used after dark subtraction
+    ROI             ---     Region of interest (XMIN, XMAX, YMIN, YMAX) of the unrotated frame. Default is the full frame
+    mask            ---     optional array of the ROI shape, 1 where the data is used and 0 where not (e.g. where the atoms are), as PCA_mask.
+                            Only 0/1 masks are accepted, as the Gram matrix only applies the mask to one of the two blocks
+    batch_size      ---     number of pictures that are processed together
+    cache_folder    ---     folder for the basis files, default is a folder PCA next to the log csv
+    retrain         ---     train even if there is a saved basis
+
+The pictures are read once in batches and written (ROI, float32) to a memory mapped file in the local temporary folder
+(tempfile.gettempdir(), not the log folder, which is usually on the network share). The Gram matrix of the
+normalised frames is then accumulated batch by batch from this file, diagonalised, and the components are formed batch by batch.
+Only the batches, the Gram matrix (number of pictures squared) and the kept components are in memory.
+
+The basis is saved as PCA-<hash>.npz in cache_folder. The hash covers the names, sizes and modification times of the pictures
+and all options, not the contents of the pictures, so later calls with the same log and options load the basis instead of training again.
+A picture that is replaced by one of the same name, size and modification time is not noticed; use retrain=True in that case.
+
+Returns a dictionary with "vals", "vecs" (n_components x pixels), "vecs_no_mask" (only with a mask), "shape" (of the ROI)
+and "files" (the pictures used)
+        """
+        log_folder = os.path.dirname(self.data_path_dict[set_name])
+        image_path = os.path.join(log_folder, "images")
+        if cache_folder is None:
+            cache_folder = os.path.join(log_folder, "PCA")
+        files = sorted(f for f in os.listdir(image_path) if os.path.splitext(f)[1].lower() in (".png", ".tif", ".tiff"))
+        if len(files) == 0:
+            raise ValueError("no pictures found in %s" % image_path)
+
+        key = hashlib.md5()
+        for f in files:
+            stat = os.stat(os.path.join(image_path, f))
+            key.update("%s|%s|%r;" % (f, stat.st_size, stat.st_mtime))
+        key.update(repr((n_components, frame, ROI, self.darkImagePath, self.cut_white_line)))
+        if mask is not None:
+            mask = np.asarray(mask, dtype=np.float32)
+            if not np.all((mask == 0) | (mask == 1)):
+                raise ValueError("the mask must only contain 0 and 1")
+            key.update(mask.tostring())
+        basis_path = os.path.join(cache_folder, "PCA-%s.npz" % key.hexdigest())
+        if os.path.exists(basis_path) and not retrain:
+            logger.info("loading PCA basis %s" % basis_path)
+            saved = np.load(basis_path)
+            return {name: saved[name] for name in saved.files}
+
+        start = time.time()
+        dark_array = self.loadDarkImage(self.darkImagePath)
+        frame_index = {"light": 1, "atoms": 0}[frame]
+        def prepare(filename):
+            pic = imread(os.path.join(image_path, filename)).astype(np.float32)
+            pic -= dark_array
+            pic = pic.clip(1)
+            pic = self.fastKineticsCrop(pic, 2)[frame_index]
+            if ROI is not None:
+                (XMIN, XMAX, YMIN, YMAX) = ROI
+                pic = pic[YMIN:YMAX, XMIN:XMAX]
+            return pic
+        shape = prepare(files[0]).shape
+        if mask is not None and mask.shape != shape:
+            raise ValueError("mask of shape %s doesn't match the ROI of shape %s" % (mask.shape, shape))
+        mask_vector = None if mask is None else mask.ravel()
+        n = len(files)
+        batches = [slice(i, min(i+batch_size, n)) for i in range(0, n, batch_size)]
+
+        if not os.path.isdir(cache_folder):
+            os.makedirs(cache_folder)
+        frames_file, frames_path = tempfile.mkstemp(suffix=".frames.tmp", prefix=os.path.splitext(os.path.basename(basis_path))[0]+"-")
+        os.close(frames_file)
+        frames = np.memmap(frames_path, dtype=np.float32, mode="w+", shape=(n, np.prod(shape)))
+        try:
+            # one pass over the pictures
+            for batch in batches:
+                for i in range(batch.start, batch.stop):
+                    frames[i] = prepare(files[i]).ravel()
+                logger.info("read %s of %s pictures" % (batch.stop, n))
+            frames.flush()
+
+            # Gram matrix (of the masked frames) by blocks of batches
+            gram = np.zeros((n, n))
+            for i, batch_i in enumerate(batches):
+                block_i = np.array(frames[batch_i])
+                if mask_vector is not None:
+                    block_i *= mask_vector
+                for batch_j in batches[i:]:
+                    gram[batch_i, batch_j] = np.dot(block_i, frames[batch_j].T)
+                    gram[batch_j, batch_i] = gram[batch_i, batch_j].T
+            norm = np.diag(gram).copy()
+            gram /= np.sqrt(np.outer(norm, norm))
+
+            vals, vecs_MM = np.linalg.eigh(gram)
+            vals = vals[::-1][:n_components]
+            vecs_MM = vecs_MM[:, ::-1][:, :n_components]
+            coefficients = vecs_MM/np.sqrt(norm)[:, np.newaxis]/np.sqrt(np.abs(vals))
+
+            # components by batches, as vecs of PCA / PCA_mask
+            vecs = np.zeros((len(vals), frames.shape[1]))
+            vecs_no_mask = np.zeros((len(vals), frames.shape[1])) if mask_vector is not None else None
+            for batch in batches:
+                block = np.array(frames[batch])
+                if vecs_no_mask is not None:
+                    vecs_no_mask += np.dot(coefficients[batch].T, block)
+                    block *= mask_vector
+                vecs += np.dot(coefficients[batch].T, block)
+        finally:
+            del frames
+            os.remove(frames_path)
+
+        basis = {"vals": vals, "vecs": vecs, "shape": np.array(shape), "files": np.array(files)}
+        if vecs_no_mask is not None:
+            basis["vecs_no_mask"] = vecs_no_mask
+        np.savez(basis_path, **basis)
+        logger.info("trained PCA basis on %s pictures in %.0f s, saved to %s" % (n, time.time()-start, basis_path))
+        return basis
+
     def get_subSpaceArrays(self, xs, ys, zs, startX, startY, endX, endY):
         """returns the arrays of the selected sub space. If subspace is not
         activated then returns the full arrays"""
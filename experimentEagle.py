@@ -36,6 +36,7 @@ import enable.api as enable
 
 import scipy
 import scipy.misc
+import numpy as np
 import os
 import glob
 import json
@@ -44,6 +45,7 @@ import datetime
 import pyface
 import logging
 import re
+import collections
 import physicsProperties.physicsProperties
 
 from enable.component_editor import ComponentEditor
@@ -51,6 +53,8 @@ from enable.api import Window
 
 #import fits
 import fits.fits
+import fits.fitPool
+import fits.coordinateGrid
 import fits.fitGaussian
 import fits.fitGaussianRotated
 import fits.fitParabola
@@ -68,8 +72,12 @@ import plotObjects.keyBindingsTool
 import plotObjects.logFilePlot
 import processors
 import processors.newDarkPicture
+import processors.diagnostics
 
 from getExperimentPaths import isHumphryNASConnected
+import fileWatcher
+import ingestPipeline
+import imageReader
 
 logger=logging.getLogger("ExperimentEagle.experimentEagle")
 
@@ -149,45 +157,68 @@ class CameraImage(traits.HasTraits):
             self.ys = scipy.linspace(0.0, self.pixelsY-1, self.pixelsY)
             self.model_changed = True
         else:
-            if self.imageMode == "optical density image":#old standard use case image is an array of optical densities
-                self.rawImage = scipy.misc.imread(imageFile).astype(scipy.float_)# still load raw image so that analyser can be passed the raw image always
-                logger.debug("self.imageFile = %s" % (imageFile) )
-                logger.debug("self.rawImage = %s and type = %s" % (self.rawImage,type(self.rawImage)) )
-                logger.debug("scipy.misc.imread = %s" % scipy.misc.imread)
-                logger.debug("offset = %s" % self.offset)
-                self.zs = (self.rawImage - self.offset) / self.scale# we don't rescale images if they are processed. this should be done by the processor
-                if self.ODCorrectionBool:
-                    logger.info("Correcting for OD saturation")
-                    self.zs = scipy.log((1.0 - scipy.exp(-1.*self.ODSaturationValue)) / (
-                    scipy.exp(-self.zs) - scipy.exp(-1.*self.ODSaturationValue)))
-                    # we should account for the fact if ODSaturation value is wrong or there is noise we can get complex numbers!
-                    self.zs[scipy.imag(self.zs) > 0] = scipy.nan
-                    self.zs = self.zs.astype(float)
-            else:#USING A PROCESSOR #TODO may need to change to elif when we start having atoms and light pics                
-                self.processor = processors.validProcessors[self.chosenProcessor]                 
-                logger.info("processor = %s" % self.processor)
-                self.zs = self.processor.process(self.imageFile)
-                #self.rawImage is still the raw image
-                logger.debug("processed raw image = %s" % self.zs)
-            logger.info("shape of raw Image = (%s,%s)" % self.zs.shape)
-            if (self.pixelsX != self.zs.shape[1] or  self.pixelsY != self.zs.shape[0]):
-                #pixels have changed. Need to destroy contour plot on fit if it exists                    
-                logger.warning("number of pixels in image have changed. This causes problems for contour fit plot. Will destroy contour fit plot first")
-                self.pixels_changed=True
-                logger.info("continuing after pixels changed = True event")
-            self.pixelsX = self.zs.shape[1]# update number of pixels when we load a new picture! (user shouldn't have to define pixels manually)
-            self.pixelsY = self.zs.shape[0]# update number of pixels when we load a new picture! (user shouldn't have to define pixels manually)
-            self.xs = scipy.linspace(0.0, self.pixelsX-1, self.pixelsX)
-            self.ys = scipy.linspace(0.0, self.pixelsY-1, self.pixelsY)
-            #once we have zs we can now move the file
-            self.minZ = scipy.nanmin(self.zs)
-            self.maxZ = scipy.nanmax(self.zs)                
-            for fit in self.fitList:
-                fit.xs = self.xs
-                fit.ys = self.ys
-                fit.zs = self.zs
+            self.setImageData(imageFile, *self.loadImageData(imageFile))
+
+    def loadImageData(self, imageFile):
+        """reads and processes imageFile and returns (zs, rawImage, processor): the array to display,
+        the raw image (None when using a processor) and the processor used (None for optical density images).
+        Doesn't set any attributes so it can be called from the ingest pipeline worker thread while the
+        previous image is still being fitted. Pass the results to setImageData in the GUI thread"""
+        rawImage = processor = None
+        if self.imageMode == "optical density image":#old standard use case image is an array of optical densities
+            rawImage = imageReader.readImage(imageFile)# still load raw image so that analyser can be passed the raw image always
+            logger.debug("imageFile = %s" % (imageFile) )
+            logger.debug("rawImage = %s and type = %s" % (rawImage,type(rawImage)) )
+            logger.debug("offset = %s" % self.offset)
+            zs = rawImage - self.offset# we don't rescale images if they are processed. this should be done by the processor
+            zs /= self.scale
+            if self.ODCorrectionBool:
+                logger.info("Correcting for OD saturation")
+                # zs = log((1-exp(-ODSat))/(exp(-zs)-exp(-ODSat))) in place.
+                # we should account for the fact if ODSaturation value is wrong or there is noise we can get the log of negative numbers! these become nan
+                saturation = np.exp(-1.*self.ODSaturationValue)
+                np.negative(zs, out=zs)
+                np.exp(zs, out=zs)
+                zs -= saturation
+                np.divide(1.0 - saturation, zs, out=zs)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    np.log(zs, out=zs)
+        else:#USING A PROCESSOR #TODO may need to change to elif when we start having atoms and light pics                
+            processor = processors.validProcessors[self.chosenProcessor]
+            logger.info("processor = %s" % processor)
+            zs = processor.process(imageFile)
+            #self.rawImage is still the raw image
+            logger.debug("processed raw image = %s" % zs)
+        return zs, rawImage, processor
+
+    def setImageData(self, imageFile, zs, rawImage=None, processor=None):
+        """sets the traits for a new image array zs and the rawImage and processor (unless None) as returned
+        by loadImageData. Must be called from the GUI thread"""
+        self.imageFile = imageFile
+        if rawImage is not None:
+            self.rawImage = rawImage
+        if processor is not None:
+            self.processor = processor
+        self.zs = zs
+        logger.info("shape of raw Image = (%s,%s)" % self.zs.shape)
+        if (self.pixelsX != self.zs.shape[1] or  self.pixelsY != self.zs.shape[0]):
+            #pixels have changed. Need to destroy contour plot on fit if it exists                    
+            logger.warning("number of pixels in image have changed. This causes problems for contour fit plot. Will destroy contour fit plot first")
+            self.pixels_changed=True
+            logger.info("continuing after pixels changed = True event")
+        self.pixelsX = self.zs.shape[1]# update number of pixels when we load a new picture! (user shouldn't have to define pixels manually)
+        self.pixelsY = self.zs.shape[0]# update number of pixels when we load a new picture! (user shouldn't have to define pixels manually)
+        self.xs = scipy.linspace(0.0, self.pixelsX-1, self.pixelsX)
+        self.ys = scipy.linspace(0.0, self.pixelsY-1, self.pixelsY)
+        #once we have zs we can now move the file
+        self.minZ = scipy.nanmin(self.zs)
+        self.maxZ = scipy.nanmax(self.zs)                
+        for fit in self.fitList:
+            fit.xs = self.xs
+            fit.ys = self.ys
+            fit.zs = self.zs
 
-            self.model_changed = True
+        self.model_changed = True
 
 
     def _scale_changed(self):
@@ -226,6 +257,9 @@ class EagleHandler(traitsui.Handler):
     model = traits.Instance(CameraImage)
     view = traits.Any
     watchFolderTimer = traits.Instance(Timer)
+    watchBackend = traits.Instance(fileWatcher.WatchBackend)
+    ingestQueue = traits.Instance(collections.deque, ())#new matching files waiting to be analysed, oldest first
+    pipeline = traits.Instance(ingestPipeline.IngestPipeline)#decodes and processes queued files in a worker thread
 
     #---------------------------------------------------------------------------
     # Handler interface
@@ -238,6 +272,9 @@ class EagleHandler(traitsui.Handler):
             #stop any previous timer, should only have 1 timer at a time
             self.watchFolderTimer.stop()
             logger.info("attempting to stop timers")
+            self.stopWatchBackend()
+            self.stopIngestPipeline()
+            fits.fitPool.closePool()
         except Exception as e:
             logger.error("couldn't stop current timer %s " % e.message)
         return
@@ -251,6 +288,7 @@ class EagleHandler(traitsui.Handler):
         self.view.boxSelection2D.on_trait_change(self._box_selection_complete, "selection_complete")#when user finishes dragging a box with r
         self.view.lineInspectorX.on_trait_change(self._setCentreGuess, "mouseClickEvent")#when user clicks somewhere on image
         self.view.on_trait_change(self._watchFolderModeChanged, "watchFolderBool")
+        self.view.on_trait_change(self._watchFolderIntervalChanged, "watchFolderIntervalms")
         self.model.on_trait_change(self._imageMode_changed, "imageMode")
         self.model.on_trait_change(self._forceRefreshAction, "forceRefreshButton")
 
@@ -298,21 +336,64 @@ class EagleHandler(traitsui.Handler):
     def _watchFolderModeChanged(self):
         eagle = self.view
         eagle.oldFiles = set()
+        self.stopWatchBackend()
+        self.stopIngestPipeline()
+        self.ingestQueue.clear()
+        eagle.ingestBacklog = 0
         if eagle.watchFolderBool:
             if eagle.watchFolder=='' and os.path.isfile(eagle.selectedFile):
                 eagle.watchFolder=os.path.dirname(eagle.selectedFile)
             # commented this, because eagle should directly load an image, if already available
             # eagle.oldFiles = self.getImageFiles()
-            self.watchFolderTimer=Timer(2000., self.checkForNewFiles)
+            # the backend keeps its own cursor so the timer tick is cheap and can run often
+            self.watchFolderTimer=Timer(eagle.watchFolderIntervalms, self.checkForNewFiles)
         else:
             if self.watchFolderTimer is not None:
                 self.watchFolderTimer.stop()
                 self.watchFolderTimer = None
 
+    def _watchFolderIntervalChanged(self):
+        """the interval is only read when the timer is created, so a running timer is restarted"""
+        if self.watchFolderTimer is not None:
+            self.watchFolderTimer.stop()
+            self.watchFolderTimer=Timer(self.view.watchFolderIntervalms, self.checkForNewFiles)
+
+    def stopWatchBackend(self):
+        if self.watchBackend is not None:
+            self.watchBackend.stop()
+            self.watchBackend = None
+
+    def stopIngestPipeline(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+    def getIngestPipeline(self):
+        if self.pipeline is None:
+            self.pipeline = ingestPipeline.IngestPipeline(self.model.loadImageData, self._readSequenceVariables)
+        return self.pipeline
+
+    def _readSequenceVariables(self, modifiedTime):
+        """called by the ingest pipeline worker thread """
+        if self.view.updatePhysicsBool:
+            return self.view.physics.readSequenceVariables(modifiedTime)
+        return None
+
+    def getWatchBackend(self):
+        """returns the watch backend for the current watch folder, (re)creating it if
+        the folder or the chosen backend changed"""
+        eagle = self.view
+        if self.watchBackend is not None:
+            if self.watchBackend.folder == eagle.watchFolder and eagle.watchBackendName in ["auto", self.watchBackend.name]:
+                return self.watchBackend
+            self.stopWatchBackend()
+        self.watchBackend = fileWatcher.createWatchBackend(eagle.watchFolder, eagle.watchBackendName)
+        return self.watchBackend
+
     def getImageFiles(self):
         """return set of all image files in watched folder """
         eagle = self.view
-        return set([f for f in os.listdir(eagle.watchFolder)  if (os.path.splitext(f)[1] in [".png",".jpg",".pgm",".bmp",".tif"])])
+        return set(fileWatcher.listImageFiles(eagle.watchFolder))
 
     def parseFiles_old(self, filesSet):
         """given a set of files, this file will check how many match the search string
@@ -350,44 +431,86 @@ class EagleHandler(traitsui.Handler):
 
     def checkForNewFiles(self):
         """function called by timer thread. Checks directory for new files
-        and then checks if they match searchString (calls parseFiles)"""
+        and then checks if they match searchString (calls parseFiles).
+        Matching files are added to the ingest queue which is then drained one
+        file at a time (see processIngestQueue)"""
         logger.debug("Check for new files")
         eagle = self.view
         if not os.path.isdir(eagle.watchFolder):
             logger.warning("watchFolder is not a valid directory. Will not check for new files")
             return
-        currentFiles = self.getImageFiles()
-        newFiles = currentFiles - eagle.oldFiles
+        previousBackend = self.watchBackend
+        watchBackend = self.getWatchBackend()
+        existingFiles = watchBackend is not previousBackend#the first poll of a new backend returns every file already in the folder
+        newFiles = watchBackend.poll()
         if len(newFiles)==0:
             logger.debug("No new files detected in watch Directory")
-            return
         else:
+            eagle.oldFiles = set(watchBackend.knownFiles)
             logger.debug("new files = %s" % list(newFiles))
             newFiles = self.parseFiles(newFiles)
             logger.debug("new files after checking for sub-string = %s" % list(newFiles))
             if len(newFiles)==0:
                 logger.debug("new files were found but none matched search string %s" % eagle.searchString)
-                return
-            if len(newFiles)>1:
-                logger.warning("more than one new file found %s only analysing first one" % newFiles)
-            newFile = newFiles[0]
-            logger.debug("new file is %s" % newFile)
-            logger.debug("new full path file is %s" % os.path.join(eagle.watchFolder,newFile))
-            eagle.selectedFile = os.path.join(eagle.watchFolder,newFile)
-            eagle.physics.selectedFileModifiedTime = os.path.getmtime(eagle.selectedFile)
-            eagle.oldFiles = currentFiles
-            #only organise previous files once you have found a new one
-            if eagle.organisedFolderBool:#organise matching files that aren't the current file
-                if eagle.watchFolder.startswith('T:'):
-                    matchingFiles = self.parseFiles(currentFiles)
-                    logger.debug("attempting to organise files")
-                    logger.debug("matching files = %s" % matchingFiles)
-                    for matchingFile in matchingFiles:
-                        if matchingFile != newFile:#don't move the file currently being analysed!
-                            logger.debug("about to organise matching file: %s" % matchingFile)
-                            self.organiseImageFile( os.path.join(eagle.watchFolder,matchingFile) )
-
-                        
+            else:
+                if existingFiles:#only load the newest image already in the folder, don't analyse all old shots again
+                    knownFiles = watchBackend.knownFiles
+                    newFiles = [max(newFiles, key=lambda f: (knownFiles.get(f, 0.0), f))]
+                    logger.info("started watching %s. loading newest existing file %s" % (eagle.watchFolder, newFiles[0]))
+                self.enqueueFiles(newFiles)
+        self.processIngestQueue()
+
+    def enqueueFiles(self, newFiles):
+        """adds new matching files to the ingest queue ordered by modification time
+        (then file name) and applies the backlog policy"""
+        eagle = self.view
+        knownFiles = self.watchBackend.knownFiles
+        newFiles = sorted(newFiles, key=lambda f: (knownFiles.get(f, 0.0), f))
+        self.ingestQueue.extend(newFiles)
+        if eagle.ingestPolicy == "skip to newest":
+            skipped = list(self.ingestQueue)[:-1]
+            if skipped:
+                logger.warning("skipping %s files to analyse newest file: %s" % (len(skipped), skipped))
+            newest = self.ingestQueue[-1]
+            self.ingestQueue.clear()
+            self.ingestQueue.append(newest)
+        elif eagle.ingestPolicy == "bounded depth":
+            while len(self.ingestQueue)>eagle.ingestMaxDepth:
+                logger.warning("ingest backlog larger than %s. Dropping oldest file %s" % (eagle.ingestMaxDepth, self.ingestQueue.popleft()))
+        eagle.ingestBacklog = len(self.ingestQueue)
+
+    def processIngestQueue(self):
+        """passes queued files on to the ingest pipeline and displays the next decoded image,
+        unless the fits of the previous image are still running (their results would otherwise be lost)"""
+        eagle = self.view
+        pipeline = self.getIngestPipeline()
+        while len(self.ingestQueue)>0 and pipeline.canSubmit():
+            pipeline.submit(os.path.join(eagle.watchFolder,self.ingestQueue.popleft()))
+        eagle.ingestBacklog = len(self.ingestQueue) + pipeline.pending()
+        if eagle.ingestBacklog==0:
+            return
+        if eagle.isAutoFitting():
+            logger.debug("auto fits still running. %s files waiting in ingest queue" % eagle.ingestBacklog)
+            return
+        result = pipeline.getResult()
+        if result is None:
+            return
+        eagle.ingestBacklog = len(self.ingestQueue) + pipeline.pending()
+        newFile = os.path.basename(result.path)
+        logger.debug("new file is %s" % newFile)
+        logger.debug("new full path file is %s" % result.path)
+        eagle.showIngestResult(result)
+        #only organise previous files once you have found a new one
+        if eagle.organisedFolderBool:#organise matching files that aren't the current file
+            if eagle.watchFolder.startswith('T:'):
+                matchingFiles = self.parseFiles(eagle.oldFiles)
+                logger.debug("attempting to organise files")
+                logger.debug("matching files = %s" % matchingFiles)
+                for matchingFile in matchingFiles:
+                    if matchingFile != newFile and matchingFile not in self.ingestQueue and not pipeline.isPending(os.path.join(eagle.watchFolder,matchingFile)):#don't move the file currently being analysed or waiting to be analysed!
+                        logger.debug("about to organise matching file: %s" % matchingFile)
+                        self.organiseImageFile( os.path.join(eagle.watchFolder,matchingFile) )
+
     def _eagleReferenceAction(self, info):
         """This action (triggered by menu) is used to save info about the current image and
         sequence to the references folder. It creates an eagleReferenceImage dialog and saves
@@ -455,6 +578,9 @@ class ImagePlotInspector(traits.HasTraits):
             traitsui.HGroup(traitsui.Item("selectedFile", label="Select a File"), visible_when="not watchFolderBool"),
             traitsui.HGroup(traitsui.Item("watchFolder", label="Select a Directory"), visible_when="watchFolderBool"),
             traitsui.HGroup(traitsui.Item("searchString", label="Filename sub-string"), visible_when="watchFolderBool"),
+            traitsui.HGroup(traitsui.Item("watchBackendName", label="Watch method"), traitsui.Item("watchFolderIntervalms", label="Check interval (ms)"), visible_when="watchFolderBool"),
+            traitsui.HGroup(traitsui.Item("ingestPolicy", label="Backlog policy"), traitsui.Item("ingestMaxDepth", label="Max backlog", visible_when="ingestPolicy=='bounded depth'"),
+                            traitsui.Item("ingestBacklog", label="Files waiting", style="readonly"), visible_when="watchFolderBool"),
             traitsui.HGroup(
                 traitsui.Item("organisedFolderBool", label="Organise Watched Folder? (must be on drive T:)", visible_when="watchFolderBool", enabled_when="watchFolder.startswith('T:')")
                 ),
@@ -504,6 +630,7 @@ class ImagePlotInspector(traits.HasTraits):
                                         traitsui.Action(name='Save Image as Reference', action='_eagleReferenceAction'),
                                         traitsui.Action(name='Force Resfresh (F5)', action='_forceRefreshAction'),
                                         traitsui.Action(name='Reload Processors', action='_reloadProcessors'),
+                                        traitsui.Action(name='Processor Diagnostics', action='_processor_diagnostics'),
                                         name="Menu",
                                         ),
                         traitsmenu.Menu(
@@ -532,6 +659,12 @@ class ImagePlotInspector(traits.HasTraits):
     statusBarString = traits.String("no image file selected")
     watchFolderBool = traits.Bool(False)
     watchFolder = traits.Directory()
+    watchBackendName = traits.Enum(fileWatcher.backendNames, desc="how new files are detected. notify uses file system events (local folders, needs watchdog), poll keeps a cursor of known files and is used for network shares. auto chooses")
+    watchFolderIntervalms = traits.Float(50.0, desc="interval in ms at which the watch folder backend is checked for new files")
+    ingestPolicy = traits.Enum("process all", "skip to newest", "bounded depth", desc="what to do when new files arrive faster than they can be analysed. process all analyses every file in order, skip to newest only analyses the latest file, bounded depth drops the oldest files beyond the max backlog")
+    ingestMaxDepth = traits.Range(1, 1000, 10, desc="maximum number of files waiting to be analysed when backlog policy is bounded depth")
+    ingestBacklog = traits.Int(0, desc="number of new files waiting to be analysed")
+    ingestResult = None# set by showIngestResult just before selectedFile changes
     processorModeEnabled = traits.Bool(False)
 
     organisedFolderBool = traits.Bool(False)
@@ -827,7 +960,7 @@ class ImagePlotInspector(traits.HasTraits):
             logger.info("first fit plot so initialising contour plot")
             self.initialiseFitPlot()
         logger.info("attempting to set fit data")
-        self.contourPositions = [scipy.tile(self.contourXS, len(self.contourYS)), scipy.repeat(self.contourYS, len(self.contourXS))]#for creating data necessary for gauss2D function
+        self.contourPositions = fits.coordinateGrid.getGrid(self.contourXS, self.contourYS)#cached broadcastable x row and y column
         zsravelled = fit.fitFunc(self.contourPositions, *fit._getCalculatedValues())
 #        logger.debug("zs ravelled shape %s " % zsravelled.shape)
         self.contourZS = zsravelled.reshape((len(self.contourYS), len(self.contourXS)))
@@ -1002,31 +1135,60 @@ class ImagePlotInspector(traits.HasTraits):
 
     def _selectedFile_changed(self):
         logger.info("######################## Selected File changed ########################")
+        result, self.ingestResult = self.ingestResult, None
+        if result is not None and result.path == self.selectedFile and result.error is None:
+            # image was already decoded and processed by the ingest pipeline
+            self.physics.selectedFileModifiedTime = result.modifiedTime
+            if result.variables is not None:
+                self.physics.applySequenceVariables(result.variables)
+            self.model.setImageData(result.path, result.zs, result.rawImage, result.processor)
+        else:
+            self.loadSelectedFile()
+        for fit in self.fitList:
+            fit.fitted=False
+            fit.fittingStatus = fit.notFittedForCurrentStatus
+            if fit.autoFitBool:#we should automatically start fitting for this Fit
+                fit._fit_routine()#starts a thread to perform the fit. auto guess and auto draw will be handled automatically
+        self.update_view()
+        #redefine the statusString whenever selected file changes
+        self.statusBarString = self.selectedFile+" - "+self.physics.species+" - "+self.cameraModel
+        if self.ingestBacklog>0:
+            self.statusBarString += " - %s files waiting" % self.ingestBacklog
+
+    def loadSelectedFile(self):
+        """reads the physics and the image data of the selected file in the GUI thread"""
+        if os.path.exists(self.selectedFile):
+            self.physics.selectedFileModifiedTime = os.path.getmtime(self.selectedFile)
         if self.updatePhysicsBool:
             logger.info("Update physics")
             self.physics.updatePhysics()
         maxAttempts = 5
         # logger.warning("NON REFRESH WARNING - THIS WAS SELECTED FILE %s " % self.selectedFile)
         for i in range(0,maxAttempts):
+            fileWatcher.waitUntilReady(self.selectedFile)#returns as soon as the file (and its sibling frames) are completely written
             try:
-                time.sleep(0.1)#DEBUG seeing if adding these sleeps fixes the issue of images not updating!
                 self.model.getImageData(self.selectedFile)
             except AttributeError as e:
                 logger.error("Error. received Attribute Error when trying to getImageData. This occurs sometimes and causes duplicate points...")
                 logger.error("Error message :%s" % e.message)
-                logger.error("Will sleep and then retry")
-                time.sleep(0.5)
+                logger.error("Will wait for file and then retry")
                 continue
             logger.info("succesfully completed getImageData. Will now break from repetition loop")
             break
+
+    def showIngestResult(self, result):
+        """display step of the ingest pipeline. Selects the file without decoding it again"""
+        if result.error is not None:
+            logger.error("ingest pipeline failed for %s. Will load it again in the GUI thread" % result.path)
+        self.ingestResult = result
+        self.selectedFile = result.path
+
+    def isAutoFitting(self):
+        """True while a fit that is automatically run on new images is still fitting"""
         for fit in self.fitList:
-            fit.fitted=False
-            fit.fittingStatus = fit.notFittedForCurrentStatus
-            if fit.autoFitBool:#we should automatically start fitting for this Fit
-                fit._fit_routine()#starts a thread to perform the fit. auto guess and auto draw will be handled automatically
-        self.update_view()
-        #redefine the statusString whenever selected file changes
-        self.statusBarString = self.selectedFile+" - "+self.physics.species+" - "+self.cameraModel
+            if fit.autoFitBool and fit.fitThread is not None and fit.fitThread.isAlive():
+                return True
+        return False
 
     def _cameraModel_changed(self):
         """camera model enum can be used as a helper. It just sets all the relevant
@@ -1165,6 +1327,9 @@ class ImagePlotInspector(traits.HasTraits):
     def _new_dark_picture(self):
         processors.newDarkPicture.newDarkPictureDialog().configure_traits()
 
+    def _processor_diagnostics(self):
+        processors.diagnostics.DiagnosticsDialog().edit_traits()
+
 
         
         
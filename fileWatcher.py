@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: fileWatcher.py
+
+Backends used by the EagleHandler to find new images in the watched folder.
+
+NotifyWatchBackend receives file system events from watchdog (inotify /
+ReadDirectoryChangesW) in a background thread and queues the new file names,
+so that a tick of the gui timer only costs O(new files).
+
+PollingWatchBackend is the fallback for network shares (where notifications
+are unreliable). It keeps a cursor of the files it already knows and only stats
+the directory itself on every tick. The directory is only listed when its mtime
+changes, once more settleTime after a change (files created within the mtime
+resolution of the share don't change it again) and every fullScanInterval.
+
+FileReadiness decides whether a new image (and its sibling frames) has been
+completely written, so that neither the watch loop nor the processors need
+fixed sleeps.
+"""
+
+import os
+import time
+import logging
+import Queue
+
+try:
+    import watchdog.observers
+    import watchdog.events
+except ImportError:
+    watchdog = None
+
+try:
+    from scandir import scandir
+except ImportError:
+    scandir = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger=logging.getLogger("ExperimentEagle.fileWatcher")
+
+imageExtensions = [".png",".jpg",".pgm",".bmp",".tif"]
+backendNames = ["auto", "notify", "poll"]
+
+def isImageFile(fileName):
+    """True if fileName has one of the image extensions eagle can read """
+    return os.path.splitext(fileName)[1] in imageExtensions
+
+def isNetworkPath(folder):
+    """network shares don't reliably deliver file system notifications.
+    Mapped network drives (e.g. T:) can't be detected here so the user can force
+    the polling backend in the settings."""
+    return folder.startswith("\\\\") or folder.startswith("//")
+
+def listImageFiles(folder):
+    """returns dictionary of image file name: modification time for all image files
+    in folder. Uses scandir if available as this avoids one stat per file on windows"""
+    if scandir is not None:
+        return {entry.name:entry.stat().st_mtime for entry in scandir(folder) if isImageFile(entry.name)}
+    files = {}
+    for f in os.listdir(folder):
+        if isImageFile(f):
+            try:
+                files[f] = os.path.getmtime(os.path.join(folder,f))
+            except OSError:#file removed between listdir and stat
+                continue
+    return files
+
+
+class WatchBackend(object):
+    """base class for the watch folder backends. poll is called from the gui timer
+    and returns a list of the names (not full paths) of new image files since the last call.
+    knownFiles maps the names of all image files seen so far to their modification time"""
+    name = "base"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.knownFiles = {}
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def poll(self):
+        raise NotImplementedError
+
+    def _addFiles(self, files):
+        """adds dictionary of name:mtime to the known files and returns the names that are new"""
+        newFiles = [f for f in files if f not in self.knownFiles]
+        self.knownFiles.update(files)
+        return sorted(newFiles)
+
+
+class PollingWatchBackend(WatchBackend):
+    """incremental polling fallback, suitable for network shares """
+    name = "poll"
+
+    def __init__(self, folder, fullScanInterval=5.0, settleTime=2.0):
+        super(PollingWatchBackend, self).__init__(folder)
+        self.fullScanInterval = fullScanInterval# seconds between forced full listings
+        self.settleTime = settleTime# list again this long after a directory change (mtime resolution)
+        self.lastDirectoryMTime = None
+        self.settleScanTime = None# when to list again after the last directory change
+        self.lastFullScan = 0.0
+
+    def poll(self):
+        now = time.time()
+        try:
+            directoryMTime = os.stat(self.folder).st_mtime
+        except OSError as e:
+            logger.warning("could not stat watch folder %s: %s" % (self.folder, e))
+            return []
+        if directoryMTime != self.lastDirectoryMTime:
+            self.lastDirectoryMTime = directoryMTime
+            self.settleScanTime = now+self.settleTime
+        elif self.settleScanTime is not None and now>=self.settleScanTime:
+            self.settleScanTime = None
+        elif now-self.lastFullScan<self.fullScanInterval:
+            return []
+        self.lastFullScan = now
+        files = listImageFiles(self.folder)
+        #forget files that were deleted (e.g. by organiseImageFile) so the cursor doesn't grow forever
+        for f in set(self.knownFiles)-set(files):
+            del self.knownFiles[f]
+        return self._addFiles(files)
+
+
+if watchdog is not None:
+    class _QueueingEventHandler(watchdog.events.FileSystemEventHandler):
+        """runs in the watchdog observer thread. Only puts names on the queue
+        so that no gui objects are touched from this thread"""
+        def __init__(self, eventQueue):
+            super(_QueueingEventHandler, self).__init__()
+            self.eventQueue = eventQueue
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self.eventQueue.put(("created", event.src_path))
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self.eventQueue.put(("deleted", event.src_path))
+                self.eventQueue.put(("created", event.dest_path))
+
+        def on_deleted(self, event):
+            if not event.is_directory:
+                self.eventQueue.put(("deleted", event.src_path))
+
+
+class NotifyWatchBackend(WatchBackend):
+    """uses watchdog to receive file system events for local folders """
+    name = "notify"
+
+    def __init__(self, folder):
+        super(NotifyWatchBackend, self).__init__(folder)
+        if watchdog is None:
+            raise ImportError("watchdog is not installed. Cannot use notify watch folder backend")
+        self.eventQueue = Queue.Queue()
+        self.observer = None
+        self.initialScanDone = False
+
+    def start(self):
+        self.observer = watchdog.observers.Observer()
+        self.observer.schedule(_QueueingEventHandler(self.eventQueue), self.folder, recursive=False)
+        self.observer.daemon = True
+        self.observer.start()
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+
+    def poll(self):
+        if not self.initialScanDone:#files already in the folder before we started watching
+            self.initialScanDone = True
+            return self._addFiles(listImageFiles(self.folder))
+        files = {}
+        while True:
+            try:
+                eventType, path = self.eventQueue.get_nowait()
+            except Queue.Empty:
+                break
+            name = os.path.basename(path)
+            if not isImageFile(name):
+                continue
+            if eventType == "deleted":
+                files.pop(name, None)
+                self.knownFiles.pop(name, None)
+                continue
+            try:
+                files[name] = os.path.getmtime(path)
+            except OSError:
+                continue
+        return self._addFiles(files)
+
+
+def createWatchBackend(folder, backend="auto"):
+    """returns a started watch backend for folder. backend is one of backendNames.
+    auto uses notifications for local folders if watchdog is installed and polling otherwise"""
+    if backend == "auto":
+        backend = "poll" if (watchdog is None or isNetworkPath(folder)) else "notify"
+    if backend == "notify":
+        try:
+            watchBackend = NotifyWatchBackend(folder)
+            watchBackend.start()
+            logger.info("watching %s with file system notifications" % folder)
+            return watchBackend
+        except Exception as e:
+            logger.error("could not start notify watch backend (%s). Falling back to polling" % e)
+    watchBackend = PollingWatchBackend(folder)
+    watchBackend.start()
+    logger.info("watching %s by polling" % folder)
+    return watchBackend
+
+
+def siblingFiles(path):
+    """returns the other frames that are written together with path and are needed to process it.
+    Andor Solis saves series as _X1.tif, _X2.tif, the basler saves _atoms.png and _light.png"""
+    if path.endswith("_X2.tif"):
+        return [path.replace("_X2.tif","_X1.tif")]
+    if path.split("_")[-1] == "atoms.png":
+        return [path.split("atoms.png")[0]+"light.png"]
+    return []
+
+def isImageComplete(path):
+    """cheap check that the header of the image can be parsed and, for formats that
+    have one, that the end of file marker has been written"""
+    extension = os.path.splitext(path)[1]
+    try:
+        with open(path, "rb") as f:
+            if extension == ".png" or extension == ".jpg":
+                f.seek(-12, os.SEEK_END)
+                trailer = f.read()
+                if extension == ".png" and "IEND" not in trailer:
+                    return False
+                if extension == ".jpg" and not trailer.endswith("\xff\xd9"):
+                    return False
+                f.seek(0)
+            if Image is not None:
+                Image.open(f).size#only reads the header
+    except (IOError, OSError, ValueError):#also raised by PIL for an unreadable header
+        return False
+    return True
+
+
+class FileReadiness(object):
+    """checks whether path and its siblings are completely written: they all exist,
+    have the same non zero size on two consecutive stats and have a parsable header.
+    check() doesn't block and can be called repeatedly (e.g. from the gui timer),
+    the exponential backoff between stats is respected. wait() blocks until the files
+    are ready or the timeout is reached"""
+
+    def __init__(self, path, siblings=None, firstDelay=0.002, maxDelay=0.25):
+        self.path = path
+        self.paths = [path] + (siblingFiles(path) if siblings is None else list(siblings))
+        self.firstDelay = firstDelay
+        self.maxDelay = maxDelay
+        self.delay = firstDelay
+        self.lastSizes = None
+        self.nextCheckTime = 0.0
+        self.ready = False
+        self.startTime = time.time()
+
+    def _sizes(self):
+        try:
+            return [os.stat(p).st_size for p in self.paths]
+        except OSError:
+            return None
+
+    def check(self):
+        """returns True if the files are ready. Returns False without touching the
+        file system if it is called before the backoff delay has passed"""
+        if self.ready:
+            return True
+        now = time.time()
+        if now < self.nextCheckTime:
+            return False
+        sizes = self._sizes()
+        if sizes is not None and sizes == self.lastSizes and min(sizes)>0:
+            if all(isImageComplete(p) for p in self.paths):
+                self.ready = True
+                return True
+        if sizes != self.lastSizes:#still being written, start backing off again from the shortest delay
+            self.delay = self.firstDelay
+        self.lastSizes = sizes
+        self.nextCheckTime = now + self.delay
+        self.delay = min(2*self.delay, self.maxDelay)
+        return False
+
+    def timedOut(self, timeout=5.0):
+        """True if the files still weren't ready timeout seconds after this check was created"""
+        return time.time() - self.startTime > timeout
+
+    def wait(self, timeout=5.0):
+        """blocks until the files are ready. Returns False if timeout (seconds) was reached"""
+        deadline = time.time() + timeout
+        while not self.check():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                logger.warning("%s not completely written after %s s. Continuing anyway" % (self.paths, timeout))
+                return False
+            time.sleep(max(0.0, min(self.nextCheckTime - time.time(), remaining)))
+        return True
+
+def waitUntilReady(path, siblings=None, timeout=5.0):
+    """blocks until path (and its sibling frames) are completely written. see FileReadiness"""
+    return FileReadiness(path, siblings).wait(timeout)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: coordinateGrid.py
+
+Shared cache of the coordinate grids that the fit functions are evaluated on.
+
+Fit functions used to receive positions = array([tile(xs, len(ys)), repeat(ys, len(xs))])
+which was built again for every fit and every redraw. A CoordinateGrid instead
+gives positions[0] as an x row of shape (1, len(xs)) and positions[1] as a y column
+of shape (len(ys), 1). As the fit functions are element wise, numpy broadcasting
+makes them return the full (len(ys), len(xs)) image without the tiled arrays ever
+being allocated. The tiled 2 x N array is still available (built once, lazily)
+through numpy.asarray(grid) for code that needs it.
+
+GridModel is an lmfit.Model that fits 2D data on such a grid (the residual is
+ravelled for the least squares routine). If the fit function has an analytic
+jacobian it can provide the Dfun for leastsq.
+
+binArrays block averages an image and its coordinates for the coarse stages of
+coarse to fine fitting.
+"""
+
+import collections
+import threading
+
+import numpy as np
+import lmfit
+
+_maxCachedGrids = 16
+_cache = collections.OrderedDict()# key: CoordinateGrid, least recently used first
+_cacheLock = threading.Lock()# fits run in several FitThreads
+
+
+class CoordinateGrid(object):
+    """coordinates xs (along an image row) and ys (along an image column) of an image.
+    grid[0] and grid[1] are broadcastable x and y views"""
+
+    def __init__(self, xs, ys):
+        self.xs = np.asarray(xs)
+        self.ys = np.asarray(ys)
+        self.x = self.xs[np.newaxis, :]
+        self.y = self.ys[:, np.newaxis]
+        self.shape = (len(self.ys), len(self.xs))# shape of the image on this grid
+        self._positions = None
+
+    def __getitem__(self, index):
+        return (self.x, self.y)[index]
+
+    def __array__(self, dtype=None):
+        """the old style 2 x N positions array (x varies fastest)"""
+        if self._positions is None:
+            positions = np.array([np.tile(self.xs, len(self.ys)), np.repeat(self.ys, len(self.xs))])
+            positions.flags.writeable = False# shared between fits
+            self._positions = positions
+        if dtype is not None:
+            return self._positions.astype(dtype)
+        return self._positions
+
+    def __getstate__(self):
+        """don't send the materialised positions to fit worker processes """
+        return {"xs":self.xs, "ys":self.ys}
+
+    def __setstate__(self, state):
+        self.__init__(state["xs"], state["ys"])
+
+
+def getGrid(xs, ys):
+    """returns the cached CoordinateGrid for xs, ys (e.g. the sub space arrays of a fit).
+    The key is the content of the arrays so slices of the same image share a grid"""
+    xs = np.asarray(xs)
+    ys = np.asarray(ys)
+    key = (xs.dtype.str, xs.tostring(), ys.dtype.str, ys.tostring())
+    with _cacheLock:
+        grid = _cache.pop(key, None)
+        if grid is None:
+            grid = CoordinateGrid(xs.copy(), ys.copy())
+        _cache[key] = grid
+        while len(_cache) > _maxCachedGrids:
+            _cache.popitem(last=False)
+    return grid
+
+def binArrays(xs, ys, zs, factor):
+    """returns xs, ys, zs block averaged over factor x factor pixels. Rows and columns
+    that don't fill a whole block are dropped. The binned coordinates are the centres of
+    the blocks, so fit parameters in units of xs, ys are the same as for the full arrays"""
+    nx = len(xs)//factor
+    ny = len(ys)//factor
+    binnedXs = np.asarray(xs)[:nx*factor].reshape(nx, factor).mean(axis=1)
+    binnedYs = np.asarray(ys)[:ny*factor].reshape(ny, factor).mean(axis=1)
+    binnedZs = np.asarray(zs)[:ny*factor, :nx*factor].reshape(ny, factor, nx, factor).mean(axis=(1, 3))
+    return binnedXs, binnedYs, binnedZs
+
+
+class GridModel(lmfit.Model):
+    """lmfit Model for fit functions evaluated on a CoordinateGrid. The data is the 2D image,
+    the residual is ravelled as lmfit's minimizer expects a 1D array.
+    jacobianFunc takes the same arguments as the fit function and returns a dictionary
+    of parameter name: derivative of the fit function (broadcastable to the image)"""
+
+    def __init__(self, func, jacobianFunc=None, **kwargs):
+        super(GridModel, self).__init__(func, **kwargs)
+        self.jacobianFunc = jacobianFunc
+
+    def _residual(self, params, data, weights, **kwargs):
+        diff = self.eval(params, **kwargs) - data
+        if weights is not None:
+            diff *= weights
+        return np.asarray(diff).ravel()
+
+    def jacobian(self, params, data, weights, **kwargs):
+        """Dfun for leastsq (use with col_deriv=1). Returns one row per varying parameter,
+        in the order the minimizer uses, with respect to the internal (bounded) values"""
+        derivatives = self.jacobianFunc(**self.make_funcargs(params, kwargs))
+        varyNames = [name for name, par in params.items() if par.vary and par.expr is None]
+        jac = np.empty((len(varyNames), np.size(data)))
+        for row, name in zip(jac, varyNames):
+            row.reshape(np.shape(data))[...] = derivatives[self._strip_prefix(name)]
+            par = params[name]
+            row *= par.scale_gradient(par.setup_bounds())# chain rule for min/max bounds
+            if weights is not None:
+                row *= np.ravel(weights)
+        return jac
+
+    def fitKwargs(self, analytic=True):
+        """fit_kws to pass to fit. Empty (i.e. finite differences) if analytic is False or there is no jacobian"""
+        if analytic and self.jacobianFunc is not None:
+            return {"Dfun": self.jacobian, "col_deriv": 1}
+        return {}
@@ -5,6 +5,11 @@ Created on Sun Jan 17 14:01:18 2016
 @author: tharrison
 """
 from fits import Fit, Parameter, CalculatedParameter
+import jacobians
+import coordinateGrid
+import traits.api as traits
+import traitsui.api as traitsui
+import numpy as np
 import scipy
 import logging
 import polylog
@@ -12,6 +17,15 @@ import polylog
 logger=logging.getLogger("ExperimentEagle.fits")
 class FermiGasFit(Fit):
     """Sub class of Fit which implements a Parabola fit  """
+    roiSizeParameters = [("sigmaX","sigmaY")]
+    lookupTableBool = traits.Bool(False, desc="Evaluate the polylog in the fit with a lookup table (faster). The extra error is below 1.25e-7 (see polylog.FermiPolyTable)")
+
+    # the groups of Fit are view elements of the class, not class attributes, so they are included by name
+    traits_view = traitsui.View(
+                        traitsui.VGroup(traitsui.Include("generalGroup"), traitsui.HGroup(traitsui.Item("lookupTableBool", label="Polylog lookup table?", resizable=True)),
+                                        traitsui.Include("variablesGroup"), traitsui.Include("derivedGroup"), traitsui.Include("actionsGroup")), kind="subpanel"
+                    )
+
     def __init__(self, **traitsDict):
         super(FermiGasFit, self).__init__(**traitsDict)
         self.function = "A*Li_2(-exp(betaMu)*exp(-(x-x0)^2/2sigmax^2)*exp(-(y-y0)^2/2sigmay^2))/Li_2(-exp(betaMu))+B"
@@ -46,6 +60,28 @@ class FermiGasFit(Fit):
         """
         return A*(polylog.fermi_poly2(betaMu-((positions[0]-x0)/(2*sigmaX))**2.-((positions[1]-y0)/(2*sigmaY))**2.))/(polylog.fermi_poly2(betaMu))+B
 
+    @staticmethod
+    def fitFuncTable(positions,x0,y0,A,sigmaX,sigmaY,betaMu,B ):
+        """fitFunc using the lookup table polylog.fermi_poly2_table. Used for fitting when lookupTableBool is True"""
+        return A*(polylog.fermi_poly2_table(betaMu-((positions[0]-x0)/(2*sigmaX))**2.-((positions[1]-y0)/(2*sigmaY))**2.))/(polylog.fermi_poly2(betaMu))+B
+
+    def _lookupTableBool_changed(self):
+        self.lmfitModel = coordinateGrid.GridModel(self.fitFuncTable if self.lookupTableBool else self.fitFunc, self.fitJacobian)
+
+    @staticmethod
+    def fitJacobian(positions,x0,y0,A,sigmaX,sigmaY,betaMu,B ):
+        """analytic derivatives of fitFunc for each parameter.
+        uses d/dz fermi_poly2(z) = log(1+e^z)"""
+        X = (positions[0]-x0)/(2*sigmaX)
+        Y = (positions[1]-y0)/(2*sigmaY)
+        argument = betaMu-X**2.-Y**2.
+        F = polylog.fermi_poly2(argument)
+        F0 = polylog.fermi_poly2(betaMu)
+        dFdArgument = A*np.logaddexp(0, argument)/F0
+        return {"x0":dFdArgument*(X/sigmaX), "y0":dFdArgument*(Y/sigmaY),
+                "A":F/F0, "sigmaX":dFdArgument*(2*X**2./sigmaX), "sigmaY":dFdArgument*(2*Y**2./sigmaY),
+                "betaMu":dFdArgument - A*F*np.logaddexp(0, betaMu)/F0**2, "B":1.0}
+
     def _getIntelligentInitialValues(self):
         xs,ys,zs = self._get_subSpaceArrays()#returns the full arrays if subspace not used
         logger.debug("attempting to set initial values intellgently")
@@ -10,6 +10,7 @@ import scipy
 import numpy as np
 
 from fits import Fit, Parameter, CalculatedParameter
+import jacobians
 
 logger=logging.getLogger("ExperimentEagle.fits")
 
@@ -67,6 +68,14 @@ class GaussianFit(Fit):
         """
         return (A*scipy.exp(-(positions[0]-x0)**2/(2.*sigmax**2)-(positions[1]-y0)**2/(2.*sigmay**2))+B)
                   
+    @staticmethod
+    def fitJacobian(positions, A,x0,sigmax,y0,sigmay,B):
+        """analytic derivatives of fitFunc for each parameter. The gaussian is separable
+        so the exponentials are only evaluated along x and y (see jacobians.py)"""
+        derivatives = jacobians.gaussianTerms(positions[0], positions[1], A, x0, sigmax, y0, sigmay)
+        derivatives["B"] = 1.0
+        return derivatives
+
     def _deriveCalculatedParameters(self):
         """"Updates all the calculated parameters """
         #atom number N
@@ -156,8 +165,9 @@ class GaussianFit(Fit):
         self.summedODAtomNumber.value = summedODAtomNumber
         logger.info("Derived values from fit" )
 
-        # signal-to-noise
-        background = np.ravel(zs) - self.mostRecentModelResult.best_fit
+        # signal-to-noise, from the residual of the fitted window (best_fit has the shape of the auto ROI window)
+        fittedXs, fittedYs, fittedZs = self._getFittedArrays()
+        background = np.ravel(fittedZs) - np.ravel(self.mostRecentModelResult.best_fit)
         self.signalToNoise.value = self.A.calculatedValue / np.std(background)
 
 
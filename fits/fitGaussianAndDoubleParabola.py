@@ -10,6 +10,7 @@ Fit function for 2-parabola profile4
 """
 
 from fits import Fit, Parameter, CalculatedParameter
+import jacobians
 import scipy
 import logging
 
@@ -17,6 +18,8 @@ logger = logging.getLogger("ExperimentEagle.fits")
 
 
 class GaussianAndDoubleParabolaFit(Fit):
+    roiSizeParameters = [("sigmax","sigmay"),("wParabX_1","wParabY_1"),("wParabX_2","wParabY_2")]
+
     def __init__(self, **traitsDict):
         super(GaussianAndDoubleParabolaFit, self).__init__(**traitsDict)
         self.function = """AGauss*scipy.exp(-(positions[0]-x0)**2/(2.*sigmax**2)-(positions[1]-y0)**2/(2.*sigmay**2))+
@@ -88,6 +91,19 @@ class GaussianAndDoubleParabolaFit(Fit):
                AParab_2 * (1 - ((positions[0] - (x0 - distX / 2.0)) / wParabX_2) ** 2 - (
                (positions[1] - (y0 - distY / 2.0)) / wParabY_2) ** 2).clip(0) ** (1.5) + B
 
+    @staticmethod
+    def fitJacobian(positions, x0, y0, distX, distY, AGauss, sigmax, sigmay, AParab_1, wParabX_1, wParabY_1, AParab_2,
+                wParabX_2, wParabY_2, B):
+        """analytic derivatives of fitFunc for each parameter (see jacobians.py) """
+        gauss = jacobians.gaussianTerms(positions[0], positions[1], AGauss, x0, sigmax, y0, sigmay)
+        parab1 = jacobians.parabolaTerms(positions[0], positions[1], AParab_1, x0 + distX / 2.0, y0 + distY / 2.0, wParabX_1, wParabY_1)
+        parab2 = jacobians.parabolaTerms(positions[0], positions[1], AParab_2, x0 - distX / 2.0, y0 - distY / 2.0, wParabX_2, wParabY_2)
+        return {"x0":gauss["x0"]+parab1["x0"]+parab2["x0"], "y0":gauss["y0"]+parab1["y0"]+parab2["y0"],
+                "distX":0.5*(parab1["x0"]-parab2["x0"]), "distY":0.5*(parab1["y0"]-parab2["y0"]),
+                "AGauss":gauss["A"], "sigmax":gauss["sigmax"], "sigmay":gauss["sigmay"],
+                "AParab_1":parab1["A"], "wParabX_1":parab1["wx"], "wParabY_1":parab1["wy"],
+                "AParab_2":parab2["A"], "wParabX_2":parab2["wx"], "wParabY_2":parab2["wy"], "B":1.0}
+
     def _deriveCalculatedParameters(self):
         """"Updates all the calculated parameters """
 
@@ -154,6 +170,11 @@ class GaussianAndDoubleParabolaFit(Fit):
         # summedOD_total = (summedOD_total*imagePixelArea)*(1.0+4.0*self.physics.imagingDetuningLinewidths**2)/self.physics.selectedElement.crossSectionSigmaPlus
         # self.summedOD_total.value = summedOD_total
 
+    def _getCloudExtent(self, params):
+        """the auto ROI window also has to contain both parabolas, which are distX, distY apart"""
+        x0, y0, halfWidthX, halfWidthY = super(GaussianAndDoubleParabolaFit, self)._getCloudExtent(params)
+        return x0, y0, halfWidthX+abs(params["distX"].value)/2.0, halfWidthY+abs(params["distY"].value)/2.0
+
     def _getIntelligentInitialValues(self):
         xs, ys, zs = self._get_subSpaceArrays()  # returns the full arrays if subspace not used
         logger.debug("attempting to set initial values intellgently")
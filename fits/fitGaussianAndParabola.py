@@ -5,6 +5,7 @@ Created on Sun Jan 17 14:00:12 2016
 @author: tharrison
 """
 from fits import Fit, Parameter, CalculatedParameter
+import jacobians
 import scipy
 import logging
 
@@ -12,6 +13,8 @@ logger=logging.getLogger("ExperimentEagle.fits")
         
 class GaussianAndParabolaFit(Fit):
     """Sub class of Fit which implements a Guassian fit  """
+    roiSizeParameters = [("sigmax","sigmay"),("wParabX","wParabY")]
+
     def __init__(self, **traitsDict):
         super(GaussianAndParabolaFit, self).__init__(**traitsDict)
         self.function = "AGauss*exp(-(x-x0)**2/(2.*sigmax**2)-(y-y0)**2/(2.*sigmay**2))+AParab*(1-((x-x0)/wParabX)**2-((y-y0)/wParabY)**2)**(1.5)+B"
@@ -67,6 +70,15 @@ class GaussianAndParabolaFit(Fit):
         """
         return AGauss*scipy.exp(-(positions[0]-x0)**2/(2.*sigmax**2)-(positions[1]-y0)**2/(2.*sigmay**2))+AParab*((1-((positions[0]-x0)/wParabX)**2-((positions[1]-y0)/wParabY)**2).clip(0)**(1.5))+B
 
+    @staticmethod
+    def fitJacobian(positions,x0,y0,AGauss,sigmax,sigmay,AParab,wParabX,wParabY,B):
+        """analytic derivatives of fitFunc for each parameter (see jacobians.py) """
+        gauss = jacobians.gaussianTerms(positions[0], positions[1], AGauss, x0, sigmax, y0, sigmay)
+        parab = jacobians.parabolaTerms(positions[0], positions[1], AParab, x0, y0, wParabX, wParabY)
+        return {"x0":gauss["x0"]+parab["x0"], "y0":gauss["y0"]+parab["y0"], "AGauss":gauss["A"],
+                "sigmax":gauss["sigmax"], "sigmay":gauss["sigmay"], "AParab":parab["A"],
+                "wParabX":parab["wx"], "wParabY":parab["wy"], "B":1.0}
+
     def _getIntelligentInitialValues(self):
         xs,ys,zs = self._get_subSpaceArrays()#returns the full arrays if subspace not used
         logger.debug("attempting to set initial values intellgently")
@@ -5,6 +5,7 @@ Created on Sun Jan 17 14:00:12 2016
 @author: tharrison
 """
 from fits import Fit, Parameter, CalculatedParameter
+import jacobians
 import scipy
 import logging
 from lmfit import  Model
@@ -15,6 +16,8 @@ logger=logging.getLogger("ExperimentEagle.fits")
         
 class GaussianAndParabola1DFit(Fit):
     """Sub class of Fit which implements a bimodal fit in 2D to get initial values, then in 1D  """
+    roiSizeParameters = [("sigmax","sigmay"),("wParabX","wParabY")]
+
     def __init__(self, **traitsDict):
         super(GaussianAndParabola1DFit, self).__init__(**traitsDict)
         self.function = "AGauss*exp(-(x-x0)**2/(2.*sigmax**2)-(y-y0)**2/(2.*sigmay**2))+AParab*(1-((x-x0)/wParabX)**2-((y-y0)/wParabY)**2)**(1.5)+B"
@@ -80,6 +83,15 @@ class GaussianAndParabola1DFit(Fit):
         """
         return AGauss*scipy.exp(-(positions[0]-x0)**2/(2.*sigmax**2)-(positions[1]-y0)**2/(2.*sigmay**2))+AParab*((1-((positions[0]-x0)/wParabX)**2-((positions[1]-y0)/wParabY)**2).clip(0)**(1.5))+B
 
+    @staticmethod
+    def fitJacobian(positions,x0,y0,AGauss,sigmax,sigmay,AParab,wParabX,wParabY,B):
+        """analytic derivatives of fitFunc for each parameter (see jacobians.py) """
+        gauss = jacobians.gaussianTerms(positions[0], positions[1], AGauss, x0, sigmax, y0, sigmay)
+        parab = jacobians.parabolaTerms(positions[0], positions[1], AParab, x0, y0, wParabX, wParabY)
+        return {"x0":gauss["x0"]+parab["x0"], "y0":gauss["y0"]+parab["y0"], "AGauss":gauss["A"],
+                "sigmax":gauss["sigmax"], "sigmay":gauss["sigmay"], "AParab":parab["A"],
+                "wParabX":parab["wx"], "wParabY":parab["wy"], "B":1.0}
+
     def _getIntelligentInitialValues(self):
         xs,ys,zs = self._get_subSpaceArrays()#returns the full arrays if subspace not used
         logger.debug("attempting to set initial values intellgently")
@@ -6,6 +6,7 @@ Created on Sun Jan 17 13:58:07 2016
 """
 
 from fits import Fit, Parameter, CalculatedParameter
+import jacobians
 import scipy
 import logging
 
@@ -13,6 +14,8 @@ logger=logging.getLogger("ExperimentEagle.fits")
 
 class RotatedGaussianFit(Fit):
     """Sub class of Fit which implements a Rotated Guassian fit  """
+    roiSizeParameters = [("sigmax","sigmay"),("sigmay","sigmax")]#the cloud can be rotated
+
     def __init__(self, **traitsDict):
         super(RotatedGaussianFit, self).__init__(**traitsDict)
         self.function = "(A*exp( -(( (y-y0)*cos(theta)+(x-x0)*Sin(theta))**2/(2*sigmay**2)) - ( + (x-x0)*cos(theta) - (y-y0)*sin(theta))**2/(2*sigmax**2))+B)"
@@ -57,6 +60,13 @@ class RotatedGaussianFit(Fit):
         theta = scipy.pi*theta/180.0
         return (A*scipy.exp(-(((positions[1]-y0)*scipy.cos(theta)+(positions[0]-x0)*scipy.sin(theta))**2/(2*sigmay**2)) - ((positions[0]-x0)*scipy.cos(theta) - (positions[1]-y0)*scipy.sin(theta))**2/(2*sigmax**2))+B)
 
+    @staticmethod
+    def fitJacobian(positions, A,x0,sigmax,y0,sigmay,theta,B):
+        """analytic derivatives of fitFunc for each parameter (see jacobians.py) """
+        derivatives = jacobians.rotatedGaussianTerms(positions[0], positions[1], A, x0, sigmax, y0, sigmay, theta)
+        derivatives["B"] = 1.0
+        return derivatives
+
     def _deriveCalculatedParameters(self):
         """"Updates all the calculated parameters """
         #atom number N
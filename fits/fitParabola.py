@@ -5,6 +5,7 @@ Created on Sun Jan 17 14:01:06 2016
 @author: tharrison
 """
 from fits import Fit, Parameter, CalculatedParameter
+import jacobians
 import scipy
 import logging
 
@@ -12,6 +13,8 @@ logger=logging.getLogger("ExperimentEagle.fits")
                 
 class ParabolaFit(Fit):
     """Sub class of Fit which implements a Parabola fit  """
+    roiSizeParameters = [("wParabX","wParabY")]
+
     def __init__(self, **traitsDict):
         super(ParabolaFit, self).__init__(**traitsDict)
         self.function = "AParab*(1-((x-x0)/wParabX)**2-((y-y0)/wParabY)**2)**(1.5)+B"
@@ -53,6 +56,12 @@ class ParabolaFit(Fit):
         """
         return AParab*((1-((positions[0]-x0)/wParabX)**2-((positions[1]-y0)/wParabY)**2).clip(0)**(1.5))+B
 
+    @staticmethod
+    def fitJacobian(positions,x0,y0,AParab,wParabX,wParabY,B ):
+        """analytic derivatives of fitFunc for each parameter (see jacobians.py) """
+        parab = jacobians.parabolaTerms(positions[0], positions[1], AParab, x0, y0, wParabX, wParabY)
+        return {"x0":parab["x0"], "y0":parab["y0"], "AParab":parab["A"], "wParabX":parab["wx"], "wParabY":parab["wy"], "B":1.0}
+
     def _getIntelligentInitialValues(self):
         xs,ys,zs = self._get_subSpaceArrays()#returns the full arrays if subspace not used
         logger.debug("attempting to set initial values intellgently")
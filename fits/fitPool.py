@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: fitPool.py
+
+Optional process pool for performing fits. lmfit holds the GIL for most of
+the fit so fits running in FitThreads compete for one core. When a Fit has
+processPoolBool set, Fit._perform_fit sends only the (sub space) image, the
+coordinate grid and the parameters to a worker process and gets back a
+FitResultSummary. Everything else (auto draw, logging, saveLastFit, auto
+previous) still runs in the FitThread of the main process.
+"""
+
+import logging
+import multiprocessing
+import importlib
+import time
+
+import lmfit
+
+import coordinateGrid
+
+logger=logging.getLogger("ExperimentEagle.fits")
+
+_pool = None
+_workerModels = {}# (module, class, fit function): lmfit.Model, cached in each worker process
+
+
+class FitResultSummary(object):
+    """picklable subset of an lmfit ModelResult. Has the attributes used by
+    Fit, its subclasses and lmfit.fit_report"""
+    def __init__(self, modelFitResult):
+        self.paramsJSON = modelFitResult.params.dumps()
+        self.message = modelFitResult.message
+        self.success = modelFitResult.success
+        self.best_fit = modelFitResult.best_fit
+        for attribute in ["nfev", "ndata", "nvarys", "chisqr", "redchi"]:
+            setattr(self, attribute, getattr(modelFitResult, attribute, None))
+        self._params = None
+
+    @property
+    def params(self):
+        if self._params is None:
+            self._params = lmfit.Parameters()
+            self._params.loads(self.paramsJSON)
+        return self._params
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_params"] = None
+        return state
+
+
+def getPool():
+    """returns the process pool, starting it on first use. One core is left for the gui"""
+    global _pool
+    if _pool is None:
+        processes = max(1, multiprocessing.cpu_count()-1)
+        logger.info("starting fit process pool with %s processes" % processes)
+        _pool = multiprocessing.Pool(processes=processes)
+    return _pool
+
+def closePool():
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+
+
+class _TimeLimitExceeded(Exception):
+    pass
+
+def _fitInWorker(moduleName, className, functionName, zs, positions, paramsJSON, timeLimit, analyticJacobian):
+    """runs in a worker process. staticmethod fit functions can't be pickled
+    in python 2, so the fit class is imported and the fit function found by name.
+    Returns None if the time limit was exceeded"""
+    key = (moduleName, className, functionName)
+    if key not in _workerModels:
+        fitClass = getattr(importlib.import_module(moduleName), className)
+        _workerModels[key] = coordinateGrid.GridModel(getattr(fitClass, functionName), fitClass.fitJacobian)
+    params = lmfit.Parameters()
+    params.loads(paramsJSON)
+    kwargs = {"fit_kws":_workerModels[key].fitKwargs(analyticJacobian)}
+    if timeLimit is not None:
+        startTime = time.time()
+        def fitCallback(params, iter, resid, *args, **kws):
+            if time.time()-startTime>timeLimit:
+                raise _TimeLimitExceeded()
+        kwargs["iter_cb"] = fitCallback
+    try:
+        modelFitResult = _workerModels[key].fit(zs, positions=positions, params=params, **kwargs)
+    except _TimeLimitExceeded:
+        return None
+    return FitResultSummary(modelFitResult)
+
+def performFit(fit, zs, positions, params, timeLimit=None, analyticJacobian=True):
+    """fits the 2D array zs on the CoordinateGrid positions with the model of fit (a Fit instance) in the process pool.
+    Blocks the calling FitThread (not the GIL) until the result is back.
+    Returns a FitResultSummary or None if the time limit was exceeded"""
+    fitClass = type(fit)
+    asyncResult = getPool().apply_async(_fitInWorker, (fitClass.__module__, fitClass.__name__, fit.lmfitModel.func.__name__, zs, positions, params.dumps(), timeLimit, analyticJacobian))
+    return asyncResult.get()
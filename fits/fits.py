@@ -22,9 +22,12 @@ import processors#used to extract processor options that were used during the fi
 import plotObjects.logLibrarian
 import time
 import lmfit
+import fitPool
+import coordinateGrid
+import logWriter
+import logTombstones
 
 
-import shutil
 import importlib
 from pyface.api import FileDialog
 import pyface.constant
@@ -258,6 +261,14 @@ class Fit(traits.HasTraits):
     fitThread = None
     fitTimeLimit = traits.Float(10.0, desc="Time limit in seconds for fitting function. Only has an effect when fitTimeLimitBool is True")
     fitTimeLimitBool = traits.Bool(True, desc="If True then fitting functions will be limited to time limit defined by fitTimeLimit ")
+    processPoolBool = traits.Bool(False, desc="If True the fit is performed in a separate process so that several fits can run in parallel on different cores")
+    coarseToFineBool = traits.Bool(False, desc="When fitting the whole image (no sub space) first fit block averaged copies of the image and use the result as the starting point of the full resolution fit")
+    coarseToFineLevels = traits.Str("8,2", desc="comma separated binning factors of the coarse fits, performed from coarsest to finest before the full resolution fit")
+    fitTimings = traits.Str(desc="time taken by each stage of the last fit")
+    autoROIBool = traits.Bool(False, desc="Only fit a window around the cloud. The window is centred on x0, y0 of the initial values (or of the coarse fit) and extends autoROISigmas times the size of the cloud in each direction")
+    autoROISigmas = traits.Float(4.0, desc="half width of the auto ROI window in units of the cloud size (e.g. sigma for a gaussian)")
+    fitWindow = traits.Str(desc="startX:endX,startY:endY pixel indices of the image region used by the last fit. Recorded in the log")
+    analyticJacobianBool = traits.Bool(True, desc="If True and the fit function provides an analytic jacobian it is used by the fit instead of finite differences")
     physics = traits.Instance(physicsProperties.physicsProperties.PhysicsProperties)
     #status strings
     notFittedForCurrentStatus = "Not Fitted for Current Image"
@@ -268,6 +279,7 @@ class Fit(traits.HasTraits):
     
     lmfitModel = traits.Instance(lmfit.Model)#reference to the lmfit model  must be initialised in subclass
     mostRecentModelResult = None # updated to the most recent ModelResult object from lmfit when a fit thread is performed
+    fittedArrays = None # (xs, ys, zs) of the most recent full resolution fit, i.e. the auto ROI window if it was used. best_fit has the shape of these zs
     
     fitSubSpaceGroup = traitsui.VGroup(
                             traitsui.HGroup(
@@ -278,6 +290,16 @@ class Fit(traits.HasTraits):
                                 traitsui.HGroup(traitsui.Item("startX", resizable=True),traitsui.Item("startY", resizable=True)),
                                 traitsui.HGroup(traitsui.Item("endX", resizable=True),traitsui.Item("endY", resizable=True)),
                                 visible_when="fitSubSpace"
+                            ),
+                            traitsui.HGroup(
+                                traitsui.Item("coarseToFineBool", label="Coarse to fine?", resizable=True),
+                                traitsui.Item("coarseToFineLevels", label="binning", resizable=True, enabled_when="coarseToFineBool"),
+                                visible_when="not fitSubSpace"
+                            ),
+                            traitsui.HGroup(
+                                traitsui.Item("autoROIBool", label="Auto ROI?", resizable=True),
+                                traitsui.Item("autoROISigmas", label="sizes", resizable=True, enabled_when="autoROIBool"),
+                                traitsui.Item("fitWindow", label="window", style="readonly", resizable=True)
                             ), label="Fit Sub Space", show_border=True
                         )    
     
@@ -305,6 +327,7 @@ class Fit(traits.HasTraits):
             traitsui.HGroup(traitsui.Item("autoDrawBool",label="Auto draw?", resizable=True),traitsui.Item("drawRequestButton", show_label=False, resizable=True)),
             traitsui.HGroup(traitsui.Item("autoSizeBool",label="Auto size?", resizable=True),traitsui.Item("setSizeButton", show_label=False, resizable=True)),
             traitsui.HGroup(traitsui.Item("conditionalFitBool",label="Conditional Fit?", resizable=True),traitsui.Item("conditionalFitID",label="Fit ID", resizable=True)),
+            traitsui.HGroup(traitsui.Item("processPoolBool",label="Separate process?", resizable=True),traitsui.Item("analyticJacobianBool",label="Analytic jacobian?", resizable=True, enabled_when="object.fitJacobian is not None")),
             show_border=True
         )
     )
@@ -321,7 +344,7 @@ class Fit(traits.HasTraits):
                 traitsui.HGroup(traitsui.Item("logAnalyserBool", label = "analyser?", resizable=True),traitsui.Item("logAnalyserDisplayString", show_label=False, style="readonly",resizable=True),traitsui.Item("logAnalyserSelectButton",show_label=False, resizable=True)),
                      label= "Logging", show_border=True)
     
-    actionsGroup = traitsui.VGroup(traitsui.Item("fittingStatus", style="readonly", resizable=True),logGroup, buttons, label="Fit Actions", show_border=True)
+    actionsGroup = traitsui.VGroup(traitsui.Item("fittingStatus", style="readonly", resizable=True),traitsui.Item("fitTimings", style="readonly", resizable=True),logGroup, buttons, label="Fit Actions", show_border=True)
     traits_view = traitsui.View(
                         traitsui.VGroup(generalGroup, variablesGroup,derivedGroup,actionsGroup), kind="subpanel"
                     )
@@ -330,7 +353,7 @@ class Fit(traits.HasTraits):
         super(Fit, self).__init__(**traitsDict)
         # self.startX = 0
         # self.startY = 0
-        self.lmfitModel = lmfit.Model(self.fitFunc)
+        self.lmfitModel = coordinateGrid.GridModel(self.fitFunc, self.fitJacobian)
 
         # load config
         with open(configFile, 'r') as f:
@@ -383,6 +406,13 @@ class Fit(traits.HasTraits):
         else:
             return self.xs,self.ys,self.zs
             
+    def _getFittedArrays(self):
+        """returns the xs, ys, zs that the most recent fit was performed on (the auto ROI window
+        if it was used). Derived values that are compared with the best fit must use these"""
+        if self.fittedArrays is None:
+            return self._get_subSpaceArrays()
+        return self.fittedArrays
+
     def _getIntelligentInitialValues(self):
         """If possible we can auto set the initial parameters to intelligent guesses user can always overwrite them """
         logger.warning("Dummy function should not be called directly")
@@ -394,6 +424,10 @@ class Fit(traits.HasTraits):
         logger.error("Dummy function should not be called directly")
         return
         #in python this should be a pass statement. I.e. user has to overwrite this
+
+    roiSizeParameters = [("sigmax","sigmay")]#x, y size parameters of the cloud used by the auto ROI. The largest is used if there are several
+
+    fitJacobian = None#subclasses can define a staticmethod with the arguments of fitFunc returning a dictionary of parameter name: derivative of fitFunc (see jacobians.py)
         
     def _setCalculatedValues(self, modelFitResult):
         """updates calculated values with calculated argument """
@@ -444,13 +478,15 @@ class Fit(traits.HasTraits):
         self.fittingStatus = self.currentlyFittingStatus
             
     def _perform_fit(self):
-        """Perform the fit using scipy optimise curve fit.
-        We must supply x and y as one argument and zs as anothger. in the form
-        xs: 0 1 2 0 1 2 0 
-        ys: 0 0 0 1 1 1 2
-        zs: 1 5 6 1 9 8 2
-        Hence the use of repeat and tile in  positions and unravel for zs
+        """Perform the fit using lmfit.
+        The fit function is evaluated on a cached coordinate grid (see coordinateGrid.py)
+        positions[0] is a row of xs and positions[1] a column of ys so that the fit
+        function returns a 2D array that is compared with the 2D zs array directly
         initially xs,ys is a linspace array and zs is a 2d image array
+        When the whole image is fitted and coarseToFineBool is True, binned copies of the
+        image are fitted first (see coarseToFineLevels) and each result is the starting point
+        of the next finer fit. The time limit applies to all stages together
+        If autoROIBool is True the full resolution fit only uses a window around the cloud
         """
         if self.xs is None or self.ys is None or self.zs is None:
             logger.warning("attempted to fit data but had no data inside the Fit object. set xs,ys,zs first")
@@ -459,13 +495,85 @@ class Fit(traits.HasTraits):
         if self.fitSubSpace:#fit only the sub space
             #create xs, ys and zs which are appropriate slices of the arrays
             xs,ys,zs = self._get_subSpaceArrays()
+            offsetX, offsetY = self.startX, self.startY
+            binningFactors = []
         else:#fit the whole array of data (slower)
             xs,ys,zs = self.xs,self.ys, self.zs
-        positions = scipy.array([scipy.tile(xs, len(ys)), scipy.repeat(ys, len(xs))])#for creating data necessary for gauss2D function
+            offsetX, offsetY = 0, 0
+            binningFactors = self._getBinningFactors(zs.shape) if self.coarseToFineBool else []
+        startTime = time.time()
+        timings = []
+        for factor in binningFactors:
+            binnedXs, binnedYs, binnedZs = coordinateGrid.binArrays(xs, ys, zs, factor)
+            stageStartTime = time.time()
+            modelFitResult = self._fitStage(binnedZs, coordinateGrid.getGrid(binnedXs, binnedYs), params, startTime)
+            timings.append((factor, time.time()-stageStartTime, modelFitResult.nfev))
+            params = modelFitResult.params
+        startX, endX, startY, endY = 0, len(xs), 0, len(ys)
+        if self.autoROIBool:
+            window = self._getAutoROIWindow(xs, ys, params)
+            if window is not None:
+                startX, endX, startY, endY = window
+                xs, ys, zs = xs[startX:endX], ys[startY:endY], zs[startY:endY,startX:endX]
+        self.fitWindow = "%s:%s,%s:%s" % (offsetX+startX, offsetX+endX, offsetY+startY, offsetY+endY)
+        self.fittedArrays = (xs, ys, zs)
+        stageStartTime = time.time()
+        modelFitResult = self._fitStage(zs, coordinateGrid.getGrid(xs, ys), params, startTime)
+        timings.append((1, time.time()-stageStartTime, modelFitResult.nfev))
+        self.fitTimings = ", ".join(["%sx%s: %.3fs (%s evaluations)" % (factor, factor, seconds, nfev) for factor, seconds, nfev in timings])
+        logger.info("fit stage timings %s" % self.fitTimings)
+        return modelFitResult
+
+    def _getBinningFactors(self, shape):
+        """parses coarseToFineLevels. returns the binning factors from coarsest to finest,
+        ignoring factors that would leave fewer than 8 pixels along an axis"""
+        try:
+            factors = set(int(level) for level in self.coarseToFineLevels.split(",") if level.strip())
+        except ValueError:
+            logger.error("could not read binning factors %s. fitting full resolution only" % self.coarseToFineLevels)
+            return []
+        return sorted([factor for factor in factors if 1<factor<=min(shape)//8], reverse=True)
+
+    def _getCloudExtent(self, params):
+        """returns x0, y0 and the half widths in x and y of the auto ROI window for the values in params"""
+        sizeX = max(abs(params[nameX].value) for nameX, nameY in self.roiSizeParameters)
+        sizeY = max(abs(params[nameY].value) for nameX, nameY in self.roiSizeParameters)
+        return params["x0"].value, params["y0"].value, self.autoROISigmas*sizeX, self.autoROISigmas*sizeY
+
+    def _getAutoROIWindow(self, xs, ys, params, minimumSize=16):
+        """returns startX, endX, startY, endY indices into xs, ys of the auto ROI window, at least
+        minimumSize pixels along each axis. Returns None (fit everything) if the window can't be found"""
+        try:
+            x0, y0, halfWidthX, halfWidthY = self._getCloudExtent(params)
+        except KeyError as e:
+            logger.error("auto ROI needs parameter %s. fitting without auto ROI" % e.message)
+            return None
+        if not (scipy.isfinite([x0, y0, halfWidthX, halfWidthY]).all() and halfWidthX>0 and halfWidthY>0):
+            logger.warning("no sensible cloud size for the auto ROI. fitting without auto ROI")
+            return None
+        window = []
+        for coordinates, centre, halfWidth in [(xs, x0, halfWidthX), (ys, y0, halfWidthY)]:
+            start, end = scipy.searchsorted(coordinates, [centre-halfWidth, centre+halfWidth])
+            if end-start<minimumSize:#too small or outside the image. grow around the centre
+                middle = min(max((start+end)//2, minimumSize//2), len(coordinates)-minimumSize//2)
+                start, end = max(0, middle-minimumSize//2), min(len(coordinates), middle+minimumSize//2)
+            window += [int(start), int(end)]
+        logger.info("auto ROI window %s" % window)
+        return window
+
+    def _fitStage(self, zs, positions, params, startTime):
+        """performs a single fit of zs on the CoordinateGrid positions starting from params"""
+        if self.processPoolBool:#fit in a worker process, only the arrays and parameters are sent
+            timeLimit = self.fitTimeLimit-(time.time()-startTime) if self.fitTimeLimitBool else None
+            modelFitResult = fitPool.performFit(self, zs, positions, params, timeLimit, self.analyticJacobianBool)
+            if modelFitResult is None:
+                raise FitException("Fit time exceeded user limit")
+            return modelFitResult
+        fitKwargs = self.lmfitModel.fitKwargs(self.analyticJacobianBool)
         if self.fitTimeLimitBool:
-            modelFitResult = self.lmfitModel.fit(scipy.ravel(zs), positions=positions, params=params, iter_cb = self.getFitCallback(time.time()))        
+            modelFitResult = self.lmfitModel.fit(zs, positions=positions, params=params, iter_cb = self.getFitCallback(startTime), fit_kws=fitKwargs)        
         else:#no iter callback
-            modelFitResult = self.lmfitModel.fit(scipy.ravel(zs), positions=positions, params=params)
+            modelFitResult = self.lmfitModel.fit(zs, positions=positions, params=params, fit_kws=fitKwargs)
         return modelFitResult
         
     def getFitCallback(self, startTime):
@@ -498,7 +606,7 @@ class Fit(traits.HasTraits):
     def _getFitFuncData(self):
         """if data has been fitted, this returns the zs data for the ideal
         fitted function using the calculated paramters"""
-        positions = [scipy.tile(self.xs, len(self.ys)), scipy.repeat(self.ys, len(self.xs))]#for creating data necessary for gauss2D function
+        positions = coordinateGrid.getGrid(self.xs, self.ys)
         zsravelled = self.fitFunc(positions, *self._getCalculatedValues())
         return zsravelled.reshape(self.zs.shape)
         
@@ -566,56 +674,26 @@ class Fit(traits.HasTraits):
                 
             
     def _log_fit(self):
-        
+        """collects the row for the log and queues it for the log writer (see logWriter.py), which
+        also initialises the log folder and copies the image, so the fit thread doesn't wait for the NAS"""
         if self.logName=="":
             logger.warning("no log file defined. Will not log")
             return
-        #generate folders if they don't exist
         if self.logToNas is not True:
             logFolder = os.path.join(self.logDirectory,self.logName)
         else:
             logFolder = os.path.join(self.logDirectoryNas,self.logName)
-        if not os.path.isdir(logFolder):
-            logger.info("creating a new log folder %s" % logFolder)
-            os.mkdir(logFolder)
-
-        imagesFolder = os.path.join(logFolder,"images" )
-        if not os.path.isdir(imagesFolder):
-            logger.info("creating a new images Folder %s" % imagesFolder)
-            os.mkdir(imagesFolder)
-            
-        commentsFile = os.path.join(logFolder,"comments.txt" )
-        if not os.path.exists(commentsFile):
-            logger.info("creating a comments file %s" % commentsFile)
-            open(commentsFile,"a+").close()#create a comments file in every folder!
-        
-        firstSequenceCopy = os.path.join(logFolder,"copyOfInitialSequence.ctr" )
-        if not os.path.exists(firstSequenceCopy):
-            logger.info("creating a copy of the first sequence %s -> %s" % (self.latestSequence, firstSequenceCopy))
-            shutil.copy(self.latestSequence, firstSequenceCopy)
         
+        processorOptions = None
         if self.imageInspectorReference.model.imageMode == "process raw image":#if we are using a processor, save the details of the processor used to the log folder
-            processorParamtersFile = os.path.join(logFolder, "processorOptions.txt")
-            processorPythonScript = os.path.join(logFolder, "usedProcessor.py")#TODO!
-            if not os.path.exists(processorParamtersFile):
-                with open(processorParamtersFile,"a+") as processorParamsFile:
-                    string = str(self.imageInspectorReference.model.chosenProcessor)+"\n"
-                    string += str(self.imageInspectorReference.model.processor.optionsDict)
-                    processorParamsFile.write(string)
-            
-            
-        logger.debug("finished all checks on log folder")
-        #copy current image
-        try:
-            shutil.copy(self.imageInspectorReference.selectedFile, imagesFolder)
-            if self.imageInspectorReference.selectedFile.endswith("_X2.tif"):
-                shutil.copy(self.imageInspectorReference.selectedFile.replace("_X2.tif","_X1.tif"), imagesFolder)
-        except IOError as e:
-            logger.error("Could not copy image. Got IOError: %s " % e.message)
-        except Exception as e:
-            logger.error("Could not copy image. Got %s: %s " % (type(e),e.message))
-            raise e
-        logger.info("copying current image")
+            processorOptions = str(self.imageInspectorReference.model.chosenProcessor)+"\n"
+            processorOptions += str(self.imageInspectorReference.model.processor.optionsDict)
+        
+        #images to copy
+        selectedFile = self.imageInspectorReference.selectedFile
+        imageFiles = [selectedFile]
+        if selectedFile.endswith("_X2.tif"):
+            imageFiles.append(selectedFile.replace("_X2.tif","_X1.tif"))
         self.logFile = os.path.join(logFolder, self.logName+".csv")
         
         #analyser logic
@@ -632,33 +710,23 @@ class Fit(traits.HasTraits):
         else:#no analyser enabled
             analyserColumnNames = []
             analyserValues = []
-                        
-        if not os.path.exists(self.logFile):
-            variables = [_.name for _ in self.variablesList]
-            calculated = [_.name for _ in self.calculatedParametersList]
-            times = ["datetime", "epoch seconds"]
-            info = ["img file name"]
-            xmlVariables = self.getXmlVariables()
-            columnNames = times+info+variables+calculated+xmlVariables+analyserColumnNames
-            with open(self.logFile, 'ab+') as logFile: # note use of binary file so that windows doesn't write too many /r
-                    writer = csv.writer(logFile)
-                    writer.writerow(columnNames)
-        #column names already exist so...
-        logger.debug("copying current image")
+        
+        #column names are only written if the log is new
+        times = ["datetime", "epoch seconds"]
+        info = ["img file name", "fit window"]
+        columnNames = times+info+[_.name for _ in self.variablesList]+[_.name for _ in self.calculatedParametersList]+self.getXmlVariables()+analyserColumnNames
         variables = [_.calculatedValue for _ in self.variablesList]
         calculated = [_.value for _ in self.calculatedParametersList]
         now = time.time()#epoch seconds
         timeTuple = time.localtime(now)
         date=time.strftime("%Y-%m-%dT%H:%M:%S", timeTuple)
         times = [date,now]
-        info = [self.imageInspectorReference.selectedFile]
+        info = [selectedFile, self.fitWindow]#the log writer adds the fit window column to logs started before it was recorded
         xmlVariables = [self.physics.variables[varName] for varName in self.getXmlVariables()]
         data = times+info+variables+calculated+xmlVariables+analyserValues
-        
-            
-        with open(self.logFile, 'ab+') as logFile:
-                writer = csv.writer(logFile)
-                writer.writerow(data)
+        logWriter.getLogWriter().write(logWriter.LogEntry(logFolder, self.logFile, columnNames, data, imageFiles=imageFiles,
+                                                          latestSequence=self.latestSequence, processorOptions=processorOptions))
+        logger.debug("queued fit for the log writer")
                 
     def _logLastFitButton_fired(self):
         """logs the fit. User can use this for non automated logging. i.e. log
@@ -666,7 +734,8 @@ class Fit(traits.HasTraits):
         self._log_fit()
         
     def _removeLastFitButton_fired(self):
-        """removes the last line in the log file """
+        """removes the last line in the log file. The row is marked as deleted (see logTombstones)
+        and removed from the csv when the log is compacted """
         logFolder = os.path.join(self.logDirectory,self.logName )
         self.logFile = os.path.join(logFolder, self.logName+".csv")
         if self.logFile=="":
@@ -674,10 +743,23 @@ class Fit(traits.HasTraits):
             return
         if not os.path.exists(self.logFile):
             logger.error("cant remove a line from a log file that doesn't exist")
-        with open(self.logFile, 'r') as logFile:
-            lines = logFile.readlines()
-        with open(self.logFile, 'wb') as logFile:
-            logFile.writelines(lines[:-1])
+            return
+        logWriter.getLogWriter().flush(self.logFile)#write any queued rows first
+        try:
+            key = logTombstones.lastRowKey(self.logFile)
+        except ValueError as e:#no key column to mark the row with, remove the line from the csv itself
+            logger.warning("%s. removing the last line from the csv file itself" % e)
+            logWriter.getLogWriter().close(self.logFile)
+            with open(self.logFile, 'rb') as logFile:
+                lines = logFile.readlines()
+            if len(lines) > 1:
+                with open(self.logFile, 'wb') as logFile:
+                    logFile.writelines(lines[:-1])
+            return
+        if key is None:
+            logger.error("no line left to remove from the log file")
+            return
+        logTombstones.delete(self.logFile, [key])
             
     def saveLastFit(self):
         """saves result of last fit to a txt/csv file. This can be useful for live analysis
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: jacobians.py
+
+Analytic derivatives of the terms that the 2D fit functions are built from.
+They are used by the fitJacobian staticmethods of the Fit subclasses, which
+return a dictionary of parameter name: derivative of the fit function.
+GridModel.jacobian turns these into the Dfun that lmfit passes to leastsq, so
+leastsq doesn't need one full image model evaluation per parameter per
+iteration for finite differences.
+
+x and y are expected as the broadcastable row and column of a CoordinateGrid.
+The gaussian is separable, so its exponentials are only evaluated on the x row
+and y column and each derivative is a single outer product.
+"""
+
+import numpy as np
+
+
+def gaussianTerms(x, y, A, x0, sigmax, y0, sigmay):
+    """derivatives of A*exp(-(x-x0)**2/(2*sigmax**2)-(y-y0)**2/(2*sigmay**2)) """
+    dx = x-x0
+    dy = y-y0
+    gx = np.exp(-dx**2/(2.*sigmax**2))
+    gy = np.exp(-dy**2/(2.*sigmay**2))
+    return {"A": gx*gy,
+            "x0": (A*gx*dx/sigmax**2)*gy,
+            "sigmax": (A*gx*dx**2/sigmax**3)*gy,
+            "y0": gx*(A*gy*dy/sigmay**2),
+            "sigmay": gx*(A*gy*dy**2/sigmay**3)}
+
+def parabolaTerms(x, y, A, x0, y0, wx, wy):
+    """derivatives of A*(1-((x-x0)/wx)**2-((y-y0)/wy)**2).clip(0)**1.5
+    keys are A, x0, y0, wx, wy"""
+    X = (x-x0)/wx
+    Y = (y-y0)/wy
+    u = (1-X**2-Y**2).clip(0)
+    sqrtu = np.sqrt(u)
+    common = 3.*A*sqrtu# derivative of the clipped part is 0 so no need for a mask
+    return {"A": u*sqrtu,
+            "x0": common*(X/wx),
+            "y0": common*(Y/wy),
+            "wx": common*(X**2/wx),
+            "wy": common*(Y**2/wy)}
+
+def rotatedGaussianTerms(x, y, A, x0, sigmax, y0, sigmay, theta):
+    """derivatives of the rotated gaussian of RotatedGaussianFit (theta in degrees) """
+    theta = np.pi*theta/180.0
+    c = np.cos(theta)
+    s = np.sin(theta)
+    dx = x-x0
+    dy = y-y0
+    u = dy*c+dx*s
+    v = dx*c-dy*s
+    E = np.exp(-u**2/(2*sigmay**2) - v**2/(2*sigmax**2))
+    G = A*E
+    return {"A": E,
+            "x0": G*(u*s/sigmay**2 + v*c/sigmax**2),
+            "y0": G*(u*c/sigmay**2 - v*s/sigmax**2),
+            "sigmax": G*v**2/sigmax**3,
+            "sigmay": G*u**2/sigmay**3,
+            "theta": G*u*v*(1./sigmax**2-1./sigmay**2)*np.pi/180.0}
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: logWriter.py
+
+Log writer service used by Fit._log_fit. The FitThread only collects the row
+(fit values, analyser results...) and queues a LogEntry. A single writer
+thread then, in the order the entries were queued,
+
+    - initialises the log folder (images folder, comments.txt, copy of the
+      first sequence, processorOptions.txt). This is done once per log folder
+      per session, later entries don't stat these files again
+    - copies the raw image(s) into the images folder
+    - appends the row to the log csv. The header of the csv is read once and
+      rows are written to disk at most flushInterval seconds after they were
+      queued, optionally followed by an fsync. The csv is only open while rows
+      are written, so between flushes it can be renamed or deleted (windows
+      doesn't allow that while a file is open). If the csv has been deleted it
+      is created again with the header
+    - appends the written rows to the columnar sidecar of the csv (see
+      logColumns.py), rebuilding the sidecar from the csv if it is out of date
+
+so logging no longer blocks the fit thread on the NAS. Rows that can't be
+written (e.g. the NAS is unreachable) are kept and written again every
+retryInterval seconds, errors are logged and don't stop the writer thread.
+
+Rows are matched to the header of the log by column name. If an entry has
+columns the log doesn't have yet (e.g. a log analyser or xml variable was
+added) the header of the csv is rewritten once with the new columns appended,
+so older rows simply have no values for them. Columns of the log that an
+entry doesn't have are left empty.
+
+compact(logFile) queues the removal of the rows deleted with logTombstones
+from the csv. The writer thread writes the queued rows, rewrites the csv (see
+logTombstones.compact) and rebuilds its column sidecar.
+
+Code that reads a log csv directly must call flush(logFile) first, code that
+changes it close(logFile).
+"""
+
+import os
+import csv
+import time
+import atexit
+import shutil
+import logging
+import threading
+import Queue
+import cStringIO
+
+import logColumns
+import logTombstones
+
+logger=logging.getLogger("ExperimentEagle.fits")
+
+
+class LogEntry(object):
+    """a row to append to logFile (a csv in logFolder). columnNames are the names of the values in row.
+    imageFiles are copied to the images folder, processorOptions (a string or None) is saved in processorOptions.txt"""
+    def __init__(self, logFolder, logFile, columnNames, row, imageFiles=(), latestSequence=None, processorOptions=None):
+        self.logFolder = logFolder
+        self.logFile = logFile
+        self.columnNames = columnNames
+        self.row = row
+        self.imageFiles = imageFiles
+        self.latestSequence = latestSequence
+        self.processorOptions = processorOptions
+
+
+def _csvLine(row):
+    line = cStringIO.StringIO()
+    csv.writer(line).writerow(row)
+    return line.getvalue()
+
+
+def _restoreFromTemporary(path):
+    """if replacing path (logColumns.replaceFile) failed after the old csv was removed, the log
+    is only in path+".tmp". Renames it back. Raises OSError if that fails too"""
+    temporaryPath = path+".tmp"
+    if not os.path.exists(path) and os.path.exists(temporaryPath):
+        logger.warning("restoring the log %s from %s" % (path, temporaryPath))
+        os.rename(temporaryPath, path)
+
+
+class _Log(object):
+    """a log csv that rows are appended to, with the rows that haven't been written yet"""
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self.unwritten = []# csv lines that haven't been written to the file yet
+        self.pendingRows = []# rows that haven't been written yet, for the sidecar
+        self.unflushedSince = None# time of the oldest unwritten row (or when to retry a failed write, less flushInterval)
+        self.lastUsed = time.time()
+        self.columnStore = logColumns.ColumnStore(path)
+
+    def writeRow(self, row):
+        self.unwritten.append(_csvLine(row))
+        self.pendingRows.append(row)
+        self.lastUsed = time.time()
+        if self.unflushedSince is None:
+            self.unflushedSince = self.lastUsed
+
+
+class LogWriter(object):
+    """flushInterval: rows are written to disk at most this many seconds after they were queued.
+    fsync: also ask the OS to write the flushed rows to the disk (slow on the NAS).
+    retryInterval: rows that couldn't be written are tried again after this many seconds.
+    idleTime: the header and sidecar of logs that haven't been written for this many seconds are
+    forgotten (and read again for the next row)"""
+
+    def __init__(self, flushInterval=1.0, fsync=False, retryInterval=5.0, idleTime=60.0):
+        self.flushInterval = flushInterval
+        self.fsync = fsync
+        self.retryInterval = retryInterval
+        self.idleTime = idleTime
+        self.queue = Queue.Queue()
+        self.logs = {}# log file path: _Log, only used by the writer thread
+        self.failedHeaders = {}# log file path: columns that couldn't be added to its header
+        self.initialisedFolders = set()
+        self.processorOptionsFolders = set()# folders where processorOptions.txt has been checked
+        self.thread = threading.Thread(target=self._work, name="logWriter")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, entry):
+        """queues a LogEntry. Returns immediately"""
+        self.queue.put(("write", entry))
+
+    def flush(self, logFile=None, timeout=30.0):
+        """blocks until everything queued so far is written and flushed (for logFile or all logs)"""
+        self._waitFor("flush", logFile, timeout)
+
+    def close(self, logFile=None, timeout=30.0):
+        """like flush and forgets the header of the log(s) so that they can be rewritten"""
+        self._waitFor("close", logFile, timeout)
+
+    def compact(self, logFile):
+        """queues the removal of the deleted rows (see logTombstones) from logFile. Returns immediately"""
+        self.queue.put(("compact", logFile))
+
+    def _waitFor(self, action, logFile, timeout):
+        done = threading.Event()
+        self.queue.put((action, (logFile, done)))
+        if not done.wait(timeout):
+            logger.error("log writer didn't %s %s within %s s" % (action, logFile or "the logs", timeout))
+
+    def _work(self):
+        while True:
+            try:
+                action, argument = self.queue.get(timeout=self._timeUntilFlush())
+            except Queue.Empty:
+                action, argument = None, None
+            try:
+                if action == "write":
+                    self._write(argument)
+                elif action == "compact":
+                    self._compact(argument)
+                elif action is not None:
+                    logFile, done = argument
+                    try:
+                        for path in self._matchingLogs(logFile):
+                            self._flush(self.logs[path])
+                            if action == "close":
+                                del self.logs[path]
+                    finally:
+                        done.set()
+            except Exception as e:
+                logger.error("log writer failed to %s: %s %s" % (action, type(e), e))
+            self._flushDue()
+
+    def _matchingLogs(self, logFile):
+        if logFile is None:
+            return list(self.logs)
+        return [path for path in self.logs if os.path.normcase(path) == os.path.normcase(logFile)]
+
+    def _timeUntilFlush(self):
+        pending = [log.unflushedSince for log in self.logs.values() if log.unflushedSince is not None]
+        if pending:
+            return max(0.01, min(pending)+self.flushInterval-time.time())
+        return self.idleTime if self.logs else None
+
+    def _flushDue(self):
+        """writes the rows that are due and forgets idle logs. Errors are logged, the rows are kept"""
+        now = time.time()
+        for path, log in self.logs.items():
+            try:
+                if log.unflushedSince is not None and now-log.unflushedSince >= self.flushInterval:
+                    self._flush(log)
+                elif log.unflushedSince is None and now-log.lastUsed >= self.idleTime:
+                    del self.logs[path]
+            except Exception as e:
+                logger.error("log writer failed to write to %s: %s %s. trying again in %s s" % (path, type(e), e, self.retryInterval))
+
+    def _flush(self, log):
+        """writes the unwritten rows of log. If that fails they are kept and tried again after retryInterval"""
+        if not log.unwritten:
+            log.unflushedSince = None
+            return
+        data = "".join(log.unwritten)
+        try:
+            _restoreFromTemporary(log.path)# never start a header-less or new csv next to the real log
+            fileDescriptor = os.open(log.path, os.O_WRONLY|os.O_APPEND|os.O_CREAT|getattr(os, "O_BINARY", 0))# binary so that windows doesn't write too many \r
+            try:
+                newFile = os.fstat(fileDescriptor).st_size == 0
+                if newFile:
+                    data = _csvLine(log.header)+data
+                while data:
+                    data = data[os.write(fileDescriptor, data):]
+                if self.fsync:
+                    os.fsync(fileDescriptor)
+            finally:
+                os.close(fileDescriptor)
+        except (IOError, OSError):
+            log.unwritten = [data] if data else []# only what hasn't been written
+            log.unflushedSince = time.time()-self.flushInterval+self.retryInterval
+            raise
+        log.unwritten = []
+        log.unflushedSince = None
+        rows, log.pendingRows = log.pendingRows, []
+        if log.columnStore is None:
+            return
+        try:
+            if newFile:
+                log.columnStore.reset(log.header)
+            log.columnStore.append(rows, os.stat(log.path))# after the close, which can still change the mtime on a network share
+        except Exception as e:# the csv is the log. readers fall back to it until the sidecar is rebuilt
+            logger.error("could not update the column sidecar of %s: %s %s" % (log.path, type(e), e))
+            log.columnStore = None
+
+    def _compact(self, logFile):
+        for path in self._matchingLogs(logFile):
+            self._flush(self.logs[path])
+            del self.logs[path]
+        if logTombstones.compact(logFile):
+            logColumns.ColumnStore(logFile).rebuild()
+
+    def _write(self, entry):
+        if entry.logFolder not in self.initialisedFolders:
+            self._initialiseFolder(entry)
+            self.initialisedFolders.add(entry.logFolder)
+        if entry.processorOptions is not None and entry.logFolder not in self.processorOptionsFolders:
+            self._saveProcessorOptions(entry)
+            self.processorOptionsFolders.add(entry.logFolder)
+        imagesFolder = os.path.join(entry.logFolder, "images")
+        for imageFile in entry.imageFiles:
+            try:
+                shutil.copy(imageFile, imagesFolder)
+            except (IOError, OSError) as e:
+                logger.error("Could not copy image. Got %s: %s " % (type(e), e))
+        log = self._getLog(entry)
+        if entry.columnNames == log.header:
+            row = list(entry.row)
+        else:
+            newColumns = [name for name in entry.columnNames if name not in log.header and
+                          name not in self.failedHeaders.get(log.path, ())]
+            if newColumns:
+                log = self._extendHeader(log, newColumns)
+            values = dict(zip(entry.columnNames, entry.row))
+            row = [values.get(name, "") for name in log.header]
+        log.writeRow(row)
+
+    def _getLog(self, entry):
+        log = self.logs.get(entry.logFile)
+        if log is not None:
+            return log
+        header = None
+        try:
+            _restoreFromTemporary(entry.logFile)
+        except OSError as e:
+            logger.error("could not restore the log %s, trying again when writing: %s" % (entry.logFile, e))
+        for path in [entry.logFile, entry.logFile+".tmp"]:
+            if os.path.exists(path):
+                with open(path, "rb") as logFile:
+                    header = next(csv.reader(logFile), None)
+                break
+        log = _Log(entry.logFile, header or entry.columnNames)
+        try:
+            if header is not None and not os.path.exists(entry.logFile):
+                log.columnStore = None# rebuilt when the log is opened again after it was restored
+            elif header is not None and not log.columnStore.isCurrent():
+                log.columnStore.rebuild()
+        except Exception as e:
+            logger.error("could not prepare the column sidecar of %s: %s %s" % (entry.logFile, type(e), e))
+            log.columnStore = None
+        self.logs[entry.logFile] = log# a new csv gets its header with the first rows (see _flush)
+        return log
+
+    def _extendHeader(self, log, newColumns):
+        """rewrites the header of the csv of log with newColumns appended and returns the log with the new header.
+        The rows are copied unchanged"""
+        path = log.path
+        header = log.header+newColumns
+        logger.info("adding columns %s to the log %s" % (newColumns, path))
+        try:
+            self._flush(log)
+        except (IOError, OSError) as e:
+            logger.error("could not write the rows of %s before adding columns %s. trying again with the next row: %s" % (path, newColumns, e))
+            return log
+        del self.logs[path]
+        oldStat = os.stat(path)
+        temporaryPath = path+".tmp"
+        try:
+            with open(path, "rb") as oldFile, open(temporaryPath, "wb") as newFile:
+                oldFile.readline()
+                csv.writer(newFile).writerow(header)
+                shutil.copyfileobj(oldFile, newFile)
+            logColumns.replaceFile(temporaryPath, path)
+        except (IOError, OSError) as e:# e.g. the csv is open in another program on windows
+            if os.path.exists(path):
+                logger.error("could not add columns %s to the header of %s. their values won't be logged: %s" % (newColumns, path, e))
+                self.failedHeaders.setdefault(path, set()).update(newColumns)
+                header = log.header
+                if os.path.exists(temporaryPath):
+                    os.remove(temporaryPath)
+            else:# the old csv was removed, the log with the new header is in temporaryPath
+                try:
+                    _restoreFromTemporary(path)
+                except OSError as e:
+                    logger.error("could not restore the log %s, trying again when writing: %s" % (path, e))
+        newLog = _Log(path, header)
+        newLog.columnStore = log.columnStore if os.path.exists(path) else None
+        if newLog.columnStore is not None and header is not log.header:
+            try:
+                if newLog.columnStore.isCurrent(oldStat):
+                    newLog.columnStore.addColumns(newColumns, os.stat(path))
+                else:
+                    newLog.columnStore.rebuild()
+            except Exception as e:
+                logger.error("could not update the column sidecar of %s: %s %s" % (path, type(e), e))
+                newLog.columnStore = None
+        self.logs[path] = newLog
+        return newLog
+
+    def _initialiseFolder(self, entry):
+        """the folder checks of _log_fit that are done once per log folder"""
+        logFolder = entry.logFolder
+        if not os.path.isdir(logFolder):
+            logger.info("creating a new log folder %s" % logFolder)
+            os.mkdir(logFolder)
+        imagesFolder = os.path.join(logFolder, "images")
+        if not os.path.isdir(imagesFolder):
+            logger.info("creating a new images Folder %s" % imagesFolder)
+            os.mkdir(imagesFolder)
+        commentsFile = os.path.join(logFolder, "comments.txt")
+        if not os.path.exists(commentsFile):
+            logger.info("creating a comments file %s" % commentsFile)
+            open(commentsFile, "a+").close()#create a comments file in every folder!
+        firstSequenceCopy = os.path.join(logFolder, "copyOfInitialSequence.ctr")
+        if entry.latestSequence is not None and not os.path.exists(firstSequenceCopy):
+            logger.info("creating a copy of the first sequence %s -> %s" % (entry.latestSequence, firstSequenceCopy))
+            try:
+                shutil.copy(entry.latestSequence, firstSequenceCopy)
+            except (IOError, OSError) as e:
+                logger.error("could not copy the first sequence: %s" % e)
+        logger.debug("finished all checks on log folder")
+
+    def _saveProcessorOptions(self, entry):
+        processorParametersFile = os.path.join(entry.logFolder, "processorOptions.txt")
+        if not os.path.exists(processorParametersFile):
+            with open(processorParametersFile, "a+") as processorParamsFile:
+                processorParamsFile.write(entry.processorOptions)
+
+
+_writer = None
+_writerLock = threading.Lock()
+
+def getLogWriter():
+    """returns the log writer service, starting it on first use"""
+    global _writer
+    with _writerLock:
+        if _writer is None:
+            _writer = LogWriter()
+            atexit.register(_writer.close)
+    return _writer
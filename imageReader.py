@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: imageReader.py
+
+Image reader used by CameraImage and the processors. It replaces
+scipy.misc.imread(path).astype(scipy.float_), which made a float64 copy of
+every frame on top of the decoded image.
+
+16 bit TIFF and PNG files are decoded by PIL straight into their unsigned
+integer pixels. These are converted in a single pass into a float buffer
+(float32 unless another dtype is requested). Buffers are reused for later
+frames of the same shape once nothing else holds a reference to them (not the
+gui, a fit, a view made by a processor...), so a buffer is never overwritten
+while it is still in use.
+
+The decode time of each file is logged. The time spent decoding in the current
+thread is added up so that the ingest pipeline can report it per shot (see
+takeDecodeTime).
+"""
+
+import sys
+import time
+import logging
+import threading
+
+import numpy as np
+import scipy.misc
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger=logging.getLogger("ExperimentEagle.imageReader")
+
+defaultDtype = np.float32
+_integerModes = {"I;16":"<u2", "I;16L":"<u2", "I;16B":">u2"}# PIL modes that numpy doesn't understand directly
+
+
+class BufferPool(object):
+    """keeps up to maxBuffers arrays to decode into. A buffer is only handed out
+    again when the pool holds the only reference to it"""
+
+    def __init__(self, maxBuffers=6):
+        self.maxBuffers = maxBuffers
+        self.buffers = []
+        self.lock = threading.Lock()
+
+    def get(self, shape, dtype):
+        dtype = np.dtype(dtype)
+        with self.lock:
+            for buffer in self.buffers:
+                # references: self.buffers, the loop variable and the argument of getrefcount
+                if buffer.shape == shape and buffer.dtype == dtype and sys.getrefcount(buffer) <= 3:
+                    return buffer
+            buffer = np.empty(shape, dtype)
+            self.buffers.append(buffer)
+            if len(self.buffers) > self.maxBuffers:
+                del self.buffers[0]# anyone still using it keeps it alive
+            return buffer
+
+_pool = BufferPool()
+_threadStatistics = threading.local()
+
+
+def _decode(path):
+    """returns the pixels of the image file without converting their type"""
+    if Image is None:
+        return scipy.misc.imread(path)
+    image = Image.open(path)
+    try:
+        image.load()
+        if image.mode in _integerModes:
+            width, height = image.size
+            return np.frombuffer(image.tobytes(), dtype=_integerModes[image.mode]).reshape(height, width)
+        if image.mode == "P":
+            image = image.convert("RGB")
+        elif image.mode == "1":
+            image = image.convert("L")
+        return np.asarray(image)
+    finally:
+        if hasattr(image, "close"):
+            image.close()
+
+def readImage(path, dtype=None):
+    """returns the image at path as an array of dtype (defaultDtype if None).
+    The array may be a buffer of an earlier image that is no longer referenced (views count as references)"""
+    start = time.time()
+    pixels = _decode(path)
+    array = _pool.get(pixels.shape, defaultDtype if dtype is None else dtype)
+    array[...] = pixels
+    seconds = time.time()-start
+    _threadStatistics.decodeTime = getattr(_threadStatistics, "decodeTime", 0.0)+seconds
+    logger.debug("decoded %s %s into %s in %.1f ms" % (path, pixels.dtype, array.dtype, seconds*1E3))
+    return array
+
+def takeDecodeTime():
+    """returns the time spent decoding images in the current thread since the last call"""
+    decodeTime = getattr(_threadStatistics, "decodeTime", 0.0)
+    _threadStatistics.decodeTime = 0.0
+    return decodeTime
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: ingestPipeline.py
+
+Background pipeline that takes new image files found in the watch folder
+through the stages
+
+    discover -> decode -> process -> fit -> log -> display
+
+discover is the watch folder timer of the EagleHandler which submits files.
+decode and process (reading the sequence xml, reading the image and running
+the processor) run in a worker thread. The results are passed through a bounded
+queue to the display step which is drained by the gui timer and is the only step
+that sets traits. fit and log already run in the FitThread of each fit once
+the image is displayed. Because the worker runs ahead, decoding of shot N+1
+overlaps with fitting of shot N.
+"""
+
+import os
+import time
+import logging
+import threading
+import Queue
+
+import fileWatcher
+import imageReader
+
+logger=logging.getLogger("ExperimentEagle.ingestPipeline")
+
+
+class IngestResult(object):
+    """everything the display step needs to show a new image. error is set
+    (and zs is None) if decoding or processing failed"""
+    def __init__(self, path):
+        self.path = path
+        self.modifiedTime = None
+        self.variables = None
+        self.zs = None
+        self.rawImage = None
+        self.processor = None
+        self.error = None
+        self.timings = {}# stage name: seconds
+
+
+class IngestPipeline(object):
+    """loadImage(path) returns (processed image array, raw image, processor), readVariables(modifiedTime)
+    returns the sequence variables (or None). Both are called from the worker thread.
+    maxPending and maxResults bound the queues in front of and behind the worker"""
+
+    def __init__(self, loadImage, readVariables=None, maxPending=1, maxResults=2, readinessTimeout=5.0):
+        self.loadImage = loadImage
+        self.readVariables = readVariables
+        self.readinessTimeout = readinessTimeout
+        self.pendingQueue = Queue.Queue(maxPending)
+        self.resultQueue = Queue.Queue(maxResults)
+        self.inProgress = set()# files submitted whose result hasn't been taken yet
+        self.lock = threading.Lock()
+        self.running = True
+        self.worker = threading.Thread(target=self._work, name="ingestPipelineWorker")
+        self.worker.daemon = True
+        self.worker.start()
+
+    def canSubmit(self):
+        return self.running and not self.pendingQueue.full()
+
+    def submit(self, path):
+        """queue path for decoding. returns False if the pipeline is full"""
+        try:
+            self.pendingQueue.put_nowait(path)
+        except Queue.Full:
+            return False
+        with self.lock:
+            self.inProgress.add(path)
+        return True
+
+    def getResult(self):
+        """returns the next IngestResult or None if none is ready. Doesn't block"""
+        try:
+            result = self.resultQueue.get_nowait()
+        except Queue.Empty:
+            return None
+        with self.lock:
+            self.inProgress.discard(result.path)
+        return result
+
+    def pending(self):
+        """number of files in the pipeline that haven't been displayed"""
+        with self.lock:
+            return len(self.inProgress)
+
+    def isPending(self, path):
+        with self.lock:
+            return path in self.inProgress
+
+    def stop(self):
+        self.running = False
+
+    def _work(self):
+        while self.running:
+            try:
+                path = self.pendingQueue.get(timeout=0.2)
+            except Queue.Empty:
+                continue
+            result = self.ingest(path)
+            while self.running:
+                try:
+                    self.resultQueue.put(result, timeout=0.2)# blocks while the display step is behind
+                    break
+                except Queue.Full:
+                    continue
+
+    def ingest(self, path):
+        result = IngestResult(path)
+        try:
+            start = time.time()
+            fileWatcher.waitUntilReady(path, timeout=self.readinessTimeout)
+            result.modifiedTime = os.path.getmtime(path)
+            result.timings["wait"] = time.time()-start
+            if self.readVariables is not None:
+                start = time.time()
+                result.variables = self.readVariables(result.modifiedTime)
+                result.timings["xml"] = time.time()-start
+            start = time.time()
+            imageReader.takeDecodeTime()
+            result.zs, result.rawImage, result.processor = self.loadImage(path)
+            result.timings["decode"] = imageReader.takeDecodeTime()
+            result.timings["process"] = time.time()-start-result.timings["decode"]
+            logger.debug("ingested %s. timings %s" % (path, result.timings))
+        except Exception as e:
+            logger.error("failed to ingest %s: %s" % (path, e))
+            result.error = e
+        return result
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: logColumns.py
+
+Columnar sidecar of the eagle log csv files. The csv stays the canonical,
+human readable log. Next to logName.csv the folder logName.columns holds the
+same rows as chunks (numpy .npz files, one array per column) and a
+manifest.json listing the columns and chunks.
+
+The log writer (fits/logWriter.py) appends a chunk with the rows of each flush
+of the csv. When there are more than maxChunks chunks they are merged into one.
+If the sidecar is missing or out of date (e.g. the csv was edited) the writer
+rebuilds it from the csv the next time it opens the log.
+
+Readers use readDataFrame / readColumns, which load only the columns asked
+for. The manifest records the size and modification time of the csv the
+sidecar corresponds to, so if the csv has changed since (or the sidecar doesn't
+exist), readDataFrame falls back to reading the csv.
+
+Logs can gain columns (a new log analyser or xml variable). The log writer
+then rewrites the csv header once with the new columns appended, and calls
+ColumnStore.addColumns. Every chunk lists its own columns, so old chunks stay
+as they are and readers union the chunks by column name. A column that a chunk
+doesn't have reads as NaN (or "" for string columns) for its rows.
+
+Columns of a chunk are int64 or float64 arrays if all their values are numbers
+(empty values are NaN), bool arrays for True/False columns and string arrays
+otherwise.
+
+Rows deleted with logTombstones (keyed by their "epoch seconds" value) are
+left out by readDataFrame and LogTail.
+
+LogTail reads a log incrementally for refreshing plots: after the first read
+(from the sidecar if it is up to date) only the rows appended to the csv since
+are parsed.
+"""
+
+import os
+import csv
+import json
+import logging
+import collections
+
+import numpy as np
+import logTombstones
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+logger=logging.getLogger("ExperimentEagle.logColumns")
+
+maxChunks = 64
+manifestName = "manifest.json"
+
+
+def sidecarFolder(logFile):
+    return os.path.splitext(logFile)[0]+".columns"
+
+def csvText(value):
+    """the text the csv module writes for value"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return str(value)
+
+def typedArray(texts):
+    """bool, int64, float64 (empty texts are NaN) or string array of the texts of a column"""
+    if texts and all(text in ("True", "False") for text in texts):
+        return np.array([text == "True" for text in texts], dtype=bool)
+    try:
+        return np.array([int(text) for text in texts], dtype=np.int64)
+    except ValueError:
+        pass
+    try:
+        return np.array([float(text) if text != "" else np.nan for text in texts], dtype=np.float64)
+    except ValueError:
+        return np.array(texts, dtype=str)
+
+def _concatenate(arrays):
+    """concatenates the arrays of the chunks of a column. An int instead of an array is the number
+    of rows of a chunk that doesn't have the column"""
+    if any(not isinstance(array, int) and array.dtype.kind in "SU" for array in arrays):
+        arrays = [np.array([""]*array) if isinstance(array, int) else array.astype(str) for array in arrays]
+    else:
+        arrays = [np.full(array, np.nan) if isinstance(array, int) else array for array in arrays]
+    return np.concatenate(arrays) if arrays else np.array([])
+
+def replaceFile(temporaryPath, path):
+    """os.rename that also replaces an existing file on windows"""
+    try:
+        os.rename(temporaryPath, path)
+    except OSError:
+        os.remove(path)
+        os.rename(temporaryPath, path)
+
+
+class ColumnStore(object):
+    """the sidecar of logFile. Only the log writer thread changes it"""
+
+    def __init__(self, logFile):
+        self.logFile = logFile
+        self.folder = sidecarFolder(logFile)
+        self.manifestPath = os.path.join(self.folder, manifestName)
+        self.manifest = self._readManifest()
+
+    def _readManifest(self):
+        try:
+            with open(self.manifestPath, "rb") as manifestFile:
+                return json.load(manifestFile)
+        except (IOError, ValueError):
+            return None
+
+    def _writeManifest(self):
+        temporaryPath = self.manifestPath+".tmp"
+        with open(temporaryPath, "wb") as manifestFile:
+            json.dump(self.manifest, manifestFile)
+        replaceFile(temporaryPath, self.manifestPath)
+
+    def isCurrent(self, csvStat=None):
+        """True if the sidecar holds the rows of the csv. csvStat is the os.stat result of the csv
+        to compare with (by default the csv on disk). An edit of the csv that keeps its size
+        still changes its modification time"""
+        if self.manifest is None:
+            return False
+        if csvStat is None:
+            try:
+                csvStat = os.stat(self.logFile)
+            except OSError:
+                return False
+        return self.manifest["csvSize"] == csvStat.st_size and self.manifest.get("csvMTime") == csvStat.st_mtime
+
+    def _setCsvStat(self, csvStat):
+        self.manifest["csvSize"] = csvStat.st_size
+        self.manifest["csvMTime"] = csvStat.st_mtime
+
+    def columns(self):
+        """all columns of the log (the csv header)"""
+        return self.manifest["columns"] if self.manifest is not None else []
+
+    def chunkColumns(self, chunk):
+        return chunk.get("columns", self.manifest["columns"])# version 1 chunks have the columns of the log
+
+    def _writeChunk(self, header, rows):
+        """writes the rows (lists of csv texts) as a new chunk file and returns its manifest entry"""
+        arrays = {}
+        for i in range(len(header)):
+            arrays["c%d" % i] = typedArray([row[i] if i < len(row) else "" for row in rows])
+        name = "chunk-%06d.npz" % self.manifest["nextChunk"]
+        self.manifest["nextChunk"] += 1
+        with open(os.path.join(self.folder, name), "wb") as chunkFile:
+            np.savez(chunkFile, **arrays)
+        return {"file":name, "rows":len(rows), "columns":list(header)}
+
+    def reset(self, header):
+        """starts an empty sidecar for a log with the columns header"""
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        oldChunks = [chunk["file"] for chunk in self.manifest["chunks"]] if self.manifest is not None else []
+        nextChunk = self.manifest["nextChunk"] if self.manifest is not None else 0
+        self.manifest = {"version":2, "columns":list(header), "chunks":[], "rows":0, "csvSize":None, "csvMTime":None, "nextChunk":nextChunk}
+        self._writeManifest()
+        self._removeChunks(oldChunks)
+
+    def append(self, rows, csvStat):
+        """adds rows (lists of values as written to the csv). csvStat is the os.stat result of the csv including them"""
+        if rows:
+            texts = [[csvText(value) for value in row] for row in rows]
+            self.manifest["chunks"].append(self._writeChunk(self.manifest["columns"], texts))
+            self.manifest["rows"] += len(rows)
+        self._setCsvStat(csvStat)
+        self._writeManifest()
+        if len(self.manifest["chunks"]) > maxChunks:
+            self.compact()
+
+    def addColumns(self, newColumns, csvStat):
+        """the csv header was rewritten to have newColumns at the end. csvStat is the os.stat result of the new csv.
+        Existing chunks are kept: they don't have the new columns"""
+        for chunk in self.manifest["chunks"]:
+            chunk["columns"] = self.chunkColumns(chunk)
+        self.manifest["columns"] = self.manifest["columns"]+[name for name in newColumns if name not in self.manifest["columns"]]
+        self.manifest["version"] = 2
+        self._setCsvStat(csvStat)
+        self._writeManifest()
+
+    def rebuild(self):
+        """rebuilds the sidecar from the csv"""
+        with open(self.logFile, "rb") as csvFile:
+            reader = csv.reader(csvFile)
+            header = next(reader, [])
+            rows = list(reader)
+            csvStat = os.fstat(csvFile.fileno())
+        self.reset(header)
+        if rows:
+            self.manifest["chunks"].append(self._writeChunk(header, rows))
+            self.manifest["rows"] = len(rows)
+        self._setCsvStat(csvStat)
+        self._writeManifest()
+        logger.info("rebuilt column sidecar of %s (%s rows)" % (self.logFile, len(rows)))
+
+    def compact(self):
+        """merges all chunks into one"""
+        oldChunks = [chunk["file"] for chunk in self.manifest["chunks"]]
+        columns = self.read()
+        arrays = {"c%d" % i:columns[name] for i, name in enumerate(self.manifest["columns"])}
+        name = "chunk-%06d.npz" % self.manifest["nextChunk"]
+        self.manifest["nextChunk"] += 1
+        with open(os.path.join(self.folder, name), "wb") as chunkFile:
+            np.savez(chunkFile, **arrays)
+        self.manifest["chunks"] = [{"file":name, "rows":self.manifest["rows"], "columns":list(self.manifest["columns"])}]
+        self._writeManifest()
+        self._removeChunks(oldChunks)
+
+    def _removeChunks(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError as e:
+                logger.warning("could not remove old sidecar chunk %s: %s" % (name, e))
+
+    def read(self, columns=None):
+        """returns an OrderedDict of column name: array for columns (all if None).
+        Columns that aren't in the log are left out"""
+        allColumns = self.manifest["columns"]
+        if columns is None:
+            columns = allColumns
+        names = [name for name in columns if name in allColumns]
+        parts = collections.OrderedDict((name, []) for name in names)
+        for chunk in self.manifest["chunks"]:
+            chunkColumns = self.chunkColumns(chunk)
+            with np.load(os.path.join(self.folder, chunk["file"])) as chunkData:
+                for name in names:
+                    if name in chunkColumns:
+                        parts[name].append(chunkData["c%d" % chunkColumns.index(name)])
+                    else:
+                        parts[name].append(chunk["rows"])
+        return collections.OrderedDict((name, _concatenate(arrays)) for name, arrays in parts.items())
+
+
+def _dataFrame(data, indexColumn, parseDates, firstRow=0):
+    """DataFrame of the OrderedDict data indexed by its indexColumn (or numbered from firstRow if it doesn't have it)"""
+    if indexColumn in data:
+        index = pandas.Index(data.pop(indexColumn), name=indexColumn)
+        if parseDates:
+            index = pandas.to_datetime(index)
+    else:
+        rows = len(next(iter(data.values()))) if data else 0
+        index = pandas.RangeIndex(firstRow, firstRow+rows)
+    return pandas.DataFrame(data, index=index)
+
+def withoutDeleted(frame, deleted, dropKey=False):
+    """frame without the rows whose logTombstones.keyColumn value is in deleted. dropKey removes the key column"""
+    key = logTombstones.keyColumn
+    if deleted and key in frame:
+        frame = frame[~frame[key].isin(deleted)]
+    if dropKey and key in frame:
+        frame = frame.drop(key, axis=1)
+    return frame
+
+def readColumns(logFile, columns=None):
+    """returns an OrderedDict of column name: array from the sidecar of logFile,
+    or None if there is no up to date sidecar"""
+    store = ColumnStore(logFile)
+    if not store.isCurrent():
+        return None
+    try:
+        return store.read(columns)
+    except (IOError, KeyError, ValueError) as e:
+        logger.warning("could not read column sidecar of %s: %s" % (logFile, e))
+        return None
+
+def readDataFrame(logFile, columns=None, indexColumn="datetime", parseDates=True):
+    """returns the log as a pandas DataFrame with only columns (all if None) indexed by indexColumn
+    (if the log has it), parsed as dates if parseDates. Uses the sidecar if it is up to date, otherwise the csv.
+    Deleted rows are left out"""
+    dropKey = columns is not None and logTombstones.keyColumn not in columns
+    wanted = None if columns is None else list(collections.OrderedDict.fromkeys(list(columns)+[indexColumn, logTombstones.keyColumn]))
+    return withoutDeleted(_readDataFrame(logFile, wanted, indexColumn, parseDates), logTombstones.deletedKeys(logFile), dropKey)
+
+def _readDataFrame(logFile, wanted, indexColumn, parseDates):
+    data = readColumns(logFile, wanted)
+    if data is not None:
+        return _dataFrame(data, indexColumn, parseDates)
+    logger.debug("no up to date column sidecar for %s. reading the csv" % logFile)
+    # round_trip parses floats like float() does, as the sidecar and logTombstones. The default
+    # parser can be off in the last digit, so deleted keys (epoch seconds) wouldn't be found
+    if wanted is not None:
+        try:
+            return pandas.read_csv(logFile, index_col=indexColumn, parse_dates=parseDates, usecols=wanted, float_precision="round_trip")
+        except ValueError:# a column (or the index) isn't in the log. read everything instead
+            pass
+    try:
+        return pandas.read_csv(logFile, index_col=indexColumn, parse_dates=parseDates, float_precision="round_trip")
+    except ValueError:
+        logger.error("No %s column. Is this a valid Eagle log file? I will try without index" % indexColumn)
+        return pandas.read_csv(logFile, parse_dates=parseDates, float_precision="round_trip")
+
+
+class LogTail(object):
+    """reads the log csv logFile incrementally. The first read returns the whole log (only columns
+    and the logTombstones.keyColumn if columns are given), later reads only the rows appended since.
+    If the csv was rewritten or rows were deleted or restored in the meantime the whole log is read again"""
+    signatureBytes = 256# bytes before the read offset that must be unchanged for the csv to count as appended to
+
+    def __init__(self, logFile, columns=None, indexColumn="datetime", parseDates=True):
+        self.logFile = logFile
+        self.columns = None if columns is None else list(collections.OrderedDict.fromkeys(list(columns)+[indexColumn, logTombstones.keyColumn]))
+        self.indexColumn = indexColumn
+        self.parseDates = parseDates
+        self.offset = None# bytes of the csv that have been read
+        self.header = None
+        self.signature = None# (header line, signatureBytes before offset, logTombstones.signature)
+        self.rows = 0
+
+    def read(self):
+        """returns (dataframe, appended). appended is False if dataframe is the whole log and True
+        if it holds only the rows appended since the last read"""
+        appended = False
+        if self.offset is not None:
+            with open(self.logFile, "rb") as csvFile:
+                if self._signature(csvFile, self.offset) == self.signature:
+                    frame = self._readAppended(csvFile)
+                    appended = True
+            if not appended:
+                logger.info("%s was rewritten or rows were deleted. reading it again" % self.logFile)
+        if not appended:
+            frame = self._readAll()
+        return withoutDeleted(frame, logTombstones.deletedKeys(self.logFile)), appended
+
+    def _signature(self, csvFile, offset):
+        csvFile.seek(0)
+        headerLine = csvFile.readline()
+        start = max(0, offset-self.signatureBytes)
+        csvFile.seek(start)
+        return headerLine, csvFile.read(offset-start), logTombstones.signature(self.logFile)
+
+    def _frame(self, rows):
+        """dataframe of rows (lists of csv texts) for the wanted columns"""
+        data = collections.OrderedDict()
+        for i, name in enumerate(self.header):
+            if self.columns is None or name in self.columns:
+                data[name] = typedArray([row[i] if i < len(row) else "" for row in rows])
+        frame = _dataFrame(data, self.indexColumn, self.parseDates, self.rows)
+        self.rows += len(rows)
+        return frame
+
+    def _readCompleteLines(self, csvFile):
+        """rows of the complete lines from the current position. moves offset past them"""
+        text = csvFile.read()
+        end = text.rfind("\n")+1# a line that is still being written is read next time
+        self.offset = csvFile.tell()-len(text)+end
+        return list(csv.reader(text[:end].splitlines(True)))
+
+    def _readAll(self):
+        self.rows = 0
+        store = ColumnStore(self.logFile)
+        if store.isCurrent():
+            try:
+                data = store.read(self.columns)
+                self.header = store.columns()
+                self.offset = store.manifest["csvSize"]
+                self.rows = store.manifest["rows"]
+                with open(self.logFile, "rb") as csvFile:
+                    self.signature = self._signature(csvFile, self.offset)
+                return _dataFrame(data, self.indexColumn, self.parseDates)
+            except (IOError, KeyError, ValueError) as e:
+                logger.warning("could not read column sidecar of %s: %s" % (self.logFile, e))
+                self.rows = 0
+        with open(self.logFile, "rb") as csvFile:
+            rows = self._readCompleteLines(csvFile)
+            self.header = rows.pop(0) if rows else []
+            self.signature = self._signature(csvFile, self.offset)
+        return self._frame(rows)
+
+    def _readAppended(self, csvFile):
+        csvFile.seek(self.offset)
+        rows = self._readCompleteLines(csvFile)
+        self.signature = self._signature(csvFile, self.offset)
+        return self._frame(rows)
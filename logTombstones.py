@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: logTombstones.py
+
+Deleted rows of the eagle log csv files. Deleting rows (LogFilePlot "Delete
+Sel", Fit "remove last fit") doesn't rewrite the csv. The keys ("epoch seconds"
+values) of the rows are appended to logName.deleted next to logName.csv, so a
+delete costs one small append and can be undone with restore. The readers in
+logColumns.py leave out the deleted rows.
+
+compact (the log writer's compact command) rewrites the csv without the
+deleted rows, copying the other lines unchanged, and empties logName.deleted.
+Only then are deletions permanent.
+
+logName.deleted is a csv of (action, key, time) rows where action is "delete"
+or "restore". The set of deleted keys is cached per file and only read again
+when the file changed.
+"""
+
+import os
+import csv
+import time
+import logging
+import threading
+
+logger=logging.getLogger("ExperimentEagle.logTombstones")
+
+keyColumn = "epoch seconds"
+lastRowBlockSize = 65536# bytes read from the end of the csv at a time to find the last row
+
+_cache = {}# normalised path of the tombstone file: (modified time, size, frozenset of deleted keys)
+_cacheLock = threading.Lock()
+_writeLock = threading.Lock()# deletes and restores wait for a running compaction
+
+
+def tombstoneFile(logFile):
+    return os.path.splitext(logFile)[0]+".deleted"
+
+def _keyText(key):
+    return repr(float(key))
+
+def _append(logFile, action, keys):
+    now = repr(time.time())
+    with _writeLock:
+        with open(tombstoneFile(logFile), "ab") as deletedFile:
+            writer = csv.writer(deletedFile)
+            for key in keys:
+                writer.writerow([action, _keyText(key), now])
+
+def delete(logFile, keys):
+    """marks the rows of logFile with the keyColumn values keys as deleted"""
+    _append(logFile, "delete", keys)
+    logger.info("deleted %s rows of %s" % (len(keys), logFile))
+
+def restore(logFile, keys):
+    """undoes the deletion of the rows with keyColumn values keys (if the log hasn't been compacted since)"""
+    _append(logFile, "restore", keys)
+    logger.info("restored %s rows of %s" % (len(keys), logFile))
+
+def signature(logFile):
+    """(modified time, size) of the tombstone file of logFile, None if there are no deletions"""
+    try:
+        stat = os.stat(tombstoneFile(logFile))
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+def deletedKeys(logFile):
+    """frozenset of the keyColumn values (floats) of the deleted rows of logFile"""
+    path = tombstoneFile(logFile)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return frozenset()
+    key = os.path.normcase(os.path.abspath(path))
+    with _cacheLock:
+        cached = _cache.get(key)
+    if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+    deleted = set()
+    with open(path, "rb") as deletedFile:
+        for row in csv.reader(deletedFile):
+            if len(row) < 2:
+                continue
+            if row[0] == "delete":
+                deleted.add(float(row[1]))
+            elif row[0] == "restore":
+                deleted.discard(float(row[1]))
+    deleted = frozenset(deleted)
+    with _cacheLock:
+        _cache[key] = (stat.st_mtime, stat.st_size, deleted)
+    return deleted
+
+def _keyIndex(headerLine, logFile):
+    header = next(csv.reader([headerLine]), [])
+    if keyColumn not in header:
+        raise ValueError("%s has no %s column" % (logFile, keyColumn))
+    return header.index(keyColumn)
+
+def _rowKey(line, keyIndex):
+    """the key of the csv line, None if it has none"""
+    row = next(csv.reader([line]), [])
+    try:
+        return float(row[keyIndex])
+    except (IndexError, ValueError):
+        return None
+
+def lastRowKey(logFile):
+    """the key of the last row of logFile that isn't deleted, None if there is none.
+    Reads the csv backwards from its end"""
+    deleted = deletedKeys(logFile)
+    with open(logFile, "rb") as csvFile:
+        keyIndex = _keyIndex(csvFile.readline(), logFile)
+        headerEnd = csvFile.tell()
+        end = os.fstat(csvFile.fileno()).st_size
+        tail = ""# start of the earliest line read, which may begin before the block
+        while end > headerEnd:
+            start = max(headerEnd, end-lastRowBlockSize)
+            csvFile.seek(start)
+            lines = (csvFile.read(end-start)+tail).splitlines(True)
+            end = start
+            tail = lines.pop(0) if end > headerEnd else ""
+            for line in reversed(lines):
+                key = _rowKey(line, keyIndex)
+                if key is not None and key not in deleted:
+                    return key
+    return None
+
+def compact(logFile):
+    """rewrites logFile without its deleted rows and empties its tombstone file. Returns the number of
+    rows removed. The log must not be open for writing (see LogWriter.compact)"""
+    import logColumns
+    with _writeLock:
+        deleted = deletedKeys(logFile)
+        if not deleted:
+            return 0
+        removed = 0
+        temporaryPath = logFile+".tmp"
+        with open(logFile, "rb") as oldFile, open(temporaryPath, "wb") as newFile:
+            headerLine = oldFile.readline()
+            keyIndex = _keyIndex(headerLine, logFile)
+            newFile.write(headerLine)
+            for line in oldFile:
+                if _rowKey(line, keyIndex) in deleted:
+                    removed += 1
+                else:
+                    newFile.write(line)
+        logColumns.replaceFile(temporaryPath, logFile)
+        os.remove(tombstoneFile(logFile))
+        with _cacheLock:
+            _cache.pop(os.path.normcase(os.path.abspath(tombstoneFile(logFile))), None)
+    logger.info("compacted %s: removed %s deleted rows" % (logFile, removed))
+    return removed
+
+def clear():
+    with _cacheLock:
+        _cache.clear()
+
@@ -15,8 +15,8 @@ import scipy.constants
 import logging
 import os
 import time
-import xml.etree.ElementTree as ET # for xml comprehension of experiment runner files
 import element
+import sequenceVariables
 
 logger=logging.getLogger("ExperimentEagle.physicsProperties")
 
@@ -110,12 +110,21 @@ class PhysicsProperties(traits.HasTraits):
         self.selectedElement = element.elements[self.species]
     
     def updatePhysics(self):
+        variables = self.readSequenceVariables(self.selectedFileModifiedTime)
+        if variables is not None:
+            self.applySequenceVariables(variables)
+
+    def readSequenceVariables(self, imageTime):
+        """returns the dictionary of variables of the sequence that took the image modified at imageTime,
+        or None if it couldn't be read. Doesn't set any traits so it can be called from the ingest pipeline worker thread"""
         try:
             logger.debug("attempting to update physics from xml")
-            if os.path.exists(self.latestSequenceFile):
-                modifiedTime = os.path.getmtime(self.latestSequenceFile)
-                imageTime = self.selectedFileModifiedTime
-                now = time.time()
+            try:
+                latestStat = os.stat(self.latestSequenceFile)
+            except OSError:
+                latestStat = None
+            if latestStat is not None:
+                modifiedTime = latestStat.st_mtime
                 timeDiff = imageTime-modifiedTime
                 timeDiff += 31 # ToDo: debug this strange time offset!!
                 if timeDiff>300.0: #>5min
@@ -123,24 +132,25 @@ class PhysicsProperties(traits.HasTraits):
                 if timeDiff<0:
                     logger.error("Found very fresh sequence file. Probably read already variables of next sequence?")
                     logger.warning("Use second last sequence file instead..")
-                    self.tree = ET.parse(self.secondLatestSequenceFile)
+                    variables = sequenceVariables.getVariables(self.secondLatestSequenceFile)
                 else:
-                    self.tree = ET.parse(self.latestSequenceFile)
+                    variables = sequenceVariables.getVariables(self.latestSequenceFile, latestStat)
                 logger.warning("Age of sequence file: {}".format(timeDiff)) # for debugging, remove or reduce log level later ;P
                 # logger.warning("Age of image file: {}".format(imageTime))
                 # logger.warning("Now = {}".format(now)) # for debugging, remove or reduce log level later ;P
                 # logger.warning("ModifiedTime of xml = {}".format(modifiedTime)) # for debugging, remove or reduce log level later ;P
-                self.root = self.tree.getroot()
-                variables = self.root.find("variables")
-                self.variables = {child[0].text:float(child[1].text) for child in variables}
-                logger.debug("Read a TOF time of %s from variables in XML " % self.variables[self.TOFVariableName])
+                logger.debug("Read a TOF time of %s from variables in XML " % variables.get(self.TOFVariableName))
+                return variables
             else:
                 logger.error("Could not find latest xml File. cannot update physics.")
-                return
+                return None
         except Exception as e:
             logger.error("Error when trying to load XML %s" % e.message)
-            return
-            
+            return None
+
+    def applySequenceVariables(self, variables):
+        """updates the physics properties from the dictionary of sequence variables (see readSequenceVariables)"""
+        self.variables = variables
         #update TOF Time
         if self.TOFFromVariableBool:
             logger.debug("attempting to update TOF time from xml")
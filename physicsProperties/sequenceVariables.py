@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: sequenceVariables.py
+
+Cache of the variables of the experiment runner sequence files
+(latestSequence.xml, secondLatestSequence.xml) used by
+PhysicsProperties.readSequenceVariables.
+
+The sequence files are on a network share and the same sequence is usually
+repeated for many shots. Entries are keyed on the path and checked against the
+modification time and size from a single os.stat, so a shot of an unchanged
+sequence costs one stat call. When the file has changed it is read with
+iterparse, which stops as soon as the variables element is complete instead of
+building the tree of the whole sequence.
+"""
+
+import os
+import logging
+import threading
+import xml.etree.ElementTree as ET
+
+logger=logging.getLogger("ExperimentEagle.physicsProperties")
+
+_cache = {}# normalised path: (modified time, size, variables)
+_cacheLock = threading.Lock()# read from the ingest pipeline worker and the gui thread
+
+
+def parseVariables(sequenceFile):
+    """returns the dictionary {name: value} of the variables element (a child of the root)
+    of the sequence xml file. Only the file up to the end of the variables element is parsed"""
+    depth = 0
+    root = None
+    with open(sequenceFile, "rb") as xmlFile:
+        for event, elem in ET.iterparse(xmlFile, events=("start", "end")):
+            if event == "start":
+                if depth == 0:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:# a child of the root is complete
+                if elem.tag == "variables":
+                    return {child[0].text:float(child[1].text) for child in elem}
+                root.remove(elem)# the rest of the sequence isn't needed
+    raise ValueError("no variables element in %s" % sequenceFile)
+
+def getVariables(sequenceFile, stat=None):
+    """returns a copy of the variables of sequenceFile, parsing the file only if it changed since
+    it was last read. stat is the os.stat of the file if the caller already has it"""
+    if stat is None:
+        stat = os.stat(sequenceFile)
+    key = os.path.normcase(os.path.abspath(sequenceFile))
+    with _cacheLock:
+        cached = _cache.get(key)
+    if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+        return dict(cached[2])
+    logger.debug("parsing variables of changed sequence file %s" % sequenceFile)
+    variables = parseVariables(sequenceFile)
+    with _cacheLock:
+        _cache[key] = (stat.st_mtime, stat.st_size, variables)
+    return dict(variables)
+
+def clear():
+    with _cacheLock:
+        _cache.clear()
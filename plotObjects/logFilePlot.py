@@ -17,7 +17,11 @@ import os
 import csv
 import scipy
 import physicsProperties
+import logColumns
+import logTombstones
+import fits.logWriter
 import logFilePlotFitter
+import runningAggregate
 import keyBindingsTool
 import scatterSelectorTool
 import time
@@ -63,12 +67,15 @@ class LogFilePlot(traits.HasTraits):
     librarianButton = traits.Button("Librarian")
     deleteLogButton = traits.Button("Delete Log")
     deleteSelectedButton = traits.Button("Delete Sel")
+    undoDeleteButton = traits.Button("Undo Del", desc="restore the points deleted last")
+    compactLogButton = traits.Button("Compact", desc="permanently remove deleted points from the log file (in the background)")
     plotFitButton = traits.Button("Plot Fit")
     logFile = traits.File(r'\\ursa\AQOGroupFolder\Experiment Humphry\Data\eagleLogs\default.csv')
     xAxis = traits.Enum(values="masterList")
     yAxis = traits.Enum(values="masterList")
     aggregateAxis = traits.Enum(values="masterList")
     masterList = traits.List
+    lastDeletedKeys = traits.List(traits.Float, desc="epoch seconds of the points deleted last, for undo")
     series = traits.String("")
     seriesEdit  = traits.Button("choose series")
     autoLoadButton = traits.Button("auto", desc="attempt to automatically load settings from OneNote page")
@@ -101,6 +108,10 @@ class LogFilePlot(traits.HasTraits):
     logFilePlotFitterReference = traits.Instance(logFilePlotFitter.LogFilePlotFitter)
 
     autoRefreshObject = None # set to none when there is no autorefresh set up , or to the autoRefreshDialog object when there is. dialog object has all necessary info for alerts etc.
+    logTail = None # logColumns.LogTail reading the log incrementally. None to read the log again
+    logTailSettings = None # dataSettings() of the logTail
+    runningAggregate = None # runningAggregate.RunningAggregate of the rows read by logTail
+    dataframe = None
 
     oldLegendPosition = None
     keyBindingsDictionary = {} #defined in __init___                                
@@ -144,6 +155,8 @@ class LogFilePlot(traits.HasTraits):
                                     traitsui.Item("librarianButton", show_label=False),
                                     traitsui.Item("deleteLogButton", show_label=False),
                                     traitsui.Item("deleteSelectedButton", show_label=False, enabled_when='mode=="XY Scatter"'),
+                                    traitsui.Item("undoDeleteButton", show_label=False, enabled_when='lastDeletedKeys'),
+                                    traitsui.Item("compactLogButton", show_label=False),
                                     ),
                                 label="Options", show_border=True
                                 ),
@@ -169,7 +182,7 @@ class LogFilePlot(traits.HasTraits):
         
         When log plot bool is changed or plot is refreshed the routine is:
         --> clear all current plots
-        --> pull new data from logfile using pandas read_csv
+        --> pull new data from logfile (only the columns needed) using logColumns
         -->
         """
         super(LogFilePlot, self).__init__(**traitsDict)
@@ -282,27 +295,69 @@ class LogFilePlot(traits.HasTraits):
 
         All filters are performed after getting the dataframe but before returning
         the aggregate frame.
+
+        The log is read with a logColumns.LogTail that is kept while the settings
+        below don't change, so a refresh only parses, filters and aggregates the
+        rows appended since the last one.
         """
+        settings = self.dataSettings()
+        if self.logTail is None or settings != self.logTailSettings:
+            self.logTail = logColumns.LogTail(self.logFile, self.requiredColumns())
+            self.logTailSettings = settings
+        previousDataframe = self.dataframe
+        self.dataframe, appended = self.logTail.read()
         try:
-            self.dataframe = pandas.read_csv(self.logFile, index_col="datetime", parse_dates = True)
-        except ValueError as e:
-            logger.error("No datetime column. Is this a valid Eagle log file? I will try without index")
-            self.dataframe = pandas.read_csv(self.logFile, parse_dates = True)  
-        self.filterData()
+            self.filterData()
+        except:
+            self.logTail = None#the rows read are lost. read everything next time
+            raise
+        newRows = self.dataframe
+        if appended:
+            self.dataframe = pandas.concat([previousDataframe, newRows])
         seriesList = self.parseSeries()
         self.validateColumns()
         if self.mode == "X Variable - Measured Y":
             #The last column we aggregate over is the x axis. y axis gets mean and stdev per aggregation
-            return self.dataframe.groupby(seriesList+[self.xAxis], as_index=False).aggregate({self.yAxis:["mean","std"]})
+            return self.aggregate(appended, newRows, seriesList+[self.xAxis], [self.yAxis])
         elif self.mode == "X Measured - Y Measured":
             #here the x axis needs to be aggregated to mean and stdev as well as the y axis. aggregate axis defines the last axis we aggregate over
             #classic example here is a N vs T plot where aggregate axis is evaporation time. series would be for evaporation at different MT gradients
-            return self.dataframe.groupby(seriesList+[self.aggregateAxis], as_index=False).aggregate({self.xAxis:["mean","std"],self.yAxis:["mean","std"]})
+            return self.aggregate(appended, newRows, seriesList+[self.aggregateAxis], [self.xAxis, self.yAxis])
         elif self.mode == "XY Scatter":
             #here we don't care if x is a variable or measured. We just plot every x y point as a scatter point. no error bars.
             #here the raw data frame contains everything we need in the correct format!            
             return self.dataframe[seriesList+[self.xAxis,self.yAxis]]
         
+    def dataSettings(self):
+        """everything that decides which rows and columns getData reads, filters and aggregates"""
+        return (self.logFile, self.mode, self.xAxis, self.yAxis, self.aggregateAxis, self.series,
+                self.filterYs, self.filterMinYs, self.filterMaxYs, self.filterXs, self.filterMinXs, self.filterMaxXs,
+                self.filterNaN, self.filterSpecific, self.filterSpecificString, self.requiredColumns())
+
+    def aggregate(self, appended, newRows, keys, valueColumns):
+        """mean and std of valueColumns grouped by keys. If appended only newRows are added to the previous aggregate"""
+        if not appended or self.runningAggregate is None:
+            self.runningAggregate = runningAggregate.RunningAggregate(keys, valueColumns)
+            newRows = self.dataframe
+        self.runningAggregate.update(newRows)
+        return self.runningAggregate.result()
+
+    def requiredColumns(self):
+        """the columns of the log file that getData needs: axes, series and filter columns.
+        Returns None (all columns) if an alert code of the auto refresh looks at the dataframe"""
+        if (self.autoRefreshObject is not None) and (self.autoRefreshObject.emailAlertBool or self.autoRefreshObject.soundAlertBool):
+            return None
+        columns = self.parseSeries()+[self.xAxis, self.yAxis]
+        if self.mode == "X Measured - Y Measured":
+            columns.append(self.aggregateAxis)
+        if self.filterSpecific:
+            for query in self.filterSpecificString.split(","):
+                for operator in ["==", ">", "<"]:
+                    if operator in query:
+                        columns.append(query.split(operator)[0].strip())
+                        break
+        return columns
+        
     def humanSeriesName(self, seriesTuple):
         """returns the name for a given series Tuple"""
         name=""
@@ -714,6 +769,7 @@ class LogFilePlot(traits.HasTraits):
     def forcefulRefresh(self):
         if self.logFilePlotBool:
             self.clearAllPlots()
+        self.logTail = None
         self.plot()
         self.masterList = self._getMasterList()
         if not self.logFilePlotBool:
@@ -898,9 +954,16 @@ class LogFilePlot(traits.HasTraits):
             
             
     def _deleteSelectedButton_fired(self):
-        """removes points selected in the scatter mode from the CSV file itself. 
-        they will then be gone when  user clicks refresh"""
-        confirmation = traitsui.error(message="Warning: This will permanently delete the selected points from the log file.\n If you are applying filters, filtered points will be deleted too.\n\n. Do you wish to proceed?")
+        """marks points selected in the scatter mode as deleted in the log file (see logTombstones).
+        they will then be gone when user clicks refresh, until they are restored with undo or the log is compacted.
+        Logs without the logTombstones.keyColumn can't be marked, the points are removed from the csv file itself"""
+        dataframe = self.dataframe#filtered as per settings in eagle, as plotted
+        useTombstones = dataframe is not None and logTombstones.keyColumn in dataframe
+        if useTombstones:
+            message = "Warning: This will delete the selected points from the log file.\n They can be restored with Undo Del until the log is compacted.\n\n Do you wish to proceed?"
+        else:
+            message = "Warning: This log file has no %s column, so the selected points can't be restored.\n They will be permanently deleted from the log file (a copy is saved as .backup).\n\n Do you wish to proceed?" % logTombstones.keyColumn
+        confirmation = traitsui.error(message=message)
         if not confirmation:
             return
         if self.mode != "XY Scatter":#NOTE HORRIBLE BUGS / issues could occur if user changes to scatter mode without clicking refresh..... etc.
@@ -917,25 +980,46 @@ class LogFilePlot(traits.HasTraits):
         if dataToDelete == []:
             logger.error("error while deleting selected. Found no selected points")
             return
-        #now we do the finding and deleting....
+        if not useTombstones:
+            self.rewriteWithout(dataToDelete)
+            self.refreshPlot()
+            return
+        selected = scipy.zeros(len(dataframe), dtype=bool)
+        for deleteX,deleteY in dataToDelete:
+            selected |= ((dataframe[self.xAxis]==deleteX) & (dataframe[self.yAxis]==deleteY)).values
+        keys = list(dataframe[logTombstones.keyColumn].values[selected])
+        logTombstones.delete(self.logFile, keys)
+        self.lastDeletedKeys = keys
+        self.refreshPlot()#refresh plot so user gets to instantly see removal
+
+    def rewriteWithout(self, dataToDelete):
+        """removes the rows with the (x,y) values in dataToDelete from the csv file itself, after saving
+        a copy as .backup. Only used for logs without the logTombstones.keyColumn"""
+        fits.logWriter.getLogWriter().close(self.logFile)#write any queued rows and let go of the file
         try:
             dataframe = pandas.read_csv(self.logFile, index_col="datetime", parse_dates = True)
         except ValueError as e:
             logger.error("No datetime column. Is this a valid Eagle log file? I will try without index")
             dataframe = pandas.read_csv(self.logFile, parse_dates = True)
-        #make backup of original file before deleting        
         shutil.copy2(self.logFile, self.logFile+".backup")
-        #FILTER AS PER SETTINGS IN EAGLE
-        if self.filterYs:
-            dataframe = dataframe[(dataframe[self.yAxis]>self.filterMinYs) &(dataframe[self.yAxis]<self.filterMaxYs)]
-        if self.filterXs:
-            dataframe = dataframe[(dataframe[self.xAxis]>self.filterMinXs) &(dataframe[self.xAxis]<self.filterMaxXs)]
-        dataframe.fillna(value=0.0, inplace=True)
-        
         for deleteX,deleteY in dataToDelete:
-            dataframe =dataframe[(dataframe[self.xAxis]!=deleteX) | (dataframe[self.yAxis]!=deleteY)]
-        dataframe.to_csv(self.logFile)
-        self.refreshPlot()#refresh plot so user gets to instantly see removal
+            dataframe = dataframe[(dataframe[self.xAxis]!=deleteX) | (dataframe[self.yAxis]!=deleteY)]
+        dataframe.to_csv(self.logFile, index="datetime" in dataframe.index.names)
+        logger.info("removed %s selected points from %s" % (len(dataToDelete), self.logFile))
+
+    def _undoDeleteButton_fired(self):
+        """restores the points deleted last"""
+        logTombstones.restore(self.logFile, self.lastDeletedKeys)
+        self.lastDeletedKeys = []
+        self.refreshPlot()
+
+    def _compactLogButton_fired(self):
+        """removes the deleted points from the csv file itself. Done by the log writer in the background"""
+        confirmation = traitsui.error(message="Warning: This will permanently remove all deleted points from the log file.\n\n Do you wish to proceed?")
+        if not confirmation:
+            return
+        fits.logWriter.getLogWriter().compact(self.logFile)
+        self.lastDeletedKeys = []
 
     def columnSelectorDialog(self):
         """pulls up a check list editor dialog to choose columns in log file series
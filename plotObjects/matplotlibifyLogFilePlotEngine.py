@@ -9,6 +9,7 @@ Created on Sat May 23 11:35:11 2015
 import logging
 import scipy
 import pandas
+import logColumns
 import itertools
 
 logger=logging.getLogger("ExperimentEagle.logFilePlotEngine")
@@ -55,11 +56,7 @@ class LogFilePlotEngine():
         All filters are performed after getting the dataframe but before returning
         the aggregate frame.
         """
-        try:
-            self.dataframe = pandas.read_csv(self.logFile, index_col="datetime", parse_dates = True)
-        except ValueError as e:
-            logger.error("No datetime column. Is this a valid Eagle log file? I will try without index")
-            self.dataframe = pandas.read_csv(self.logFile, parse_dates = True)  
+        self.dataframe = logColumns.readDataFrame(self.logFile)#leaves out deleted rows
         self.filterData()
         seriesList = self.parseSeries()
         self.validateColumns()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: runningAggregate.py
+
+Per series mean and standard deviation of log columns that can be updated with
+new rows, used by LogFilePlot.getData on refreshes. For every group (unique
+combination of the key columns) and value column the count, mean and sum of
+squared deviations M2 are kept and new rows are merged in with the parallel
+variance formula (Chan et al.)
+
+    n = na + nb, delta = mean_b - mean_a
+    mean = mean_a + delta*nb/n
+    M2 = M2_a + M2_b + delta**2*na*nb/n
+
+so an update costs a groupby of the new rows only. result() has the layout of
+dataframe.groupby(keys, as_index=False).aggregate({column:["mean","std"]}).
+"""
+
+import pandas
+
+
+class RunningAggregate(object):
+    """mean and std of valueColumns grouped by keys"""
+
+    def __init__(self, keys, valueColumns):
+        self.keys = list(keys)
+        self.valueColumns = list(valueColumns)
+        self.count = None# DataFrames indexed by the groups with a column per value column
+        self.mean = None
+        self.m2 = None
+
+    def _statistics(self, dataframe):
+        grouped = dataframe.groupby(self.keys)[self.valueColumns]
+        count = grouped.count().astype(float)
+        mean = grouped.mean().fillna(0.0)# groups without values have count 0
+        m2 = (grouped.var(ddof=0)*count).fillna(0.0)
+        return count, mean, m2
+
+    def update(self, dataframe):
+        """adds the rows of dataframe"""
+        if len(dataframe) == 0 and self.count is not None:
+            return
+        countB, meanB, m2B = self._statistics(dataframe)
+        if self.count is None:
+            self.count, self.mean, self.m2 = countB, meanB, m2B
+            return
+        count = self.count.add(countB, fill_value=0.0)
+        groups = count.index
+        countA = self.count.reindex(groups).fillna(0.0)
+        countB = countB.reindex(groups).fillna(0.0)
+        meanA = self.mean.reindex(groups).fillna(0.0)
+        delta = meanB.reindex(groups).fillna(0.0)-meanA
+        total = count.where(count > 0, 1.0)# avoid 0/0 for groups without values
+        self.mean = meanA+delta*countB/total
+        self.m2 = self.m2.reindex(groups).fillna(0.0)+m2B.reindex(groups).fillna(0.0)+delta**2*countA*countB/total
+        self.count = count
+
+    def result(self):
+        """the aggregate as a new DataFrame with columns (key, "") and (value column, "mean"/"std")"""
+        mean = self.mean.where(self.count > 0)
+        std = (self.m2/(self.count-1).where(self.count > 1))**0.5# sample std as pandas, NaN for single values
+        aggregate = pandas.concat([mean, std], axis=1, keys=["mean", "std"]).swaplevel(0, 1, axis=1)
+        aggregate = aggregate[[(column, statistic) for column in self.valueColumns for statistic in ["mean", "std"]]]
+        return aggregate.sort_index().reset_index()
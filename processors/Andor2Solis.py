@@ -9,6 +9,8 @@ Filename: standardAndor1.py
 """
 
 import processors
+import binning
+import masks
 import logging
 import scipy
 logger=logging.getLogger("ExperimentEagle.Processor")
@@ -19,24 +21,6 @@ import numpy as np
 import traits.api as traits
 import chaco.api as chaco
 
-def binArray(data, axis, binstep, binsize, func=np.nanmean):
-    """
-    from https://stackoverflow.com/questions/21921178/binning-a-numpy-array/42024730#42024730
-    data    ---  is your array
-    axis    ---  is the axis you want to been
-    binstep ---  is the number of points between each bin (allow overlapping bins)
-    binsize ---  is the size of each bin
-
-    func    ---  is the function you want to apply to the bin (np.max for maxpooling, np.mean for an average ...)"""
-    
-    data = np.array(data)
-    dims = np.array(data.shape)
-    argdims = np.arange(data.ndim)
-    argdims[0], argdims[axis]= argdims[axis], argdims[0]
-    data = data.transpose(argdims)
-    data = [func(np.take(data,np.arange(int(i*binstep),int(i*binstep+binsize)),0),0) for i in np.arange(dims[axis]//binstep)]
-    data = np.array(data).transpose(argdims)
-    return data
 
 defaultDarkImagePath = os.path.join("\\\\ursa","AQOGroupFolder","Experiment Humphry","Experiment Control and Software","experimentEagle","calibration","darkPictures","Andor2","2020 02 22 - dark Andor2 - interval 0_017 temperature -80_0 16 c 5_1 3_3 n 100.npy")
 
@@ -71,6 +55,7 @@ class StandardAndor2(processors.Processor):
 
     def process(self,rawImagePath):
         logger.info("using standard Andor 0 process function")
+        rawArray = self.readSeries(rawImagePath, stackSeries=True)# waits for and stacks both frames of an Andor Solis series
         if not self.optionsDict["process?"]:
             return rawArray
         if self.optionsDict["Use boosted light image?"]:
@@ -78,36 +63,21 @@ class StandardAndor2(processors.Processor):
             opticalDensity = self.opticalDensityStrongerLightPicture(rawArray, darkArray, self.optionsDict["Light boost factor"])
         else:
             if self.optionsDict["darkSubtraction?"]:
-                loadDarkPic = True
-                if hasattr(self,'darkArray'):
-                    if self.darkPictureFilename == self.optionsDict["Dark picture"]:
-                        loadDarkPic = False # already loaded dark picture with same path
-                if loadDarkPic:
-                    _, ext = os.path.splitext( self.optionsDict["Dark picture"] )
-                    if ext == '.npy':
-                        self.darkArray = np.load(self.optionsDict["Dark picture"])
-                        self.darkPictureFilename = self.optionsDict["Dark picture"]
-                    elif ext == '.gz':
-                        logger.warning('loading ".gz" picture .. is .. very .. slow .., better use numpy file ".npy"')
-                        self.darkArray = self.loadDarkImage(self.optionsDict["Dark picture"])
-                        self.darkPictureFilename = self.optionsDict["Dark picture"]
-                    else:
-                        raise TypeError("Invalid file extension: '" + ext + "'")
+                self.darkArray = self.loadDarkImage(self.optionsDict["Dark picture"])
                 try:
                     rawArray -= self.darkArray
                 except ValueError:
                     logger.error("rawArray {} and darkArray {} have different shape".format( rawArray.shape, self.darkArray.shape ))
-                rawArray=rawArray.clip(1)
+                rawArray.clip(1, out=rawArray)
             if self.optionsDict["rawImageWithDarkSubtraction?"]:
                 return rawArray
             [atomsArray, lightArray] = self.fastKineticsCrop(rawArray, 2)
             if self.optionsDict["Rescale with circular mask?"]:
-                y = np.arange(lightArray.shape[0])
-                x = np.arange(lightArray.shape[1])
-                x, y = np.meshgrid(x, y)
-                distanceSq = (x - self.optionsDict["Atom mask PosX"])*(x - self.optionsDict["Atom mask PosX"]) + (y - self.optionsDict["Atom mask PosY"])*(y - self.optionsDict["Atom mask PosY"])
-                indices = np.logical_and( self.optionsDict["Atom mask Radius"]**2 < distanceSq, distanceSq < self.optionsDict["Balance light Radius"]**2 )
-                lightBalanceFactor = np.mean( atomsArray[indices] / lightArray[indices] )
+                # cached until the shape or the mask options change
+                mask = masks.annulus(lightArray.shape, self.optionsDict["Atom mask PosX"], self.optionsDict["Atom mask PosY"],
+                                     self.optionsDict["Atom mask Radius"], self.optionsDict["Balance light Radius"])
+                self.recordDiagnostic("circular mask", mask.mask)
+                lightBalanceFactor = np.mean( mask.select(atomsArray) / mask.select(lightArray) )
                 logger.info( "1/lightBalanceFactor = {}".format(1/lightBalanceFactor) ) # change to debug after initial testing phase
                 lightArray *= lightBalanceFactor
             elif self.optionsDict["rescale?"]:
@@ -120,10 +90,13 @@ class StandardAndor2(processors.Processor):
             
             self.atomsArray = atomsArray.clip(1)
             self.lightArray = lightArray.clip(1)
+            self.recordDiagnostic("atoms", self.atomsArray)
+            self.recordDiagnostic("light", self.lightArray)
 
             logger.debug("atomsArray = %s" % atomsArray)
             logger.debug("lightArray = %s" % lightArray)
-            logger.debug("atomsArray/lightArray = %s" % (atomsArray / lightArray))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("atomsArray/lightArray = %s" % (atomsArray / lightArray))
             opticalDensity = self.opticalDensity(atomsArray,lightArray)
         if self.optionsDict["correct OD with alpha function?"]:
             opticalDensity = self.alphaFunction(opticalDensity)
@@ -177,9 +150,7 @@ class StandardAndor2(processors.Processor):
         [atomsArray, lightArray] = self.fastKineticsCrop(rawArray, 2)
         [atomsDarkArray, lightDarkArray] = self.fastKineticsCrop(darkArray, 2)
         lightArray /= lightArrayFactor
-        lightArray -= lightDarkArray
-        atomsArray -= atomsDarkArray
-        return self.opticalDensity( atomsArray, lightArray )
+        return self.opticalDensity(atomsArray, lightArray, atomsDarkArray, lightDarkArray)
         
     def alphaFunction(self,opticalDensity):
         highODPolynomial = scipy.poly1d([0.4894, -2.059,  2.825,0.9525,0])
@@ -202,9 +173,7 @@ class StandardAndor2(processors.Processor):
     
     @staticmethod
     def binning(array, binsize=2):
-        data_binned = binArray(array, 0, binsize, binsize, np.mean)
-        data_binned = binArray(data_binned, 1, binsize, binsize, np.mean)
-        return data_binned
+        return binning.binImage(array, binsize)
 
 
         
@@ -16,12 +16,14 @@ import andor1ThreePulses
 import debugProcessors
 import rawImageBinning
 import baslerOD
+import pcaFringeRemoval
 
 #For a processor to appear in experiment eagle it must be added to the dictionary at the bottom of this file
 
 
 validProcessors = {"raw image":processors.Processor(), "standard ANDOR 0":standardAndor0.StandardAndor0(), "standard Alta 1":standardAlta1.StandardAlta1(), "standard ANDOR 1":standardAndor1.StandardAndor1(), "ANDOR 1 three pulses":andor1ThreePulses.Andor1ThreePulses(), "standard ANDOR 2":standardAndor2.StandardAndor2(),"debug atoms/light":debugProcessors.DEBUGAtomsOverLight(),
-                   "raw image binning":rawImageBinning.rawImageBinning(), "baslerOD": baslerOD.BaslerOD()}
+                   "raw image binning":rawImageBinning.rawImageBinning(), "baslerOD": baslerOD.BaslerOD(),
+                   "PCA fringe removal ANDOR 1":pcaFringeRemoval.PCAFringeRemovalAndor1()}
 validNames = validProcessors.keys()
 
 
@@ -9,6 +9,8 @@ Filename: standardAndor1.py
 """
 
 import processors
+import binning
+import masks
 import logging
 import scipy
 logger=logging.getLogger("ExperimentEagle.Processor")
@@ -18,24 +20,6 @@ import numpy as np
 
 import traits.api as traits
 
-def binArray(data, axis, binstep, binsize, func=np.nanmean):
-    """
-    from https://stackoverflow.com/questions/21921178/binning-a-numpy-array/42024730#42024730
-    data    ---  is your array
-    axis    ---  is the axis you want to been
-    binstep ---  is the number of points between each bin (allow overlapping bins)
-    binsize ---  is the size of each bin
-
-    func    ---  is the function you want to apply to the bin (np.max for maxpooling, np.mean for an average ...)"""
-    
-    data = np.array(data)
-    dims = np.array(data.shape)
-    argdims = np.arange(data.ndim)
-    argdims[0], argdims[axis]= argdims[axis], argdims[0]
-    data = data.transpose(argdims)
-    data = [func(np.take(data,np.arange(int(i*binstep),int(i*binstep+binsize)),0),0) for i in np.arange(dims[axis]//binstep)]
-    data = np.array(data).transpose(argdims)
-    return data
 
 defaultDarkImagePath = os.path.join("\\\\ursa","AQOGroupFolder","Experiment Humphry","Experiment Control and Software","experimentEagle","calibration","darkPictures","Andor1","2018 07 12 - dark ANDOR1.gz")
 
@@ -63,7 +47,7 @@ class Andor1ThreePulses(processors.Processor):
 
     def process(self,rawImagePath):
         logger.info("using standard Andor 0 process function")
-        rawArray = self.read(rawImagePath)
+        rawArray = self.readSeries(rawImagePath)
         if not self.optionsDict["process?"]:
             return rawArray
         if self.optionsDict["Use boosted light image?"]:
@@ -79,17 +63,15 @@ class Andor1ThreePulses(processors.Processor):
                     # in this case, the reason is that the total number of rows is int(1024/3)*3 = 1023
                     # => neglect last row of dark picture (TODO: double check, that it's not the first instead)
                     rawArray -= darkArray[:-1]
-                rawArray=rawArray.clip(1)
+                rawArray.clip(1, out=rawArray)
             if self.optionsDict["rawImageWithDarkSubtraction?"]:
                 return rawArray
             [atomsArray, lightArray] = self.fastKineticsCrop(rawArray, 2)
             if self.optionsDict["Rescale with circular mask?"]:
-                y = np.arange(lightArray.shape[0])
-                x = np.arange(lightArray.shape[1])
-                x, y = np.meshgrid(x, y)
-                distanceSq = (x - self.optionsDict["Atom mask PosX"])*(x - self.optionsDict["Atom mask PosX"]) + (y - self.optionsDict["Atom mask PosY"])*(y - self.optionsDict["Atom mask PosY"])
-                indices = np.logical_and( self.optionsDict["Atom mask Radius"]**2 < distanceSq, distanceSq < self.optionsDict["Balance light Radius"]**2 )
-                lightBalanceFactor = np.mean( atomsArray[indices] / lightArray[indices] )
+                # cached until the shape or the mask options change
+                mask = masks.annulus(lightArray.shape, self.optionsDict["Atom mask PosX"], self.optionsDict["Atom mask PosY"],
+                                     self.optionsDict["Atom mask Radius"], self.optionsDict["Balance light Radius"])
+                lightBalanceFactor = np.mean( mask.select(atomsArray) / mask.select(lightArray) )
                 logger.info( "1/lightBalanceFactor = {}".format(1/lightBalanceFactor) ) # change to debug after initial testing phase
                 lightArray *= lightBalanceFactor
             elif self.optionsDict["rescale?"]:
@@ -102,7 +84,8 @@ class Andor1ThreePulses(processors.Processor):
             
             logger.debug("atomsArray = %s" % atomsArray)
             logger.debug("lightArray = %s" % lightArray)
-            logger.debug("atomsArray/lightArray = %s" % (atomsArray / lightArray))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("atomsArray/lightArray = %s" % (atomsArray / lightArray))
             opticalDensity = self.opticalDensity(atomsArray,lightArray)
         if self.optionsDict["correct OD with alpha function?"]:
             opticalDensity = self.alphaFunction(opticalDensity)
@@ -117,9 +100,7 @@ class Andor1ThreePulses(processors.Processor):
         [atomsArray, lightArray] = self.fastKineticsCrop(rawArray, 2)
         [atomsDarkArray, lightDarkArray] = self.fastKineticsCrop(darkArray, 2)
         lightArray /= lightArrayFactor
-        lightArray -= lightDarkArray
-        atomsArray -= atomsDarkArray
-        return self.opticalDensity( atomsArray, lightArray )
+        return self.opticalDensity(atomsArray, lightArray, atomsDarkArray, lightDarkArray)
         
     def alphaFunction(self,opticalDensity):
         highODPolynomial = scipy.poly1d([0.4894, -2.059,  2.825,0.9525,0])
@@ -145,9 +126,7 @@ class Andor1ThreePulses(processors.Processor):
     
     @staticmethod
     def binning(array, binsize=2):
-        data_binned = binArray(array, 0, binsize, binsize, np.mean)
-        data_binned = binArray(data_binned, 1, binsize, binsize, np.mean)
-        return data_binned
+        return binning.binImage(array, binsize)
 
 
         
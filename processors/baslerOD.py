@@ -9,13 +9,13 @@ Filename: standardAndor0.py
 """
 
 import processors
+import fileWatcher
 import logging
 import scipy
 logger=logging.getLogger("ExperimentEagle.Processor")
 import os
 import collections
 import numpy as np
-import time
 
 import traits.api as traits
 import chaco.api as chaco
@@ -28,20 +28,13 @@ class BaslerOD(processors.Processor):
     #darkImagePath = os.path.join("\\\\ursa", "AQOGroupFolder", "Experiment Humphry", "Experiment Control and Software", "darkImages", "darkAverageData", "2016-10-20","2016-10-20-darkAverage.gz" )
 
     def process(self,rawImagePath):
-        if rawImagePath.split("_")[-1] == "atoms.png":        
-            try_var = 0
-            while True:            
-                try:
-                    self.atomsArray = self.read(rawImagePath)
-                    time.sleep(1.0)
-                    self.lightArray = self.read(rawImagePath.split("atoms.png")[0]+"light.png")
-                    #os.remove(rawImagePath.split("atoms.png")[0]+"light.png") # remove light picture
-                    break
-                except IOError:
-                    try_var += 1                    
-                    logger.warning( "Light picture not yet taken. Try again in 1s. Tried %i times" %try_var )
-                    if try_var > 2:                    
-                        return self.read(rawImagePath)
+        if rawImagePath.split("_")[-1] == "atoms.png":
+            if not fileWatcher.waitUntilReady(rawImagePath, timeout=3.0):
+                logger.warning( "Light picture not yet taken. Showing only atoms picture." )
+                return self.read(rawImagePath)
+            self.atomsArray = self.read(rawImagePath)
+            self.lightArray = self.read(rawImagePath.split("atoms.png")[0]+"light.png")
+            #os.remove(rawImagePath.split("atoms.png")[0]+"light.png") # remove light picture
         else:
             logger.info( "Found light picture first.. showing only light picture." )
             self.lightArray = self.read(rawImagePath)
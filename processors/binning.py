@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: binning.py
+
+Block binning shared by the processors. The bins are views of the array
+(a reshape, or stride tricks when bins overlap or have gaps) that are reduced
+with a single numpy call, instead of a python loop over np.take slices.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+reductions = {"mean":np.mean, "nanmean":np.nanmean, "sum":np.sum, "max":np.max}
+
+
+def binViews(data, axis, binstep, binsize):
+    """returns a view of data where axis is replaced by two axes: the bin (a new bin starts
+    every binstep points) and the binsize points in the bin. Only complete bins are included"""
+    data = np.asarray(data)
+    length = data.shape[axis]
+    numberOfBins = min(length//binstep, (length-binsize)//binstep+1)
+    if numberOfBins < 1:
+        raise ValueError("axis %s of length %s is too short for bins of size %s" % (axis, length, binsize))
+    shape = data.shape[:axis]+(numberOfBins, binsize)+data.shape[axis+1:]
+    if binstep == binsize:
+        return data[(slice(None),)*axis+(slice(0, numberOfBins*binsize),)].reshape(shape)
+    strides = data.strides[:axis]+(data.strides[axis]*binstep, data.strides[axis])+data.strides[axis+1:]
+    return as_strided(data, shape=shape, strides=strides)
+
+def binArray(data, axis, binstep, binsize, func=np.nanmean):
+    """
+    data    ---  is your array
+    axis    ---  is the axis you want to bin
+    binstep ---  is the number of points between each bin (allow overlapping bins)
+    binsize ---  is the size of each bin
+
+    func    ---  is the function you want to apply to the bin (np.max for maxpooling, np.mean for an average ...)
+                 or the name of one in reductions. It must take an axis argument"""
+    func = reductions.get(func, func)
+    return func(binViews(data, axis, int(binstep), int(binsize)), axis=axis+1)
+
+def binImage(array, binsize=2, func=np.mean):
+    """bins a 2D array in blocks of binsize x binsize pixels. Rows and columns that
+    don't fill a whole block are dropped"""
+    func = reductions.get(func, func)
+    rowBins = binViews(array, 0, binsize, binsize)
+    return func(binViews(rowBins, 2, binsize, binsize), axis=(1, 3))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: darkFrameCache.py
+
+Process wide cache of dark pictures shared by all processors (see
+Processor.loadDarkImage). Entries are keyed on the path and the modification
+time of the dark picture, so a dark picture that is overwritten is read again.
+
+.npy dark pictures are memory mapped read only. Legacy text dark pictures
+(scipy.savetxt, usually .gz) are very slow to parse, so the first time one is
+used it is converted to a .npy file in convertedFolder, which is then memory
+mapped. Later sessions use the converted file directly.
+
+The returned arrays are read only as they are shared between processors.
+"""
+
+import os
+import logging
+import hashlib
+import threading
+
+import numpy as np
+import scipy
+
+logger=logging.getLogger("ExperimentEagle.Processor")
+
+convertedFolder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "calibration", "darkPictures", "converted")# in the experimentEagle folder, whatever the working directory
+
+_cache = {}# normalised path: (modified time, array)
+_cacheLock = threading.Lock()# processors run in the ingest pipeline worker and the gui thread
+
+
+def getDarkFrame(darkFilePath):
+    """returns the dark picture at darkFilePath as a read only array, loading it only
+    if it isn't cached or has changed since it was cached"""
+    darkFilePath = str(darkFilePath)
+    key = os.path.normcase(os.path.abspath(darkFilePath))
+    modifiedTime = os.path.getmtime(darkFilePath)
+    with _cacheLock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == modifiedTime:
+            return cached[1]
+        darkArray = _load(darkFilePath, modifiedTime)
+        _cache[key] = (modifiedTime, darkArray)
+    return darkArray
+
+def clear():
+    with _cacheLock:
+        _cache.clear()
+
+def _load(darkFilePath, modifiedTime):
+    if os.path.splitext(darkFilePath)[1] == ".npy":
+        logger.info("loading dark picture %s" % darkFilePath)
+        return _loadNumpy(darkFilePath)
+    convertedPath = _convertedPath(darkFilePath, modifiedTime)
+    if not os.path.exists(convertedPath):
+        logger.warning('converting text dark picture %s to %s. This is slow but only happens once' % (darkFilePath, convertedPath))
+        darkArray = scipy.loadtxt(darkFilePath)
+        try:
+            if not os.path.isdir(convertedFolder):
+                os.makedirs(convertedFolder)
+            temporaryPath = convertedPath+".%s.tmp" % os.getpid()
+            with open(temporaryPath, "wb") as convertedFile:
+                np.save(convertedFile, darkArray)
+            os.rename(temporaryPath, convertedPath)
+        except (IOError, OSError) as e:
+            logger.error("could not save converted dark picture %s: %s" % (convertedPath, e))
+            darkArray.flags.writeable = False
+            return darkArray
+    return _loadNumpy(convertedPath)
+
+def _loadNumpy(path):
+    try:
+        return np.load(path, mmap_mode="r")
+    except (IOError, ValueError) as e:# e.g. file systems that can't be memory mapped
+        logger.warning("could not memory map %s (%s). reading it instead" % (path, e))
+        darkArray = np.load(path)
+        darkArray.flags.writeable = False
+        return darkArray
+
+def _convertedPath(darkFilePath, modifiedTime):
+    """the converted file name includes the original name and a hash of its path and modification time"""
+    name = os.path.splitext(os.path.basename(darkFilePath))[0]
+    digest = hashlib.md5("%s|%r" % (os.path.abspath(darkFilePath), modifiedTime)).hexdigest()[:12]
+    return os.path.join(convertedFolder, "%s-%s.npy" % (name, digest))
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: diagnostics.py
+
+In memory diagnostics of the processors. Processors record intermediate arrays
+(the rescale region, the circular mask, the atoms and light frames...) with
+Processor.recordDiagnostic. Copies are kept in a ring buffer that holds at most
+maxBytes of arrays, dropping the oldest entries first, so nothing is drawn or
+written to disk while shots are processed. Recording is off by default and is
+switched on in the DiagnosticsDialog (Menu -> Processor Diagnostics), which
+lists the entries and plots or saves them on demand.
+
+Every entry is also saved as a .npy file in dumpFolder, but only when dumping
+is switched on.
+"""
+
+import os
+import time
+import logging
+import threading
+import collections
+
+import numpy as np
+
+import traits.api as traits
+import traitsui.api as traitsui
+
+logger=logging.getLogger("ExperimentEagle.Processor")
+
+
+class DiagnosticEntry(object):
+    """an array recorded by a processor"""
+    def __init__(self, source, name, array, imagePath=None):
+        self.time = time.time()
+        self.source = source
+        self.name = name
+        self.array = array
+        self.imagePath = imagePath
+
+    def label(self):
+        return "%s %s: %s %s" % (time.strftime("%H:%M:%S", time.localtime(self.time)), self.source, self.name, self.array.shape)
+
+    def summary(self):
+        finite = self.array[np.isfinite(self.array)] if self.array.dtype.kind == "f" else self.array
+        statistics = "min %s, max %s, mean %s" % (finite.min(), finite.max(), finite.mean()) if finite.size else "no finite values"
+        return "%s\nimage: %s\nshape %s, dtype %s\n%s" % (self.label(), self.imagePath, self.array.shape, self.array.dtype, statistics)
+
+    def fileName(self):
+        name = "".join(c if c.isalnum() else "_" for c in "%s-%s" % (self.source, self.name))
+        return "%s-%03d-%s.npy" % (time.strftime("%Y%m%d-%H%M%S", time.localtime(self.time)), int(1000*(self.time % 1)), name)
+
+
+class DiagnosticsBuffer(object):
+    """ring buffer of DiagnosticEntry objects holding at most maxBytes of arrays"""
+
+    def __init__(self, maxBytes=64*2**20, enabled=False):
+        self.maxBytes = maxBytes
+        self.enabled = enabled
+        self.dumpFolder = None# .npy files are only written if this is set
+        self._entries = collections.deque()
+        self._bytes = 0
+        self._lock = threading.Lock()# processors run in the ingest pipeline worker and the gui thread
+
+    def record(self, source, name, array, imagePath=None):
+        """keeps a copy of array (if enabled). Cheap enough to call for every shot"""
+        if not self.enabled:
+            return
+        entry = DiagnosticEntry(source, name, np.array(array, copy=True), imagePath)
+        with self._lock:
+            self._entries.append(entry)
+            self._bytes += entry.array.nbytes
+            while self._bytes > self.maxBytes and len(self._entries) > 1:
+                self._bytes -= self._entries.popleft().array.nbytes
+        if self.dumpFolder:
+            self.dump(entry)
+
+    def dump(self, entry, folder=None):
+        folder = self.dumpFolder if folder is None else folder
+        path = os.path.join(folder, entry.fileName())
+        try:
+            np.save(path, entry.array)
+        except (IOError, OSError) as e:
+            logger.error("could not save diagnostic %s to %s: %s" % (entry.name, path, e))
+        return path
+
+    def entries(self):
+        """the recorded entries, oldest first"""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usedBytes(self):
+        return self._bytes
+
+buffer = DiagnosticsBuffer()
+
+def record(source, name, array, imagePath=None):
+    buffer.record(source, name, array, imagePath)
+
+
+class DiagnosticsDialog(traits.HasTraits):
+    """inspect the diagnostics buffer. The list is a snapshot, press refresh for newer entries"""
+    captureBool = traits.Bool(False, desc="record intermediate arrays of the processors in memory")
+    bufferSizeMB = traits.Range(1, 2048, 64, desc="memory used for recorded arrays. The oldest arrays are dropped first")
+    dumpBool = traits.Bool(False, desc="also save every recorded array as a .npy file in the dump folder")
+    dumpFolder = traits.Directory(desc="folder for .npy files of the recorded arrays")
+    entryLabels = traits.List(traits.Str)
+    selectedEntry = traits.Str
+    summary = traits.Str
+    usage = traits.Str
+    refreshButton = traits.Button("refresh")
+    plotButton = traits.Button("plot")
+    saveButton = traits.Button("save .npy")
+    clearButton = traits.Button("clear")
+
+    traits_view = traitsui.View(
+        traitsui.VGroup(
+            traitsui.HGroup(traitsui.Item("captureBool", label="capture?"), traitsui.Item("bufferSizeMB", label="buffer size (MB)"),
+                            traitsui.Item("usage", show_label=False, style="readonly")),
+            traitsui.HGroup(traitsui.Item("dumpBool", label="dump to files?"), traitsui.Item("dumpFolder", label="dump folder")),
+            traitsui.Item("entryLabels", editor=traitsui.ListStrEditor(selected="selectedEntry", editable=False), show_label=False),
+            traitsui.Item("summary", style="readonly", show_label=False),
+            traitsui.HGroup(traitsui.Item("refreshButton", show_label=False), traitsui.Item("plotButton", show_label=False),
+                            traitsui.Item("saveButton", show_label=False), traitsui.Item("clearButton", show_label=False))),
+        resizable=True, title="Processor Diagnostics")
+
+    def __init__(self, **traitsDict):
+        super(DiagnosticsDialog, self).__init__(**traitsDict)
+        self.captureBool = buffer.enabled
+        self.bufferSizeMB = max(1, buffer.maxBytes//2**20)
+        if buffer.dumpFolder is not None:
+            self.dumpFolder = buffer.dumpFolder
+        self.dumpBool = buffer.dumpFolder is not None
+        self._entries = []
+        self._refreshButton_fired()
+
+    def _captureBool_changed(self):
+        buffer.enabled = self.captureBool
+
+    def _bufferSizeMB_changed(self):
+        buffer.maxBytes = self.bufferSizeMB*2**20
+
+    def _dumpBool_changed(self):
+        self._dumpFolder_changed()
+
+    def _dumpFolder_changed(self):
+        if self.dumpBool and not os.path.isdir(self.dumpFolder):
+            logger.error("diagnostics dump folder %s doesn't exist. Not dumping" % self.dumpFolder)
+            buffer.dumpFolder = None
+        else:
+            buffer.dumpFolder = self.dumpFolder if self.dumpBool else None
+
+    def _getSelected(self):
+        for entry in self._entries:
+            if entry.label() == self.selectedEntry:
+                return entry
+        return None
+
+    def _selectedEntry_changed(self):
+        entry = self._getSelected()
+        self.summary = entry.summary() if entry is not None else ""
+
+    def _refreshButton_fired(self):
+        self._entries = buffer.entries()[::-1]# newest first
+        self.entryLabels = [entry.label() for entry in self._entries]
+        self.usage = "%.1f MB in %s arrays" % (buffer.usedBytes()/2.**20, len(self._entries))
+
+    def _plotButton_fired(self):
+        entry = self._getSelected()
+        if entry is None:
+            return
+        import matplotlib.pyplot as plt# only needed on demand
+        plt.figure()
+        if entry.array.ndim == 2:
+            plt.imshow(entry.array, interpolation="nearest")
+            plt.colorbar()
+        else:
+            plt.plot(np.ravel(entry.array))
+        plt.title("%s %s" % (entry.source, entry.name))
+        plt.show()
+
+    def _saveButton_fired(self):
+        entry = self._getSelected()
+        if entry is None:
+            return
+        folder = self.dumpFolder if os.path.isdir(self.dumpFolder) else os.getcwd()
+        logger.info("saved diagnostic to %s" % buffer.dump(entry, folder))
+
+    def _clearButton_fired(self):
+        buffer.clear()
+        self._refreshButton_fired()
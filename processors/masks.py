@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: masks.py
+
+Cache of region of interest masks for the processors, e.g. the annulus around
+the atoms used by "Rescale with circular mask?" to balance the light picture.
+A mask only depends on the image shape and a few options, so it is built once
+(by broadcasting, without a meshgrid) and reused until the options or the
+shape change.
+
+Each Mask has the boolean mask and the flat indices of its pixels.
+numpy.take(array, mask.indices) selects the pixels of an image faster than
+boolean indexing, which has to scan the whole mask for every image.
+"""
+
+import collections
+import threading
+
+import numpy as np
+
+_maxCachedMasks = 16
+_cache = collections.OrderedDict()# key: (kind, shape, parameters), least recently used first
+_cacheLock = threading.Lock()# processors run in the ingest pipeline worker and the gui thread
+
+
+class Mask(object):
+    """read only boolean mask and the flat indices of the pixels where it is True"""
+    def __init__(self, mask):
+        self.mask = mask
+        self.mask.flags.writeable = False# shared by all processors
+        self.indices = np.flatnonzero(mask)
+        self.indices.flags.writeable = False
+        self.shape = mask.shape
+
+    def select(self, array):
+        """returns the pixels of array (of the mask's shape) in the mask as a 1D array"""
+        if np.shape(array) != self.shape:
+            raise ValueError("mask is for arrays of shape %s not %s" % (self.shape, np.shape(array)))
+        return np.take(array, self.indices)
+
+
+def _squaredDistance(shape, posX, posY):
+    """squared distance of each pixel from (posX, posY). x is the column, y the row"""
+    x = np.arange(shape[1]) - posX
+    y = np.arange(shape[0]) - posY
+    return (x*x)[np.newaxis, :] + (y*y)[:, np.newaxis]
+
+def _annulus(shape, posX, posY, innerRadius, outerRadius):
+    distanceSq = _squaredDistance(shape, posX, posY)
+    return np.logical_and(innerRadius**2 < distanceSq, distanceSq < outerRadius**2)
+
+def _circle(shape, posX, posY, radius):
+    return _squaredDistance(shape, posX, posY) < radius**2
+
+def _rectangle(shape, initialX, initialY, width, height):
+    mask = np.zeros(shape, dtype=bool)
+    mask[max(0, initialY):initialY+height, max(0, initialX):initialX+width] = True
+    return mask
+
+_builders = {"annulus":_annulus, "circle":_circle, "rectangle":_rectangle}
+
+
+def getMask(kind, shape, *parameters):
+    """returns the cached Mask of kind (a key of _builders) for shape and parameters, building it if needed"""
+    key = (kind, tuple(shape), parameters)
+    with _cacheLock:
+        mask = _cache.pop(key, None)
+        if mask is None:
+            mask = Mask(_builders[kind](tuple(shape), *parameters))
+        _cache[key] = mask
+        while len(_cache) > _maxCachedMasks:
+            _cache.popitem(last=False)
+    return mask
+
+def annulus(shape, posX, posY, innerRadius, outerRadius):
+    """pixels further than innerRadius and closer than outerRadius from (posX, posY)"""
+    return getMask("annulus", shape, posX, posY, innerRadius, outerRadius)
+
+def circle(shape, posX, posY, radius):
+    """pixels closer than radius to (posX, posY)"""
+    return getMask("circle", shape, posX, posY, radius)
+
+def rectangle(shape, initialX, initialY, width, height):
+    """pixels in the width x height rectangle starting at (initialX, initialY), like Processor.rescale"""
+    return getMask("rectangle", shape, initialX, initialY, width, height)
+
+def clear():
+    with _cacheLock:
+        _cache.clear()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: pcaFringeRemoval.py
+
+ANDOR1 processor that removes fringes by replacing the light picture with a
+PCA reconstruction of the atoms picture's background. The basis is built from
+the light pictures of the last "PCA basis frames" shots while images come in
+(see streamingPCA.py), so no separate training set is needed. The region
+inside "Atom mask Radius" of ("Atom mask PosX", "Atom mask PosY") is ignored
+when fitting the background to the atoms picture.
+"""
+
+import logging
+import time
+import collections
+
+import standardAndor1
+import streamingPCA
+import masks
+
+logger=logging.getLogger("ExperimentEagle.Processor")
+
+
+class PCAFringeRemovalAndor1(standardAndor1.StandardAndor1):
+    """standard ANDOR1 processing with a streaming PCA reconstruction of the light picture"""
+
+    optionsDict = collections.OrderedDict(standardAndor1.StandardAndor1.optionsDict.items()+
+                                          [("PCA fringe removal?",True),
+                                           ("Update PCA basis?",True), # add the light picture of every shot to the basis
+                                           ("PCA basis frames",40), # the basis holds the light pictures of this many shots (memory!)
+                                           ("PCA components",20)]) # 0 uses all components
+
+    def __init__(self, **traitsDict):
+        super(PCAFringeRemovalAndor1, self).__init__(**traitsDict)
+        self.basis = streamingPCA.StreamingPCABasis(maxFrames=self.optionsDict["PCA basis frames"])
+
+    def lightBackground(self, atomsArray, lightArray):
+        if not self.optionsDict["PCA fringe removal?"]:
+            return lightArray
+        if self.basis.maxFrames != self.optionsDict["PCA basis frames"]:
+            logger.info("PCA basis frames changed to %s. starting a new basis" % self.optionsDict["PCA basis frames"])
+            self.basis = streamingPCA.StreamingPCABasis(maxFrames=self.optionsDict["PCA basis frames"])
+        mask = masks.annulus(atomsArray.shape, self.optionsDict["Atom mask PosX"], self.optionsDict["Atom mask PosY"],
+                             self.optionsDict["Atom mask Radius"], float("inf"))
+        start = time.time()
+        if self.optionsDict["Update PCA basis?"] or self.basis.count == 0:
+            self.basis.addFrame(lightArray, mask)
+        elif self.basis.shape != atomsArray.shape:
+            logger.error("PCA basis frames have shape %s but the pictures have shape %s. using the light picture" % (self.basis.shape, atomsArray.shape))
+            return lightArray
+        background = self.basis.reconstruct(atomsArray, mask, self.optionsDict["PCA components"])
+        logger.info("PCA background from %s frames in %.1f ms" % (self.basis.count, (time.time()-start)*1E3))
+        self.recordDiagnostic("PCA background", background)
+        return background
@@ -9,6 +9,7 @@ Filename: processors.py
 """
 import logging
 import collections
+import time
 
 import numpy as np
 import scipy
@@ -19,9 +20,20 @@ import traits.api as traits
 import traitsui.api as traitsui
 
 import optionsDictEditor
+import darkFrameCache
+import imageReader
+import fileWatcher
+import rotationMaps
+import diagnostics
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
 
 logger=logging.getLogger("ExperimentEagle.Processor")
 
+useNumexpr = numexpr is not None# evaluate the optical density with numexpr (multithreaded, single pass) when it is installed
+
 class Processor(traits.HasTraits):
     """parent class for image processing. Raw image is received and then the process
      function returns the image experiment eagle should be given / display
@@ -37,41 +49,92 @@ class Processor(traits.HasTraits):
     traits_view = traitsui.View(traitsui.Item("optionsDict", style="custom"))
 
     def read(self, rawImagePath):
-        """ returns array from image file"""
+        """ returns array from image file (see imageReader.py for the dtype)"""
         logger.info("processor reading file!")
-        im = scipy.misc.imread(rawImagePath).astype(scipy.float_)
+        im = imageReader.readImage(rawImagePath)
+        self.lastImagePath = rawImagePath# for the diagnostics of this shot
         if len(im.shape) == 3:
             logger.warning("loaded picture is not monochromatic, take mean of color values..")
             im = np.mean(im,axis=2)
         return im
 
+    def readSeries(self, rawImagePath, stackSeries=False, attempts=4, timeout=4.0):
+        """returns the array of rawImagePath. If stackSeries and rawImagePath is the second frame of an
+        Andor Solis series (_X2.tif) the _X1.tif frame is stacked on top. Waits until the frames are completely
+        written and, as Andor Solis can take a while to save them, reads again after 1 s if reading fails,
+        at most attempts times"""
+        paths = [rawImagePath]
+        if stackSeries and rawImagePath.endswith("_X2.tif"):
+            paths.insert(0, rawImagePath.replace("_X2.tif","_X1.tif"))
+        if not fileWatcher.waitUntilReady(rawImagePath, timeout=timeout):
+            logger.warning("%s still not completely written after %s s. Trying to read it anyway" % (rawImagePath, timeout))
+        for attempt in range(1, attempts+1):
+            try:
+                arrays = [self.read(path) for path in paths]
+                break
+            except (IOError, ValueError) as e:
+                if attempt == attempts:
+                    raise
+                logger.warning("could not read {} ({}). Andor Solis may still be saving it, wait 1 s and try again. Try {} of {}".format(rawImagePath, e, attempt, attempts))
+                time.sleep(1)
+        return arrays[0] if len(arrays) == 1 else np.vstack(arrays)
+
     def scale(self, array, scale, offset):
         """ due to how files are saved we often need to rescale and add offset. This function
         inverts the action of the scaling done by experiment Control"""
         return (array-offset)/scale
 
     def loadDarkImage(self, darkFilePath):
-        """ dark images should be saved using scipy.savetxt(.gz, array)"""
-        return scipy.loadtxt( str(darkFilePath) )
-
-    def opticalDensity(self, atomArray, lightArray):
+        """ dark images should be saved with numpy.save(.npy, array). Text files saved with
+        scipy.savetxt(.gz, array) are converted once. Returns a read only array shared by all
+        processors (see darkFrameCache.py)"""
+        return darkFrameCache.getDarkFrame(darkFilePath)
+
+    def opticalDensity(self, atomArray, lightArray, atomDarkArray=None, lightDarkArray=None, out=None):
+        """returns -log(atoms/light) after subtracting the (optional) dark arrays. If any atoms are negative
+        or any light is not positive, both arrays are clipped to 1 first. The inputs are not changed.
+        The numpy version works in place on out (allocated if None) and one temporary array and gives exactly
+        the result of the separate whole array steps. The numexpr version evaluates everything in one pass
+        and agrees to within rounding of the last digits"""
         if atomArray.shape != lightArray.shape:
             logger.error("shape of atom and light images is not the same. Cannot proceed. Stopping processing")
             return None
-        if (not scipy.all(atomArray>=0.0)) or (not scipy.all(lightArray>0.0)):
+        if useNumexpr:
+            return self._opticalDensityNumexpr(atomArray, lightArray, atomDarkArray, lightDarkArray, out)
+        if out is None:
+            out = np.empty_like(atomArray)
+        if atomDarkArray is None:
+            out[...] = atomArray
+        else:
+            np.subtract(atomArray, atomDarkArray, out=out)
+        light = lightArray if lightDarkArray is None else np.subtract(lightArray, lightDarkArray, out=np.empty_like(lightArray))
+        if not (out.min() >= 0.0 and light.min() > 0.0):# also true if there are nans, like scipy.all
             logger.warning("negative values found in atom / light array which won't work when log is taken. clipping to 1")
-            atomArray = atomArray.clip(1)
-            lightArray = lightArray.clip(1)
+            np.maximum(out, 1, out=out)
+            light = np.maximum(light, 1, out=None if light is lightArray else light)
         logger.warning("Calculate OD picture..")
-        # print(atomArray)
-        # print(lightArray)
-        # print(atomArray/lightArray)
-        # print(scipy.log(atomArray/lightArray))
-        return -scipy.log(atomArray/lightArray)
+        np.divide(out, light, out=out)
+        np.log(out, out=out)
+        return np.negative(out, out=out)
+
+    def _opticalDensityNumexpr(self, atomArray, lightArray, atomDarkArray, lightDarkArray, out):
+        if out is None:
+            out = np.empty_like(atomArray)
+        variables = {"a":atomArray, "l":lightArray, "ad":0.0 if atomDarkArray is None else atomDarkArray,
+                     "ld":0.0 if lightDarkArray is None else lightDarkArray}
+        clip = not (numexpr.evaluate("min(a - ad)", local_dict=variables) >= 0.0 and numexpr.evaluate("min(l - ld)", local_dict=variables) > 0.0)
+        if clip:
+            logger.warning("negative values found in atom / light array which won't work when log is taken. clipping to 1")
+            expression = "-log(where(a - ad < 1, 1, a - ad) / where(l - ld < 1, 1, l - ld))"# where keeps nans like clip
+        else:
+            expression = "-log((a - ad) / (l - ld))"
+        logger.warning("Calculate OD picture..")
+        return numexpr.evaluate(expression, local_dict=variables, out=out, casting="same_kind")
 
     def rotate(self,array, angle):
-        """bilinear interpolation used and standard scipy rotation """
-        return scipy.ndimage.interpolation.rotate(array, angle, order=1)
+        """bilinear interpolation, same as the standard scipy rotation. The interpolation
+        map for the shape and angle is computed once and cached (see rotationMaps.py)"""
+        return rotationMaps.rotate(array, angle, order=1)
 
     def fastKineticsCrop(self,rawArray,n):
         """in fast kinetic picture we have one large array and then need to crop it into n equal arrays vertically.
@@ -91,11 +154,17 @@ class Processor(traits.HasTraits):
         subArray2 = array2[initialY:initialY + height, initialX: initialX + width]
         rescaleFactor = (subArray2/subArray1).mean()
         logger.info("processor: rescale factor = %s using region of shape: %s, %s" % (rescaleFactor, subArray1.shape[0],subArray1.shape[1]))
-        import matplotlib.pyplot as plt
-        plt.imshow( self.opticalDensity(subArray2,rescaleFactor*subArray1) )
-        plt.savefig("debug")
-        plt.clf()
+        if diagnostics.buffer.enabled:
+            self.recordDiagnostic("rescale region array1", subArray1)
+            self.recordDiagnostic("rescale region array2", subArray2)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self.recordDiagnostic("rescale region OD", -np.log(subArray2/(rescaleFactor*subArray1)))
         return rescaleFactor*array1
+
+    def recordDiagnostic(self, name, array):
+        """keeps a copy of an intermediate array in the diagnostics buffer (see diagnostics.py).
+        Nothing is drawn or saved unless requested from the diagnostics dialog"""
+        diagnostics.record(type(self).__name__, name, array, getattr(self, "lastImagePath", None))
     
     def getBinningFactor(self):
         """ The factor by which a pixel is larger due to binning, should be implemented by subclass, if binning is available """
@@ -118,6 +187,3 @@ class Processor(traits.HasTraits):
             # for standardAndor1 and 0
             if hasattr(self,"framePlot"):
                 self.drawRescaleRegion(self.framePlot)
-
-if __name__=="__main__":
-    p = Processor()
\ No newline at end of file
@@ -16,29 +16,15 @@ import logging
 import scipy.ndimage
 import collections
 import optionsDictEditor
+import darkFrameCache
+import imageReader
+import binning
+import rotationMaps
 import os
 import numpy as np
 
 logger=logging.getLogger("ExperimentEagle.Processor")
 
-def binArray(data, axis, binstep, binsize, func=np.nanmean):
-    """
-    from https://stackoverflow.com/questions/21921178/binning-a-numpy-array/42024730#42024730
-    data    ---  is your array
-    axis    ---  is the axis you want to been
-    binstep ---  is the number of points between each bin (allow overlapping bins)
-    binsize ---  is the size of each bin
-
-    func    ---  is the function you want to apply to the bin (np.max for maxpooling, np.mean for an average ...)"""
-    
-    data = np.array(data)
-    dims = np.array(data.shape)
-    argdims = np.arange(data.ndim)
-    argdims[0], argdims[axis]= argdims[axis], argdims[0]
-    data = data.transpose(argdims)
-    data = [func(np.take(data,np.arange(int(i*binstep),int(i*binstep+binsize)),0),0) for i in np.arange(dims[axis]//binstep)]
-    data = np.array(data).transpose(argdims)
-    return data
 
 defaultDarkImagePath = os.path.join("\\\\ursa", "AQOGroupFolder", "Experiment Humphry", "Experiment Control and Software", "darkImages", "darkAverageData", "2016-10-20","2016-10-20-darkAverage.gz" )
 
@@ -67,7 +53,7 @@ class rawImageBinning(traits.HasTraits):
     def read(self, rawImagePath):
         """ returns array from image file"""
         logger.info("processor reading file!")
-        return scipy.misc.imread(rawImagePath).astype(scipy.float_)
+        return imageReader.readImage(rawImagePath)
 
     def scale(self, array, scale, offset):
         """ due to how files are saved we often need to rescale and add offset. This function
@@ -75,8 +61,8 @@ class rawImageBinning(traits.HasTraits):
         return (array-offset)/scale
 
     def loadDarkImage(self, darkFilePath):
-        """ dark images should be saved using scipy.savetxt(.gz, array)"""
-        return scipy.loadtxt( str(darkFilePath) )
+        """ read only dark image shared by all processors (see darkFrameCache.py)"""
+        return darkFrameCache.getDarkFrame(darkFilePath)
 
     def opticalDensity(self, atomArray, lightArray):
         if atomArray.shape != lightArray.shape:
@@ -89,8 +75,9 @@ class rawImageBinning(traits.HasTraits):
         return -scipy.log(atomArray/lightArray)
 
     def rotate(self,array, angle):
-        """bilinear interpolation used and standard scipy rotation """
-        return scipy.ndimage.interpolation.rotate(array, angle, order=1)
+        """bilinear interpolation, same as the standard scipy rotation. The interpolation
+        map for the shape and angle is computed once and cached (see rotationMaps.py)"""
+        return rotationMaps.rotate(array, angle, order=1)
 
     def fastKineticsCrop(self,rawArray,n):
         """in fast kinetic picture we have one large array and then need to crop it into n equal arrays vertically.
@@ -120,16 +107,7 @@ class rawImageBinning(traits.HasTraits):
         
         rawArray = self.read(rawImagePath)
         if self.optionsDict["process?"] is True:
-            _, ext = os.path.splitext( self.optionsDict["Dark picture"] )
-            if ext == '.npy':
-                self.darkArray = np.load(self.optionsDict["Dark picture"])
-                self.darkPictureFilename = self.optionsDict["Dark picture"]
-            elif ext == '.gz':
-                logger.warning('loading ".gz" picture .. is .. very .. slow .., better use numpy file ".npy"')
-                self.darkArray = self.loadDarkImage(self.optionsDict["Dark picture"])
-                self.darkPictureFilename = self.optionsDict["Dark picture"]
-            else:
-                raise TypeError("Invalid file extension: '" + ext + "'")
+            self.darkArray = self.loadDarkImage(self.optionsDict["Dark picture"])
             try:
                 rawArray -= self.darkArray
             except ValueError:
@@ -146,9 +124,7 @@ class rawImageBinning(traits.HasTraits):
         
     @staticmethod
     def binning(array, binsize=2):
-        data_binned = binArray(array, 0, binsize, binsize, np.mean)
-        data_binned = binArray(data_binned, 1, binsize, binsize, np.mean)
-        return data_binned
+        return binning.binImage(array, binsize)
 
     def editOptions(self):
         """This method is used to create a dialog to edit the processor options and once the user is finish
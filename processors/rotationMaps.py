@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: rotationMaps.py
+
+Cached rotation of images by a fixed angle (see Processor.rotate).
+
+scipy.ndimage.interpolation.rotate(array, angle, order=1) works out the source
+coordinates of every output pixel and their interpolation weights again for
+each frame, although for a processor they only depend on the image shape and
+the rotationAngle option. A RotationMap computes them once: for each output
+pixel that falls inside the input it stores the flat indices of the 4 source
+pixels and their bilinear weights. Rotating a frame is then one gather
+(numpy.take) and a weighted sum.
+
+The geometry is that of scipy's rotate with reshape=True (the output is large
+enough to hold the whole rotated image) and the rotation is about the centre
+((n-1)/2) of the input and output arrays like scipy's. Output pixels whose
+source lies outside the input are 0 (mode="constant"). tests/test_rotationMaps.py
+checks the results against scipy.
+
+Maps are cached on (shape, angle, order), so changing the rotationAngle option
+(or the image size) gives a new map and the least recently used map is dropped.
+"""
+
+import collections
+import threading
+import logging
+
+import numpy as np
+
+logger=logging.getLogger("ExperimentEagle.Processor")
+
+_maxCachedMaps = 4
+_cache = collections.OrderedDict()# key: (shape, angle, order), least recently used first
+_cacheLock = threading.Lock()# processors run in the ingest pipeline worker and the gui thread
+
+
+class RotationMap(object):
+    """source indices and weights for rotating 2D arrays of shape by angle degrees
+    (anticlockwise, as scipy.ndimage.interpolation.rotate) with bilinear interpolation"""
+
+    def __init__(self, shape, angle, order=1):
+        if order != 1:
+            raise ValueError("only bilinear interpolation (order=1) is supported, not order=%s" % order)
+        rows, columns = shape
+        if rows < 2 or columns < 2:
+            raise ValueError("can't rotate an array of shape %s" % (shape,))
+        phi = np.pi/180.*angle
+        cos, sin = np.cos(phi), np.sin(phi)
+        # output shape: bounding box of the rotated corners, as scipy
+        corners = np.dot([[cos, sin], [-sin, cos]], [[0, 0, rows, rows], [0, columns, 0, columns]])
+        outputRows = int(corners[0].max()-corners[0].min()+0.5)
+        outputColumns = int(corners[1].max()-corners[1].min()+0.5)
+        # source (row, column) = matrix . output (row, column) + offset with the centres mapped onto each other
+        matrix = np.array([[cos, sin], [-sin, cos]])
+        offset = np.array([rows/2.0-0.5, columns/2.0-0.5])-np.dot(matrix, [outputRows/2.0-0.5, outputColumns/2.0-0.5])
+        outputRowIndices, outputColumnIndices = np.indices((outputRows, outputColumns), dtype=np.float64)
+        sourceRows = matrix[0, 0]*outputRowIndices+matrix[0, 1]*outputColumnIndices+offset[0]
+        sourceColumns = matrix[1, 0]*outputRowIndices+matrix[1, 1]*outputColumnIndices+offset[1]
+        epsilon = 1E-9# rounding errors shouldn't drop pixels exactly on the edge
+        inside = (sourceRows > -epsilon) & (sourceRows < rows-1+epsilon) & (sourceColumns > -epsilon) & (sourceColumns < columns-1+epsilon)
+        self.outputIndices = np.flatnonzero(inside)
+        sourceRows = sourceRows[inside].clip(0, rows-1)
+        sourceColumns = sourceColumns[inside].clip(0, columns-1)
+        # top left source pixel. The last row / column uses the pixel before it with a weight of 1 for the edge
+        topRows = np.minimum(sourceRows.astype(np.intp), rows-2)
+        leftColumns = np.minimum(sourceColumns.astype(np.intp), columns-2)
+        rowFractions = sourceRows-topRows
+        columnFractions = sourceColumns-leftColumns
+        topLeft = topRows*columns+leftColumns
+        indexType = np.int32 if rows*columns < 2**31 else np.intp# halves the memory of the map
+        self.sourceIndices = np.array([topLeft, topLeft+1, topLeft+columns, topLeft+columns+1], dtype=indexType)
+        self.weights = np.array([(1-rowFractions)*(1-columnFractions), (1-rowFractions)*columnFractions,
+                                 rowFractions*(1-columnFractions), rowFractions*columnFractions])
+        self.shape = tuple(shape)
+        self.angle = angle
+        self.outputShape = (outputRows, outputColumns)
+        self._weightsByType = {np.dtype(np.float64):self.weights}
+
+    def _getWeights(self, dtype):
+        """weights in the float type of the image, so that float32 images are rotated in float32"""
+        dtype = np.dtype(dtype) if np.dtype(dtype).kind == "f" else np.dtype(np.float64)
+        if dtype not in self._weightsByType:
+            self._weightsByType[dtype] = self.weights.astype(dtype)
+        return self._weightsByType[dtype]
+
+    def apply(self, array, out=None):
+        """returns array rotated. The result has the dtype of array (integers are rounded like scipy).
+        out (of shape outputShape) is used for the result if given"""
+        array = np.asarray(array)
+        if array.shape != self.shape:
+            raise ValueError("rotation map is for arrays of shape %s not %s" % (self.shape, array.shape))
+        weights = self._getWeights(array.dtype)
+        sourceValues = np.take(array.ravel(), self.sourceIndices)# one gather of all 4 neighbours
+        if sourceValues.dtype != weights.dtype:
+            sourceValues = sourceValues.astype(weights.dtype)
+        sourceValues *= weights
+        values = sourceValues.sum(axis=0)
+        if array.dtype.kind in "iub":
+            values = np.rint(values, out=values)
+        if out is None:
+            out = np.zeros(self.outputShape, dtype=array.dtype)
+        else:
+            out[...] = 0
+        out.ravel()[self.outputIndices] = values# out is contiguous so ravel is a view
+        return out
+
+
+def getRotationMap(shape, angle, order=1):
+    """returns the cached RotationMap for arrays of shape rotated by angle, creating it if needed"""
+    key = (tuple(shape), float(angle), order)
+    with _cacheLock:
+        rotationMap = _cache.pop(key, None)
+        if rotationMap is None:
+            logger.info("computing rotation map for shape %s and angle %s" % key[:2])
+            rotationMap = RotationMap(shape, angle, order)
+        _cache[key] = rotationMap
+        while len(_cache) > _maxCachedMaps:
+            _cache.popitem(last=False)
+    return rotationMap
+
+def rotate(array, angle, order=1):
+    """drop in replacement for scipy.ndimage.interpolation.rotate(array, angle, order=order) for 2D arrays"""
+    return getRotationMap(np.shape(array), angle, order).apply(array)
+
+def clear():
+    with _cacheLock:
+        _cache.clear()
+
@@ -9,6 +9,7 @@ Filename: standardAndor0.py
 """
 
 import processors
+import binning
 import logging
 import scipy
 logger=logging.getLogger("ExperimentEagle.Processor")
@@ -24,24 +25,6 @@ defaultDarkImagePath = os.path.join("calibration", "darkPictures", "Andor0", "20
 if not os.path.exists(defaultDarkImagePath):
     defaultDarkImagePath = os.path.join("\\\\ursa", "AQOGroupFolder", "Experiment Humphry", "Experiment Control and Software", "darkImages", "darkAverageData", "2016-10-20","2016-10-20-darkAverage.gz" )
 
-def binArray(data, axis, binstep, binsize, func=np.nanmean):
-    """
-    from https://stackoverflow.com/questions/21921178/binning-a-numpy-array/42024730#42024730
-    data    ---  is your array
-    axis    ---  is the axis you want to been
-    binstep ---  is the number of points between each bin (allow overlapping bins)
-    binsize ---  is the size of each bin
-
-    func    ---  is the function you want to apply to the bin (np.max for maxpooling, np.mean for an average ...)"""
-    
-    data = np.array(data)
-    dims = np.array(data.shape)
-    argdims = np.arange(data.ndim)
-    argdims[0], argdims[axis]= argdims[axis], argdims[0]
-    data = data.transpose(argdims)
-    data = [func(np.take(data,np.arange(int(i*binstep),int(i*binstep+binsize)),0),0) for i in np.arange(dims[axis]//binstep)]
-    data = np.array(data).transpose(argdims)
-    return data
 
 class StandardAlta1(processors.Processor):
     """ default processor to use when running ANDOR0 camera"""
@@ -153,9 +136,7 @@ class StandardAlta1(processors.Processor):
     
     @staticmethod
     def binning(array, binsize=2):
-        data_binned = binArray(array, 0, binsize, binsize, np.mean)
-        data_binned = binArray(data_binned, 1, binsize, binsize, np.mean)
-        return data_binned
+        return binning.binImage(array, binsize)
         
 # if __name__=="__main__":
 #     import matplotlib.pyplot as plt
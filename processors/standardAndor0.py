@@ -38,21 +38,7 @@ class StandardAndor0(processors.Processor):
         if not self.optionsDict["process?"]:
             return rawArray
         if self.optionsDict["darkSubtraction?"]:
-            loadDarkPic = True
-            if hasattr(self,'darkArray'):
-                if self.darkPictureFilename == self.optionsDict["Dark picture"]:
-                    loadDarkPic = False # already loaded dark picture with same path
-            if loadDarkPic:
-                _, ext = os.path.splitext( self.optionsDict["Dark picture"] )
-                if ext == '.npy':
-                    self.darkArray = np.load(self.optionsDict["Dark picture"])
-                    self.darkPictureFilename = self.optionsDict["Dark picture"]
-                elif ext == '.gz':
-                    logger.warning('loading ".gz" picture .. is .. very .. slow .., better use numpy file ".npy"')
-                    self.darkArray = self.loadDarkImage(self.optionsDict["Dark picture"])
-                    self.darkPictureFilename = self.optionsDict["Dark picture"]
-                else:
-                    raise TypeError("Invalid file extension: '" + ext + "'")
+            self.darkArray = self.loadDarkImage(self.optionsDict["Dark picture"])
             try:
                 rawArray -= self.darkArray
             except ValueError:
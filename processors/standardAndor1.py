@@ -11,7 +11,6 @@ Filename: standardAndor1.py
 import logging
 import os
 import collections
-import time
 
 import scipy
 import numpy as np
@@ -20,28 +19,12 @@ import traits.api as traits
 import chaco.api as chaco
 
 import processors
+import binning
+import masks
 
 logger=logging.getLogger("ExperimentEagle.Processor")
 
 
-def binArray(data, axis, binstep, binsize, func=np.nanmean):
-    """
-    from https://stackoverflow.com/questions/21921178/binning-a-numpy-array/42024730#42024730
-    data    ---  is your array
-    axis    ---  is the axis you want to been
-    binstep ---  is the number of points between each bin (allow overlapping bins)
-    binsize ---  is the size of each bin
-
-    func    ---  is the function you want to apply to the bin (np.max for maxpooling, np.mean for an average ...)"""
-    
-    data = np.array(data)
-    dims = np.array(data.shape)
-    argdims = np.arange(data.ndim)
-    argdims[0], argdims[axis]= argdims[axis], argdims[0]
-    data = data.transpose(argdims)
-    data = [func(np.take(data,np.arange(int(i*binstep),int(i*binstep+binsize)),0),0) for i in np.arange(dims[axis]//binstep)]
-    data = np.array(data).transpose(argdims)
-    return data
 
 defaultDarkImagePath = os.path.join("\\\\ursa","AQOGroupFolder","Experiment Humphry","Experiment Control and Software","experimentEagle","calibration","darkPictures","Andor1","2020 03 30 - dark Andor1 - interval 0_017 temperature -80_0 .npy")
 
@@ -74,19 +57,7 @@ class StandardAndor1(processors.Processor):
 
     def process(self,rawImagePath):
         logger.info("using standard Andor 0 process function")
-        if rawImagePath.endswith("_X2.tif"):
-            for i in range(4):
-                try:
-                    rawArray2 = self.read(rawImagePath)
-                    rawArray1 = self.read(rawImagePath.replace("_X2.tif","_X1.tif"))
-                    rawArray = np.vstack( (rawArray1,rawArray2) )
-                    break
-                except IOError:
-                    logger.warning("IOError for loading tif file. Since Andor Solis needs some time to save this picture, wait 1 s and try again. Try {} of 4".format(i+1))
-                    time.sleep(1)
-                    pass
-        else:
-            rawArray = self.read(rawImagePath)
+        rawArray = self.readSeries(rawImagePath, stackSeries=True)# waits for and stacks both frames of an Andor Solis series
         if not self.optionsDict["process?"]:
             return rawArray
         if self.optionsDict["Use boosted light image?"]:
@@ -94,36 +65,22 @@ class StandardAndor1(processors.Processor):
             opticalDensity = self.opticalDensityStrongerLightPicture(rawArray, darkArray, self.optionsDict["Light boost factor"])
         else:
             if self.optionsDict["darkSubtraction?"]:
-                loadDarkPic = True
-                if hasattr(self,'darkArray'):
-                    if self.darkPictureFilename == self.optionsDict["Dark picture"]:
-                        loadDarkPic = False # already loaded dark picture with same path
-                if loadDarkPic:
-                    _, ext = os.path.splitext( self.optionsDict["Dark picture"] )
-                    if ext == '.npy':
-                        self.darkArray = np.load(self.optionsDict["Dark picture"])
-                        self.darkPictureFilename = self.optionsDict["Dark picture"]
-                    elif ext == '.gz':
-                        logger.warning('loading ".gz" picture .. is .. very .. slow .., better use numpy file ".npy"')
-                        self.darkArray = self.loadDarkImage(self.optionsDict["Dark picture"])
-                        self.darkPictureFilename = self.optionsDict["Dark picture"]
-                    else:
-                        raise TypeError("Invalid file extension: '" + ext + "'")
+                self.darkArray = self.loadDarkImage(self.optionsDict["Dark picture"])
                 try:
                     rawArray -= self.darkArray
                 except ValueError:
                     logger.error("rawArray {} and darkArray {} have different shape".format( rawArray.shape, self.darkArray.shape ))
-                rawArray=rawArray.clip(1)
+                rawArray.clip(1, out=rawArray)
             if self.optionsDict["rawImageWithDarkSubtraction?"]:
                 return rawArray
             [atomsArray, lightArray] = self.fastKineticsCrop(rawArray, 2)
+            lightArray = self.lightBackground(atomsArray, lightArray)
             if self.optionsDict["Rescale with circular mask?"]:
-                y = np.arange(lightArray.shape[0])
-                x = np.arange(lightArray.shape[1])
-                x, y = np.meshgrid(x, y)
-                distanceSq = (x - self.optionsDict["Atom mask PosX"])*(x - self.optionsDict["Atom mask PosX"]) + (y - self.optionsDict["Atom mask PosY"])*(y - self.optionsDict["Atom mask PosY"])
-                indices = np.logical_and( self.optionsDict["Atom mask Radius"]**2 < distanceSq, distanceSq < self.optionsDict["Balance light Radius"]**2 )
-                lightBalanceFactor = np.mean( atomsArray[indices] / lightArray[indices] )
+                # cached until the shape or the mask options change
+                mask = masks.annulus(lightArray.shape, self.optionsDict["Atom mask PosX"], self.optionsDict["Atom mask PosY"],
+                                     self.optionsDict["Atom mask Radius"], self.optionsDict["Balance light Radius"])
+                self.recordDiagnostic("circular mask", mask.mask)
+                lightBalanceFactor = np.mean( mask.select(atomsArray) / mask.select(lightArray) )
                 logger.info( "1/lightBalanceFactor = {}".format(1/lightBalanceFactor) ) # change to debug after initial testing phase
                 lightArray *= lightBalanceFactor
             elif self.optionsDict["rescale?"]:
@@ -136,10 +93,13 @@ class StandardAndor1(processors.Processor):
             
             self.atomsArray = atomsArray.clip(1)
             self.lightArray = lightArray.clip(1)
+            self.recordDiagnostic("atoms", self.atomsArray)
+            self.recordDiagnostic("light", self.lightArray)
 
             logger.debug("atomsArray = %s" % atomsArray)
             logger.debug("lightArray = %s" % lightArray)
-            logger.debug("atomsArray/lightArray = %s" % (atomsArray / lightArray))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("atomsArray/lightArray = %s" % (atomsArray / lightArray))
             opticalDensity = self.opticalDensity(atomsArray,lightArray)
         if self.optionsDict["correct OD with alpha function?"]:
             opticalDensity = self.alphaFunction(opticalDensity)
@@ -151,6 +111,11 @@ class StandardAndor1(processors.Processor):
         self.opticalDensityArray = self.rotate(opticalDensity, self.optionsDict["rotationAngle"])
         return self.opticalDensityArray
     
+    def lightBackground(self, atomsArray, lightArray):
+        """returns the light picture used as the background of the atoms picture. Subclasses can
+        replace it, e.g. by a PCA reconstruction (see pcaFringeRemoval.py)"""
+        return lightArray
+
     def drawRescaleRegion(self, framePlot):
         if self.optionsDict["rescale?"]:
             if True:
@@ -193,9 +158,7 @@ class StandardAndor1(processors.Processor):
         [atomsArray, lightArray] = self.fastKineticsCrop(rawArray, 2)
         [atomsDarkArray, lightDarkArray] = self.fastKineticsCrop(darkArray, 2)
         lightArray /= lightArrayFactor
-        lightArray -= lightDarkArray
-        atomsArray -= atomsDarkArray
-        return self.opticalDensity( atomsArray, lightArray )
+        return self.opticalDensity(atomsArray, lightArray, atomsDarkArray, lightDarkArray)
         
     def alphaFunction(self,opticalDensity):
         highODPolynomial = scipy.poly1d([0.4894, -2.059,  2.825,0.9525,0])
@@ -225,9 +188,7 @@ class StandardAndor1(processors.Processor):
     
     @staticmethod
     def binning(array, binsize=2):
-        data_binned = binArray(array, 0, binsize, binsize, np.mean)
-        data_binned = binArray(data_binned, 1, binsize, binsize, np.mean)
-        return data_binned
+        return binning.binImage(array, binsize)
 
 
         
@@ -9,6 +9,7 @@ Filename: standardAndor1.py
 """
 
 import processors
+import masks
 import logging
 import scipy
 logger=logging.getLogger("ExperimentEagle.Processor")
@@ -50,17 +51,15 @@ class StandardAndor1(processors.Processor):
             if self.optionsDict["darkSubtraction?"]:
                 darkArray = self.loadDarkImage(self.darkImagePath)
                 rawArray -= darkArray
-                rawArray=rawArray.clip(1)
+                rawArray.clip(1, out=rawArray)
             if self.optionsDict["rawImageWithDarkSubtraction?"]:
                 return rawArray
             [atomsArray, lightArray] = self.fastKineticsCrop(rawArray, 2)
             if self.optionsDict["Rescale with circular mask?"]:
-                y = np.arange(lightArray.shape[0])
-                x = np.arange(lightArray.shape[1])
-                x, y = np.meshgrid(x, y)
-                distanceSq = (x - self.optionsDict["Atom mask PosX"])*(x - self.optionsDict["Atom mask PosX"]) + (y - self.optionsDict["Atom mask PosY"])*(y - self.optionsDict["Atom mask PosY"])
-                indices = np.logical_and( self.optionsDict["Atom mask Radius"]**2 < distanceSq, distanceSq < self.optionsDict["Balance light Radius"]**2 )
-                lightBalanceFactor = np.mean( atomsArray[indices] / lightArray[indices] )
+                # cached until the shape or the mask options change
+                mask = masks.annulus(lightArray.shape, self.optionsDict["Atom mask PosX"], self.optionsDict["Atom mask PosY"],
+                                     self.optionsDict["Atom mask Radius"], self.optionsDict["Balance light Radius"])
+                lightBalanceFactor = np.mean( mask.select(atomsArray) / mask.select(lightArray) )
                 logger.info( "1/lightBalanceFactor = {}".format(1/lightBalanceFactor) ) # change to debug after initial testing phase
                 lightArray *= lightBalanceFactor
             elif self.optionsDict["rescale?"]:
@@ -85,9 +84,7 @@ class StandardAndor1(processors.Processor):
         [atomsArray, lightArray] = self.fastKineticsCrop(rawArray, 2)
         [atomsDarkArray, lightDarkArray] = self.fastKineticsCrop(darkArray, 2)
         lightArray /= lightArrayFactor
-        lightArray -= lightDarkArray
-        atomsArray -= atomsDarkArray
-        return self.opticalDensity( atomsArray, lightArray)
+        return self.opticalDensity(atomsArray, lightArray, atomsDarkArray, lightDarkArray)
         
     def alphaFunction(self,opticalDensity):
         highODPolynomial = scipy.poly1d([0.4894, -2.059,  2.825,0.9525,0])
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Part of: experimentEagle
+Filename: streamingPCA.py
+
+Rolling PCA basis of light frames for fringe removal while the experiment is
+running (see pcaFringeRemoval.py).
+
+principalComponentAnalysis.PCA_mask needs the whole training list and forms
+the contracted matrix MM of all training frames again every time. Here the
+last maxFrames light frames are kept in a preallocated ring buffer (so the
+memory is capped at maxFrames frames) together with their masked Gram matrix
+G[i, j] = sum over the mask of frame_i*frame_j. A new light frame replaces the
+oldest one and only its row and column of G are computed, which is one matrix
+vector product.
+
+The basis itself is never formed. Normalising the frames as PCA_mask does and
+diagonalising the small normalised G gives the principal components as
+combinations of the frames. The reconstruction of PCA_mask / Reconstruct
+(masked overlaps, unmasked components) then reduces to
+
+    weights = D^-1 U_k diag(1/vals_k) U_k^T D^-1 (frames . (mask*target))
+    background = weights . frames
+
+where D holds the frame norms and U_k, vals_k the first k eigenvectors and
+eigenvalues of the normalised G. That is two matrix vector products over the
+frames per atom frame and an eigendecomposition of a maxFrames x maxFrames
+matrix.
+"""
+
+import logging
+
+import numpy as np
+
+logger=logging.getLogger("ExperimentEagle.Processor")
+
+
+class StreamingPCABasis(object):
+    """principal components of the last maxFrames frames (of one shape) added,
+    restricted to a mask (a masks.Mask of the pixels without atoms)"""
+
+    def __init__(self, maxFrames=40, dtype=np.float32):
+        self.maxFrames = maxFrames
+        self.dtype = np.dtype(dtype)
+        self.reset()
+
+    def reset(self):
+        self.frames = None# maxFrames x pixels ring buffer, allocated with the first frame
+        self.shape = None
+        self.count = 0# number of frames in the buffer
+        self.nextSlot = 0
+        self.gram = np.zeros((self.maxFrames, self.maxFrames))
+        self.mask = None
+        self._maskWeights = None# the mask as 1.0 / 0.0 pixels
+
+    def _setMask(self, mask):
+        """recomputes the Gram matrix if the mask has changed. Rare, costs maxFrames matrix vector products"""
+        if mask is self.mask:
+            return
+        self.mask = mask
+        self._maskWeights = mask.mask.ravel().astype(self.dtype)
+        for i in range(self.count):
+            self.gram[i, :self.count] = np.dot(self.frames[:self.count], self.frames[i]*self._maskWeights)
+        logger.info("recomputed PCA Gram matrix of %s frames for a new mask" % self.count)
+
+    def addFrame(self, frame, mask):
+        """adds frame (e.g. a light picture) to the basis, replacing the oldest frame once maxFrames are stored"""
+        if np.shape(frame) != self.shape:
+            if self.shape is not None:
+                logger.warning("frame shape changed from %s to %s. starting a new PCA basis" % (self.shape, np.shape(frame)))
+            self.reset()
+            self.shape = np.shape(frame)
+            self.frames = np.empty((self.maxFrames, np.size(frame)), dtype=self.dtype)
+        self._setMask(mask)
+        slot = self.nextSlot
+        self.frames[slot] = np.ravel(frame)
+        self.count = min(self.count+1, self.maxFrames)
+        self.nextSlot = (slot+1) % self.maxFrames
+        overlaps = np.dot(self.frames[:self.count], self.frames[slot]*self._maskWeights)
+        self.gram[slot, :self.count] = overlaps
+        self.gram[:self.count, slot] = overlaps
+
+    def reconstruct(self, target, mask, components=None):
+        """returns the reconstruction of target from its pixels in mask using the first components
+        principal components (all if None). target must have the shape of the frames"""
+        if self.count == 0:
+            raise ValueError("the PCA basis has no frames yet")
+        if np.shape(target) != self.shape:
+            raise ValueError("target of shape %s doesn't match the PCA basis frames of shape %s" % (np.shape(target), self.shape))
+        self._setMask(mask)
+        frames = self.frames[:self.count]
+        norms = np.sqrt(np.diag(self.gram)[:self.count])
+        normalisedGram = self.gram[:self.count, :self.count]/np.outer(norms, norms)
+        vals, vecs = np.linalg.eigh(normalisedGram)
+        vals = vals[::-1]
+        vecs = vecs[:, ::-1]
+        keep = np.count_nonzero(vals > vals[0]*1E-10)# drop (numerically) linearly dependent frames
+        if components:
+            keep = min(keep, components)
+        vals = vals[:keep]
+        vecs = vecs[:, :keep]
+        overlaps = np.dot(frames, np.ravel(target)*self._maskWeights)/norms
+        weights = np.dot(vecs, np.dot(vecs.T, overlaps)/vals)/norms
+        return np.dot(weights.astype(self.dtype), frames).reshape(self.shape)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+tests of HumphryPictureAnalyser.train_PCA_basis (calibration/PCAFringeRemoval) against
+PCA and PCA_mask of principalComponentAnalysis.py on random pictures
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "calibration", "PCAFringeRemoval"))
+import HumphryPictureAnalyser
+import principalComponentAnalysis
+
+
+class TestTrainPCABasis(unittest.TestCase):
+
+    shape = (6, 10)# of one frame, the pictures are two fast kinetics frames
+    n_pictures = 11
+    n_components = 4
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.folder, "images"))
+        random = np.random.RandomState(7)
+        self.lightFrames = []
+        for i in range(self.n_pictures):
+            picture = random.randint(1, 256, (2*self.shape[0], self.shape[1])).astype(np.uint8)
+            Image.fromarray(picture).save(os.path.join(self.folder, "images", "shot%02d.png" % i))
+            self.lightFrames.append(picture[self.shape[0]:].astype(np.float32).ravel())
+        self.analyser = HumphryPictureAnalyser.HumphryPictureAnalyser({"test": "testLog"})
+        self.analyser.data_path_dict = {"test": os.path.join(self.folder, "testLog.csv")}
+        self.analyser.loadDarkImage = lambda darkFilePath: np.zeros((2*self.shape[0], self.shape[1]))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def assertSameComponents(self, vecs, expected):
+        """the components are only defined up to their sign"""
+        for vec, expectedVec in zip(vecs, expected[:self.n_components]):
+            sign = np.sign(np.dot(vec, expectedVec))
+            np.testing.assert_allclose(sign*vec, expectedVec, rtol=1e-4, atol=1e-6)
+
+    def test_matches_PCA(self):
+        basis = self.analyser.train_PCA_basis("test", n_components=self.n_components, batch_size=4)
+        vals, vecs = principalComponentAnalysis.PCA(self.lightFrames)
+        np.testing.assert_allclose(basis["vals"], vals[:self.n_components], rtol=1e-6)
+        self.assertSameComponents(basis["vecs"], vecs)
+        self.assertEqual(tuple(basis["shape"]), self.shape)
+        self.assertEqual(len(basis["files"]), self.n_pictures)
+
+    def test_matches_PCA_mask(self):
+        mask = np.ones(self.shape)
+        mask[2:4, 3:7] = 0
+        basis = self.analyser.train_PCA_basis("test", n_components=self.n_components, mask=mask, batch_size=4)
+        vals, vecs, vecs_no_mask = principalComponentAnalysis.PCA_mask(self.lightFrames, mask.ravel())
+        np.testing.assert_allclose(basis["vals"], vals[:self.n_components], rtol=1e-6)
+        self.assertSameComponents(basis["vecs"], vecs)
+        self.assertSameComponents(basis["vecs_no_mask"], vecs_no_mask)
+
+    def test_saved_basis_is_loaded(self):
+        basis = self.analyser.train_PCA_basis("test", n_components=self.n_components, batch_size=4)
+        self.analyser.loadDarkImage = None# loading the saved basis doesn't read any picture
+        loaded = self.analyser.train_PCA_basis("test", n_components=self.n_components, batch_size=4)
+        np.testing.assert_array_equal(loaded["vecs"], basis["vecs"])
+        self.assertEqual(len(os.listdir(os.path.join(self.folder, "PCA"))), 1)
+
+    def test_non_binary_mask(self):
+        with self.assertRaises(ValueError):
+            self.analyser.train_PCA_basis("test", mask=np.full(self.shape, 0.5))
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+tests of processors/binning.py against the previous python loop implementation
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "processors"))
+import binning
+
+
+def previousBinArray(data, axis, binstep, binsize, func=np.nanmean):
+    data = np.array(data)
+    dims = np.array(data.shape)
+    argdims = np.arange(data.ndim)
+    argdims[0], argdims[axis]= argdims[axis], argdims[0]
+    data = data.transpose(argdims)
+    data = [func(np.take(data,np.arange(int(i*binstep),int(i*binstep+binsize)),0),0) for i in np.arange(dims[axis]//binstep)]
+    data = np.array(data).transpose(argdims)
+    return data
+
+
+class TestBinning(unittest.TestCase):
+
+    def setUp(self):
+        self.image = np.random.RandomState(0).poisson(1000, (128, 96)).astype(np.float32)
+        self.image[10, 20] = np.nan
+
+    def test_binArray_matches_previous(self):
+        for axis, binstep, binsize, func in [(0, 2, 2, np.mean), (1, 4, 4, np.nanmean), (0, 2, 3, np.max), (1, 3, 2, np.sum)]:
+            data = self.image[:125] if binsize > binstep else self.image# the previous version fails when the last bin doesn't fit
+            expected = previousBinArray(data, axis, binstep, binsize, func)
+            result = binning.binArray(data, axis, binstep, binsize, func)
+            self.assertEqual(result.shape, expected.shape)
+            self.assertTrue(np.allclose(result, expected, rtol=1e-6, equal_nan=True), "axis %s step %s size %s %s" % (axis, binstep, binsize, func.__name__))
+
+    def test_function_names(self):
+        self.assertTrue(np.allclose(binning.binArray(self.image, 1, 2, 2, "nanmean"), previousBinArray(self.image, 1, 2, 2, np.nanmean), rtol=1e-6))
+
+    def test_binImage(self):
+        expected = previousBinArray(previousBinArray(self.image, 0, 2, 2, np.mean), 1, 2, 2, np.mean)
+        self.assertTrue(np.allclose(binning.binImage(self.image, 2), expected, rtol=1e-6, equal_nan=True))
+        self.assertEqual(binning.binImage(self.image[:127, :95], 2).shape, (63, 47))# incomplete blocks are dropped
+
+    def test_too_short(self):
+        self.assertRaises(ValueError, binning.binArray, self.image[:2], 0, 4, 4)
+
+
+if __name__=="__main__":
+    unittest.main()
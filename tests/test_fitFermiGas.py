@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+tests of fits/fitFermiGas.py: the module imports (as experimentEagle imports it),
+the fit can be created and its view finds the groups it includes from Fit
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import physicsProperties.physicsProperties# imported before the fits, as in experimentEagle
+import fits.fitFermiGas as fitFermiGas
+
+
+class TestFermiGasFit(unittest.TestCase):
+
+    def setUp(self):
+        self.fit = fitFermiGas.FermiGasFit()
+
+    def test_create(self):
+        self.assertEqual(self.fit.name, "Fermi Gas")
+        self.assertEqual([variable.name for variable in self.fit.variablesList], ["x0", "y0", "A", "sigmaX", "sigmaY", "betaMu", "B"])
+        self.assertFalse(self.fit.lookupTableBool)
+
+    def test_view_includes(self):
+        self.assertIsNotNone(self.fit.trait_view("traits_view"))
+        for name in ["generalGroup", "variablesGroup", "derivedGroup", "actionsGroup"]:
+            self.assertIsNotNone(self.fit.trait_view_elements().find(name), name)
+
+    def test_lookup_table_fit_function(self):
+        positions = np.array(np.meshgrid(np.arange(40.0), np.arange(30.0))).reshape(2, -1)
+        parameters = (20.0, 15.0, 2.0, 5.0, 4.0, 3.0, 0.1)
+        expected = fitFermiGas.FermiGasFit.fitFunc(positions, *parameters)
+        self.assertTrue(np.allclose(fitFermiGas.FermiGasFit.fitFuncTable(positions, *parameters), expected, atol=1E-6))
+
+
+if __name__=="__main__":
+    unittest.main()
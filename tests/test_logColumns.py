@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+tests of logColumns.py: the sidecar of a csv reads back the same values, keeps
+the old chunks when the header is extended, and is only used while it is up to
+date with the csv
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import logColumns
+
+
+class TestColumnStore(unittest.TestCase):
+
+    header = ["datetime", "epoch seconds", "N", "name", "fitted"]
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.logFile = os.path.join(self.folder, "test.csv")
+        self.rows = [["2026-10-18 12:00:%02d" % i, 1792324800.123456+i*7.654321, 1000*i, "shot%d" % i, i % 2 == 0] for i in range(6)]
+        self.writeCsv(self.header, self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def writeCsv(self, header, rows, mode="wb"):
+        with open(self.logFile, mode) as csvFile:
+            writer = csv.writer(csvFile)
+            if header is not None:
+                writer.writerow(header)
+            writer.writerows([[logColumns.csvText(value) for value in row] for row in rows])
+
+    def test_round_trip(self):
+        logColumns.ColumnStore(self.logFile).rebuild()
+        data = logColumns.readColumns(self.logFile)
+        self.assertEqual(list(data), self.header)
+        self.assertEqual(data["N"].dtype, np.int64)
+        self.assertEqual(data["fitted"].dtype, bool)
+        for i, name in enumerate(self.header):
+            np.testing.assert_array_equal(data[name], [row[i] for row in self.rows])
+        frame = logColumns.readDataFrame(self.logFile, columns=["N"])
+        self.assertEqual(list(frame.columns), ["N"])
+        self.assertEqual(list(frame["N"]), [row[2] for row in self.rows])
+
+    def test_add_columns(self):
+        store = logColumns.ColumnStore(self.logFile)
+        store.rebuild()
+        with open(self.logFile, "rb") as csvFile:
+            lines = csvFile.readlines()
+        with open(self.logFile, "wb") as csvFile:
+            csv.writer(csvFile).writerow(self.header+["T"])
+            csvFile.writelines(lines[1:])
+        store.addColumns(["T"], os.stat(self.logFile))
+        newRow = ["2026-10-18 12:01:00", 1792324900.5, 7000, "shot7", True, 0.25]
+        self.writeCsv(None, [newRow], mode="ab")
+        store.append([newRow], os.stat(self.logFile))
+        self.assertEqual(len(store.manifest["chunks"]), 2)
+        data = logColumns.readColumns(self.logFile)
+        self.assertEqual(list(data), self.header+["T"])
+        np.testing.assert_array_equal(data["T"], [np.nan]*len(self.rows)+[0.25])
+        np.testing.assert_array_equal(data["N"], [row[2] for row in self.rows]+[7000])
+
+    def test_current_sidecar(self):
+        store = logColumns.ColumnStore(self.logFile)
+        self.assertFalse(store.isCurrent())
+        store.rebuild()
+        self.assertTrue(store.isCurrent())
+        self.assertIsNotNone(logColumns.readColumns(self.logFile))
+        self.writeCsv(None, [["2026-10-18 12:01:00", 1792324900.5, 7000, "shot7", True]], mode="ab")# e.g. edited by hand
+        self.assertFalse(logColumns.ColumnStore(self.logFile).isCurrent())
+        self.assertIsNone(logColumns.readColumns(self.logFile))
+        frame = logColumns.readDataFrame(self.logFile)
+        self.assertEqual(len(frame), len(self.rows)+1)
+        self.assertEqual(frame["N"].iloc[-1], 7000)
+
+
+if __name__=="__main__":
+    unittest.main()
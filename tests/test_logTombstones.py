@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+tests of logTombstones.py: delete, restore, lastRowKey and compact on a small log
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import logTombstones
+import logColumns
+
+
+class TestLogTombstones(unittest.TestCase):
+
+    def setUp(self):
+        logTombstones.clear()
+        self.folder = tempfile.mkdtemp()
+        self.logFile = os.path.join(self.folder, "test.csv")
+        with open(self.logFile, "wb") as csvFile:
+            writer = csv.writer(csvFile)
+            writer.writerow(["datetime", "epoch seconds", "N"])
+            for i in range(10):
+                writer.writerow(["2026-10-18T12:00:%02d" % i, 1000.5+i, i*100])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def readKeys(self):
+        with open(self.logFile, "rb") as csvFile:
+            rows = list(csv.reader(csvFile))
+        self.assertEqual(rows[0], ["datetime", "epoch seconds", "N"])
+        return [float(row[1]) for row in rows[1:]]
+
+    def test_delete_and_restore(self):
+        self.assertEqual(logTombstones.deletedKeys(self.logFile), frozenset())
+        self.assertIsNone(logTombstones.signature(self.logFile))
+        logTombstones.delete(self.logFile, [1009.5, 1008.5, 1002.5])
+        self.assertEqual(logTombstones.deletedKeys(self.logFile), frozenset([1009.5, 1008.5, 1002.5]))
+        logTombstones.restore(self.logFile, [1008.5])
+        self.assertEqual(logTombstones.deletedKeys(self.logFile), frozenset([1009.5, 1002.5]))
+        self.assertEqual(len(self.readKeys()), 10)# the csv isn't changed
+
+    def test_lastRowKey(self):
+        self.assertEqual(logTombstones.lastRowKey(self.logFile), 1009.5)
+        logTombstones.delete(self.logFile, [1009.5, 1008.5])
+        self.assertEqual(logTombstones.lastRowKey(self.logFile), 1007.5)
+        logTombstones.restore(self.logFile, [1008.5])
+        self.assertEqual(logTombstones.lastRowKey(self.logFile), 1008.5)
+
+    def test_lastRowKey_across_blocks(self):
+        blockSize = logTombstones.lastRowBlockSize
+        try:
+            logTombstones.lastRowBlockSize = 16# shorter than a line
+            logTombstones.delete(self.logFile, [1000.5+i for i in range(1, 10)])
+            self.assertEqual(logTombstones.lastRowKey(self.logFile), 1000.5)
+            logTombstones.delete(self.logFile, [1000.5])
+            self.assertIsNone(logTombstones.lastRowKey(self.logFile))
+        finally:
+            logTombstones.lastRowBlockSize = blockSize
+
+    def test_compact(self):
+        logTombstones.delete(self.logFile, [1009.5, 1002.5])
+        self.assertEqual(logTombstones.compact(self.logFile), 2)
+        self.assertEqual(self.readKeys(), [1000.5+i for i in range(10) if i not in (2, 9)])
+        self.assertFalse(os.path.exists(logTombstones.tombstoneFile(self.logFile)))
+        self.assertEqual(logTombstones.deletedKeys(self.logFile), frozenset())
+        self.assertEqual(logTombstones.compact(self.logFile), 0)
+
+    def test_readDataFrame_hides_deleted_rows_without_sidecar(self):
+        # realistic epoch seconds (microseconds) that pandas' default float parser doesn't read back exactly
+        keys = [1792324800.123456+i*7.654321 for i in range(200)]
+        with open(self.logFile, "wb") as csvFile:
+            writer = csv.writer(csvFile)
+            writer.writerow(["datetime", "epoch seconds", "N"])
+            for i, key in enumerate(keys):
+                writer.writerow(["2026-10-18T12:%02d:%02d" % (i//60, i%60), repr(key), i])
+        logColumns.ColumnStore(self.logFile).rebuild()
+        deleted = keys[::4]
+        logTombstones.delete(self.logFile, deleted)
+        frame = logColumns.readDataFrame(self.logFile)
+        self.assertEqual(len(frame), 150)
+        folder = logColumns.sidecarFolder(self.logFile)
+        for name in os.listdir(folder):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(folder, name))
+        self.assertIsNone(logColumns.readColumns(self.logFile))
+        frame = logColumns.readDataFrame(self.logFile)# from the csv
+        self.assertEqual(len(frame), 150)
+        self.assertFalse(frame["epoch seconds"].isin(deleted).any())
+        self.assertEqual(len(logColumns.readDataFrame(self.logFile, ["N"])), 150)
+
+    def test_log_without_key_column(self):
+        with open(self.logFile, "wb") as csvFile:
+            csv.writer(csvFile).writerows([["datetime", "N"], ["2026-10-18T12:00:00", 1]])
+        self.assertRaises(ValueError, logTombstones.lastRowKey, self.logFile)
+
+
+if __name__=="__main__":
+    unittest.main()
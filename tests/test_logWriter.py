@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+tests of fits/logWriter.py: rows written by the writer thread are in the csv and
+its column sidecar, a new column extends the header, and the sidecar is up to
+date with the csv after a flush
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, "fits"))
+import logColumns
+import logWriter
+
+
+class TestLogWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.logFile = os.path.join(self.folder, "test.csv")
+        self.writer = logWriter.LogWriter(flushInterval=0.01)
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.folder)
+
+    def write(self, columnNames, row):
+        self.writer.write(logWriter.LogEntry(self.folder, self.logFile, columnNames, row))
+
+    def readCsv(self):
+        with open(self.logFile, "rb") as csvFile:
+            return list(csv.reader(csvFile))
+
+    def test_round_trip(self):
+        columnNames = ["epoch seconds", "N", "name", "fitted"]
+        rows = [[1792324800.123456+i, 1000*i, "shot%d" % i, i % 2 == 0] for i in range(5)]
+        for row in rows:
+            self.write(columnNames, row)
+        self.writer.flush(self.logFile)
+        self.assertEqual(self.readCsv(), [columnNames]+[[logColumns.csvText(value) for value in row] for row in rows])
+        data = logColumns.readColumns(self.logFile)
+        self.assertIsNotNone(data)
+        self.assertEqual(list(data), columnNames)
+        np.testing.assert_array_equal(data["epoch seconds"], [row[0] for row in rows])
+        np.testing.assert_array_equal(data["N"], [row[1] for row in rows])
+        np.testing.assert_array_equal(data["name"], [row[2] for row in rows])
+        np.testing.assert_array_equal(data["fitted"], [row[3] for row in rows])
+
+    def test_header_extension(self):
+        self.write(["epoch seconds", "N"], [1.5, 10])
+        self.write(["epoch seconds", "N"], [2.5, 20])
+        self.write(["epoch seconds", "N", "T"], [3.5, 30, 0.25])
+        self.write(["epoch seconds", "T"], [4.5, 0.5])
+        self.writer.flush(self.logFile)
+        self.assertEqual(self.readCsv(), [["epoch seconds", "N", "T"], ["1.5", "10"], ["2.5", "20"],
+                                          ["3.5", "30", "0.25"], ["4.5", "", "0.5"]])
+        data = logColumns.readColumns(self.logFile)
+        self.assertIsNotNone(data)
+        np.testing.assert_array_equal(data["T"], [np.nan, np.nan, 0.25, 0.5])
+        np.testing.assert_array_equal(data["N"], [10, 20, 30, np.nan])
+
+    def test_sidecar_is_current(self):
+        for i in range(3):
+            self.write(["epoch seconds", "N"], [float(i), i])
+            self.writer.flush(self.logFile)
+            store = logColumns.ColumnStore(self.logFile)
+            self.assertTrue(store.isCurrent())
+            csvStat = os.stat(self.logFile)
+            self.assertEqual(store.manifest["csvSize"], csvStat.st_size)
+            self.assertEqual(store.manifest["csvMTime"], csvStat.st_mtime)
+            self.assertEqual(store.manifest["rows"], i+1)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+tests of the single pass and lookup table fermi_poly functions of fits/polylog.py
+against the previous np.piecewise implementation
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fits"))
+import polylog
+
+
+def previousPiecewise(x, boundaries, pieces):
+    conditions = [x<=boundaries[0]]+[np.logical_and(x>low, x<=high) for low, high in zip(boundaries[:-1], boundaries[1:])]
+    return np.piecewise(x, conditions, pieces)
+
+
+class TestPolylog(unittest.TestCase):
+
+    functions = [(polylog.fermi_poly2, polylog.fermi_poly2_table, polylog._fermi_poly2_boundaries, polylog._fermi_poly2_pieces),
+                 (polylog.fermi_poly3, polylog.fermi_poly3_table, polylog._fermi_poly3_boundaries, polylog._fermi_poly3_pieces)]
+
+    def setUp(self):
+        #argument of FermiGasFit.fitFunc for an image, and the boundaries of the pieces
+        xs = np.arange(256.0)
+        self.x = 3.0-((xs[np.newaxis, :]-128)/(2*15.0))**2-((xs[:, np.newaxis]-120)/(2*10.0))**2
+        self.edges = np.array([-25.0, -20.0, -2.0, -1.0, 0.0, 1.0, 2.0, 20.0, 25.0])
+
+    def test_matches_piecewise(self):
+        for function, table, boundaries, pieces in self.functions:
+            for x in [self.x, self.edges]:
+                self.assertTrue(np.array_equal(function(x), previousPiecewise(x, boundaries, pieces)), function.__name__)
+
+    def test_scalar(self):
+        for function, table, boundaries, pieces in self.functions:
+            self.assertEqual(function(0.5).shape, (1,))
+            self.assertEqual(function(0.5)[0], previousPiecewise(np.array([0.5]), boundaries, pieces)[0])
+
+    def test_table_error_bound(self):
+        for function, table, boundaries, pieces in self.functions:
+            for x in [self.x, self.edges]:
+                self.assertTrue(np.abs(table(x)-function(x)).max() <= table.errorBound, function.__name__)
+
+
+if __name__=="__main__":
+    unittest.main()
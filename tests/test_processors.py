@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+regression tests of Processor.opticalDensity (processors/processors.py) against
+the previous implementation on the testData images, and of Processor.readSeries
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import imageReader
+import processors.processors as processors# through the package, as experimentEagle imports it
+
+
+def previousOpticalDensity(atomArray, lightArray):
+    if (not np.all(atomArray>=0.0)) or (not np.all(lightArray>0.0)):
+        atomArray = atomArray.clip(1)
+        lightArray = lightArray.clip(1)
+    return -np.log(atomArray/lightArray)
+
+
+class TestOpticalDensity(unittest.TestCase):
+
+    def setUp(self):
+        self.processor = processors.Processor()
+        self.imagePaths = sorted(glob.glob(os.path.join(root, "testData", "*.png")))
+        self.useNumexpr = processors.useNumexpr
+
+    def tearDown(self):
+        processors.useNumexpr = self.useNumexpr
+
+    def cases(self, imagePath, dtype):
+        atomArray, lightArray = np.split(imageReader.readImage(imagePath, dtype).copy(), 2)
+        darkArray = np.full(atomArray.shape, atomArray.mean(), dtype)
+        return [("no dark", (atomArray, lightArray), (atomArray, lightArray, None, None)),
+                ("dark", (atomArray-darkArray, lightArray-darkArray), (atomArray, lightArray, darkArray, darkArray))]
+
+    def test_numpy_matches_previous_exactly(self):
+        processors.useNumexpr = False
+        self.assertTrue(self.imagePaths)
+        for imagePath in self.imagePaths:
+            for dtype in [np.float32, np.float64]:
+                for case, previousArguments, arguments in self.cases(imagePath, dtype):
+                    inputs = [array.copy() for array in arguments if array is not None]
+                    expected = previousOpticalDensity(*previousArguments)
+                    result = self.processor.opticalDensity(*arguments)
+                    message = "%s %s %s" % (os.path.basename(imagePath), np.dtype(dtype).name, case)
+                    self.assertEqual(result.dtype, expected.dtype, message)
+                    self.assertTrue(np.array_equal(np.isnan(result), np.isnan(expected)), message)
+                    self.assertTrue((result == expected)[~np.isnan(expected)].all(), message)
+                    for before, after in zip(inputs, [array for array in arguments if array is not None]):
+                        np.testing.assert_array_equal(before, after, "%s changed its input" % message)
+
+    @unittest.skipIf(processors.numexpr is None, "numexpr is not installed")
+    def test_numexpr_matches_previous(self):
+        processors.useNumexpr = True
+        for imagePath in self.imagePaths:
+            for dtype in [np.float32, np.float64]:
+                for case, previousArguments, arguments in self.cases(imagePath, dtype):
+                    expected = previousOpticalDensity(*previousArguments)
+                    result = self.processor.opticalDensity(*arguments)
+                    self.assertTrue(np.allclose(result, expected, rtol=1e-5, atol=1e-6, equal_nan=True), "%s %s %s" % (os.path.basename(imagePath), np.dtype(dtype).name, case))
+
+    def test_shape_mismatch(self):
+        self.assertIsNone(self.processor.opticalDensity(np.ones((4, 4)), np.ones((4, 5))))
+
+
+class TestReadSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.processor = processors.Processor()
+        self.processor.read = lambda path: np.full((2, 3), 1.0 if path.endswith("_X1.tif") else 2.0)
+        self.paths = []
+        for frame in ["_X1.tif", "_X2.tif"]:
+            path = os.path.join(self.folder, "shot" + frame)
+            with open(path, "wb") as f:
+                f.write("frame")
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_single_frame_by_default(self):
+        np.testing.assert_array_equal(self.processor.readSeries(self.paths[1], timeout=0.5), np.full((2, 3), 2.0))
+
+    def test_stack_series(self):
+        array = self.processor.readSeries(self.paths[1], stackSeries=True, timeout=0.5)
+        np.testing.assert_array_equal(array, np.vstack([np.full((2, 3), 1.0), np.full((2, 3), 2.0)]))
+
+    def test_first_frame_is_not_stacked(self):
+        self.assertEqual(self.processor.readSeries(self.paths[0], stackSeries=True, timeout=0.5).shape, (2, 3))
+
+
+if __name__=="__main__":
+    unittest.main()
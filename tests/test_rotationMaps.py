@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+tests of processors/rotationMaps.py against scipy.ndimage.rotate
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import scipy.ndimage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "processors"))
+import rotationMaps
+
+
+class TestRotationMaps(unittest.TestCase):
+
+    angles = [-45.0, -47.8, -13.0, 0.0, 30.0, 87.8, 90.0, 180.0]
+
+    def setUp(self):
+        rotationMaps.clear()
+        self.random = np.random.RandomState(0)
+
+    def test_matches_scipy(self):
+        for shape in [(64, 80), (65, 81), (50, 50)]:
+            image = self.random.poisson(1000, shape).astype(np.float64)
+            for angle in self.angles:
+                expected = scipy.ndimage.rotate(image, angle, order=1)
+                rotated = rotationMaps.rotate(image, angle)
+                self.assertEqual(rotated.shape, expected.shape, "shape %s angle %s" % (shape, angle))
+                if angle % 90 == 0:# scipy before 1.6 fills one edge line with 0 as cos(90) isn't exactly 0
+                    rotated, expected = rotated[1:-1, 1:-1], expected[1:-1, 1:-1]
+                self.assertTrue(np.allclose(rotated, expected), "shape %s angle %s" % (shape, angle))
+
+    def test_float32_and_integer_images(self):
+        image = self.random.poisson(1000, (40, 52))
+        for angle in [-45.0, 30.0]:
+            expected = scipy.ndimage.rotate(image.astype(np.float64), angle, order=1)
+            rotated32 = rotationMaps.rotate(image.astype(np.float32), angle)
+            self.assertEqual(rotated32.dtype, np.float32)
+            self.assertTrue(np.allclose(rotated32, expected, rtol=1E-5, atol=1E-2))
+            rotatedInt = rotationMaps.rotate(image, angle)
+            self.assertEqual(rotatedInt.dtype, image.dtype)
+            self.assertTrue(np.all(abs(rotatedInt-expected) <= 0.5+1E-6))
+
+    def test_out_and_cache(self):
+        image = self.random.poisson(1000, (30, 40)).astype(np.float64)
+        rotationMap = rotationMaps.getRotationMap(image.shape, 30.0)
+        self.assertIs(rotationMaps.getRotationMap(image.shape, 30.0), rotationMap)
+        out = np.ones(rotationMap.outputShape)
+        self.assertIs(rotationMap.apply(image, out=out), out)
+        self.assertTrue(np.allclose(out, scipy.ndimage.rotate(image, 30.0, order=1)))
+        self.assertRaises(ValueError, rotationMap.apply, image.T)
+
+
+if __name__=="__main__":
+    unittest.main()
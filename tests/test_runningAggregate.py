@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+tests of plotObjects/runningAggregate.py against groupby aggregate of all rows
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plotObjects"))
+import runningAggregate
+
+
+class TestRunningAggregate(unittest.TestCase):
+
+    keys, values = ["gradient", "TOFTime"], ["N", "T"]
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        rows = 2000
+        self.dataframe = pandas.DataFrame({"gradient":random.randint(0, 3, rows), "TOFTime":random.randint(0, 20, rows),
+                                           "N":random.normal(1E5, 1E4, rows), "T":random.normal(1E-6, 1E-7, rows)})
+        self.dataframe.loc[5:20, "T"] = np.nan
+
+    def assertMatchesGroupby(self, result, dataframe):
+        expected = dataframe.groupby(self.keys, as_index=False).aggregate({"N":["mean", "std"], "T":["mean", "std"]})
+        self.assertEqual(len(result), len(expected))
+        for key in self.keys:
+            self.assertTrue(np.array_equal(result[key].values, expected[key].values))
+        for column in self.values:
+            for statistic in ["mean", "std"]:
+                self.assertTrue(np.allclose(result[column, statistic].values, expected[column, statistic].values, rtol=1E-9, equal_nan=True), (column, statistic))
+
+    def test_updates_in_pieces(self):
+        aggregate = runningAggregate.RunningAggregate(self.keys, self.values)
+        aggregate.update(self.dataframe[:1500])
+        for start in range(1500, 2000, 37):
+            aggregate.update(self.dataframe[start:start+37])
+        self.assertMatchesGroupby(aggregate.result(), self.dataframe)
+
+    def test_new_groups_and_single_values(self):
+        aggregate = runningAggregate.RunningAggregate(self.keys, self.values)
+        aggregate.update(self.dataframe)
+        extra = pandas.DataFrame({"gradient":[7], "TOFTime":[1], "N":[1.0], "T":[np.nan]})
+        aggregate.update(extra)
+        aggregate.update(extra[:0])
+        self.assertMatchesGroupby(aggregate.result(), pandas.concat([self.dataframe, extra], ignore_index=True))
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+tests of processors/streamingPCA.py against the reconstruction of PCA_mask and
+Reconstruct in principalComponentAnalysis.py (repeated here without matplotlib)
+
+run from the experimentEagle folder with python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "processors"))
+import masks
+import streamingPCA
+
+
+def referenceReconstruction(training, target, mask, components):
+    """PCA_mask followed by Reconstruct with the unmasked vectors"""
+    training = np.array(training)
+    masked = training*mask
+    norm = np.einsum("ij,ij->i", masked, masked)
+    M = masked*norm[:, np.newaxis]**-0.5
+    vals, vecs = np.linalg.eigh(np.dot(M, M.T))
+    vals = vals[::-1][:components]
+    vecs = vecs[:, ::-1][:, :components]
+    masked = np.einsum("ij,ik,k->kj", M, vecs, vals**-0.5)
+    unmasked = np.einsum("ij,ik,k->kj", training*norm[:, np.newaxis]**-0.5, vecs, vals**-0.5)
+    return np.dot(np.dot(masked, target), unmasked)
+
+
+class TestStreamingPCA(unittest.TestCase):
+
+    size = 64
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        y, x = np.mgrid[:self.size, :self.size]/float(self.size)
+        fringes = [np.sin(2*np.pi*(kx*x+ky*y)+phase) for kx, ky, phase in [(3, 1, 0.0), (1, 4, 1.0), (5, 2, 2.0)]]
+        self.images = [1.0+np.tensordot(random.normal(0, 0.2, 3), fringes, 1)+random.normal(0, 0.05, (self.size, self.size)) for i in range(21)]
+        self.mask = masks.annulus((self.size, self.size), self.size/2, self.size/2, self.size/4, np.inf)
+
+    def test_matches_PCA_mask(self):
+        target, training = self.images[0], self.images[1:]
+        basis = streamingPCA.StreamingPCABasis(maxFrames=20, dtype=np.float64)
+        for image in training:
+            basis.addFrame(image, self.mask)
+        expected = referenceReconstruction([image.ravel() for image in training], target.ravel(), self.mask.mask.ravel().astype(float), 8)
+        self.assertTrue(np.allclose(basis.reconstruct(target, self.mask, 8).ravel(), expected))
+
+    def test_ring_buffer_keeps_last_frames(self):
+        target = self.images[0]
+        basis = streamingPCA.StreamingPCABasis(maxFrames=10, dtype=np.float64)
+        for image in self.images[1:]:
+            basis.addFrame(image, self.mask)
+        self.assertEqual(basis.count, 10)
+        expected = referenceReconstruction([image.ravel() for image in self.images[-10:]], target.ravel(), self.mask.mask.ravel().astype(float), 5)
+        self.assertTrue(np.allclose(basis.reconstruct(target, self.mask, 5).ravel(), expected))
+
+    def test_errors(self):
+        basis = streamingPCA.StreamingPCABasis(maxFrames=5)
+        self.assertRaises(ValueError, basis.reconstruct, self.images[0], self.mask)
+        basis.addFrame(self.images[1], self.mask)
+        self.assertRaises(ValueError, basis.reconstruct, self.images[0][:10], self.mask)
+
+
+if __name__=="__main__":
+    unittest.main()